@@ -5,11 +5,19 @@ import os
 import alarms
 import clock
 import time
+import re
+import queue
+import threading
+import gzip
+import shutil
+import zlib
 import ui.ui_dialog
 from interactions.base.interaction import Interaction
 from sims4.localization import LocalizationHelperTuning
 from ui.ui_dialog_notification import UiDialogNotification
 import json
+import csv
+from collections import deque, OrderedDict
 from ui.ui_dialog_picker import UiObjectPicker, ObjectPickerRow
 from ui.ui_dialog_generic import UiDialogTextInputOkCancel
 from sims4.localization import _create_localized_string
@@ -28,27 +36,91 @@ except:
 # =======================================================
 MOD_VERSION = "V25.0"
 AUTHOR = "kekell"
-_log_buffer = []
+
+
+class _RingBuffer:
+    """ 固定容量环形缓冲：O(1) 追加，满了丢掉最旧的一条并计数 """
+
+    def __init__(self, capacity):
+        self._items = deque(maxlen=max(1, int(capacity)))
+        self.dropped = 0
+
+    @property
+    def capacity(self):
+        return self._items.maxlen
+
+    def resize(self, capacity):
+        """ 修改容量（保留最新的条目，多出的计入 dropped） """
+        capacity = max(1, int(capacity))
+        if capacity == self._items.maxlen:
+            return
+        overflow = max(0, len(self._items) - capacity)
+        self.dropped += overflow
+        self._items = deque(self._items, maxlen=capacity)
+
+    def append(self, item):
+        if len(self._items) == self._items.maxlen:
+            self.dropped += 1
+        self._items.append(item)
+
+    def clear(self):
+        """ 清空内容并重置丢弃计数 """
+        self._items.clear()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+
+_log_buffer = _RingBuffer(500)
 _last_zone_id = None
 _sim_mood_cache = {}
-_monitor_alarm = None
-_debug_raw_log = []        # 新增：调试用
-_debug_filtered_log = []   # 新增：调试用
-_debug_mode = False        # 新增：调试用
-_sim_last_action_cache = {}
+_sim_buff_memo = {}     # sim_id → (mood 类型, buff 类型 frozenset)，没变就直接跳过
+_buff_meta_cache = {}   # buff 类型 → (是否展示, 清洗后的名字, mood_type)
+_debug_mode = False        # 新增：调试用（开启后统计每个 affordance 的出现次数）
 _output_dir = None  # 缓存输出目录，避免每次都重新查找
-_rel_cache = {}
 _friendship_track = None
 _romance_track = None
-_npc_seen = set()  # 已经生成过快照的 NPC sim_id
+_household_ids = None  # 当前家庭 sim_id 的 frozenset（None = 需要重建）
+_household_watch_client = None  # 已注册 selectable 变化回调的 client
+_affordance_cache = {}  # affordance 类型 → (清洗后的动作名, 是否有意义, 是否社交)
+_affordance_cache_stats = {"hits": 0, "misses": 0}
+_raw_events = []  # 延迟模式：钩子里只记录原始事件，保存时再批量解析
+_segmented_logs = {}  # 路径 → _SegmentedLog（_apply_buffer_settings 在导入时就会用到）
+_RAW_EVENT_LIMIT = 500
 _pending_story = None
 _pending_story_memory_missing = False
-_last_inbox_check = 0
 _settings = {
-    "option_1": False,
-    "option_2": False,
-    "option_3": False,
+    "option_1": False,  # 自动保存：缓冲攒到 autosave_events 条
+    "option_2": False,  # 自动保存：每 autosave_sim_hours 个游戏小时
+    "option_3": False,  # 自动保存：切换场景时
 "popup_style": "dialog",
+    "deferred_enrichment": False,  # 名字/情绪/关系延迟到保存时解析
+    "log_buffer_capacity": 500,    # 日志缓冲最多保留多少条（超出丢最旧的）
+    "debug_histogram_capacity": 2000,  # 调试统计最多记录多少种 affordance（其余计入 <other>）
+    "rel_delta_evict_days": 3,     # 关系追踪：超过几个游戏日没出现的 pair 被淘汰
+    "profiling": True,             # 钩子耗时统计（ai_stats），关掉后完全不计时
+    "dedup_window_minutes": 20,    # 同一 Sim 重复同一动作+目标，多少游戏分钟内只记一次
+    "dedup_social_window_minutes": 1,  # 社交互动的去重窗口（更短）
+    "npc_snapshot_capacity": 256,      # NPC 快照缓存上限（按 NPC + 主动方计，跨场景保留）
+    "jsonl_output": False,             # 额外写一份 JSONL（每行一个事件，给工具解析用）
+    "compact_runs": True,              # 保存时把重复的 (谁, 动作, 目标) 合并成一行
+    "compact_lookback": 4,             # 最近几组里找可以合并的
+    "compact_window_minutes": 60,      # 间隔超过多少游戏分钟就不再合并
+    "async_io": True,                  # 保存日志交给后台线程写盘
+    "fsync_policy": "latest",          # latest = 只 fsync 覆盖写的文件 / always / never
+    "log_segment_max_kb": 2048,        # 累积日志单段上限（KB），超过就封存成新段；0 = 不按大小分段
+    "log_segment_max_sessions": 0,     # 单段最多保存几次；0 = 不按次数分段
+    "log_segment_gzip": True,          # 封存的段用 gzip 压缩
+    "autosave_events": 200,            # option_1：缓冲达到多少条就保存
+    "autosave_sim_hours": 6,           # option_2：每隔几个游戏小时保存
+    "autosave_min_interval_seconds": 120,  # 两次保存的最短间隔（真实秒），免得 AI 队列被刷爆
 }
 
 def _get_settings_path():
@@ -61,41 +133,208 @@ def _get_settings_path():
         pass
     return None
 
-def _load_settings():
-    """从 JSON 加载设置"""
-    global _settings
-    path = _get_settings_path()
-    if not path or not os.path.exists(path):
-        return
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        if "mod_settings" in data:
-            for key in _settings:
-                if key in data["mod_settings"]:
-                    _settings[key] = data["mod_settings"][key]
-    except:
-        pass
+_MISSING = object()
 
-def _save_settings():
-    """保存设置到 JSON"""
-    path = _get_settings_path()
-    if not path:
-        return
-    try:
-        data = {}
-        if os.path.exists(path):
+
+def _dict_path_get(data, path):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return _MISSING
+        data = data[key]
+    return data
+
+
+def _dict_path_put(data, path, value):
+    for key in path[:-1]:
+        child = data.get(key)
+        if not isinstance(child, dict):
+            child = {}
+            data[key] = child
+        data = child
+    if value is _MISSING:
+        data.pop(path[-1], None)
+    else:
+        data[path[-1]] = value
+
+
+class _SettingsStore:
+    """
+    AI_Storyteller_Settings.json 的内存缓存（所有读写都走这里）：
+    读：加载一次，之后只有文件 mtime 变了（比如桌面端写了 ai_recap）才重新读
+    写：只改内存并记下脏路径（如 ("households", key, "profile")），
+        debounce 后用临时文件 + os.replace 一次写回；
+        写之前文件被别人改过就先重新读，再把脏路径盖上去，不会冲掉桌面端的修改
+    """
+    DEBOUNCE_SECONDS = 2
+
+    def __init__(self):
+        self._path = None
+        self._data = None
+        self._mtime = None
+        self._dirty = set()
+        self._alarm = None
+        self.flush_hooks = []   # flush 时先调用（家庭分片文件跟着一起写）；返回 True 表示还有没写完的，稍后重试
+        self.loads = 0
+        self.writes = 0
+
+    def path(self):
+        if self._path is None:
+            self._path = _get_settings_path()
+        return self._path
+
+    @staticmethod
+    def _stat_mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _revalidate(self):
+        path = self.path()
+        if not path:
+            if self._data is None:
+                self._data = {}
+            return
+        mtime = self._stat_mtime(path)
+        if self._data is not None and mtime == self._mtime:
+            return
+        fresh = {}
+        if mtime is not None:
             try:
                 with open(path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                    fresh = json.load(f)
+                if not isinstance(fresh, dict):
+                    fresh = {}
+            except Exception as e:
+                # 文件正被别人写到一半：保留内存里的版本，下次再读
+                log_error(f"Settings read failed: {e}", "settings_store")
+                if self._data is not None:
+                    return
+                fresh = {}
+        # 本地还没写出去的修改盖在上面
+        if self._data is not None:
+            for dirty_path in sorted(self._dirty, key=len):
+                _dict_path_put(fresh, dirty_path, _dict_path_get(self._data, dirty_path))
+        self._data = fresh
+        self._mtime = mtime
+        self.loads += 1
+
+    def data(self):
+        """ 当前内容（只读；修改请用 set） """
+        self._revalidate()
+        return self._data
+
+    def get(self, key, default=None):
+        return self.data().get(key, default)
+
+    def set(self, path, value, flush=False):
+        """ path 是 key 的元组，例如 ("households", hkey, "profile") """
+        self._revalidate()
+        if _dict_path_get(self._data, path) == value:
+            return
+        _dict_path_put(self._data, path, value)
+        self._dirty.add(tuple(path))
+        if flush:
+            self.flush()
+        else:
+            self._schedule()
+
+    def schedule_flush(self):
+        """ 别的数据（家庭分片）要写盘时借用同一个 debounce """
+        self._schedule()
+
+    def _schedule(self, inline_fallback=True):
+        if self._alarm is not None:
+            return
+        try:
+            client = services.client_manager().get_first_client()
+            if client:
+                self._alarm = alarms.add_alarm_real_time(
+                    client,
+                    clock.interval_in_real_seconds(self.DEBOUNCE_SECONDS),
+                    self._tick,
+                    repeating=False
+                )
+                return
+        except:
+            pass
+        # 没有 alarm 可用（比如还没进场景）就直接写
+        if inline_fallback:
+            self.flush()
+
+    def _tick(self, _):
+        self._alarm = None
+        self.flush()
+
+    def on_zone_changed(self):
+        """ 换场景：取消旧场景的 debounce alarm，没写出去的马上写 """
+        if self._alarm is not None:
+            try:
+                alarms.cancel_alarm(self._alarm)
             except:
                 pass
-        data["mod_settings"] = dict(_settings)
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+            self._alarm = None
+        self.flush()
+
+    def flush(self):
+        # 先写分片，再写根文件（索引里指向的文件一定已经存在）
+        retry = False
+        for hook in self.flush_hooks:
+            try:
+                retry = bool(hook()) or retry
+            except Exception as e:
+                log_error(f"Settings flush hook failed: {e}", "settings_store")
+        if retry:
+            self._schedule(inline_fallback=False)
+        if not self._dirty:
+            return
+        path = self.path()
+        if not path:
+            return
+        self._revalidate()
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+            self._mtime = self._stat_mtime(path)
+            self._dirty.clear()
+            self.writes += 1
+        except Exception as e:
+            log_error(f"Settings write failed: {e}", "settings_store")
+
+    def pending(self):
+        return len(self._dirty)
+
+
+_settings_store = _SettingsStore()
+
+
+def _load_settings():
+    """从 JSON 加载设置"""
+    mod_settings = _settings_store.get("mod_settings")
+    if isinstance(mod_settings, dict):
+        for key in _settings:
+            if key in mod_settings:
+                _settings[key] = mod_settings[key]
+    _apply_buffer_settings()
+
+
+def _apply_buffer_settings():
+    """按设置调整缓冲容量"""
+    try:
+        _log_buffer.resize(_settings.get("log_buffer_capacity", 500))
+        _aff_histogram.capacity = max(1, int(_settings.get("debug_histogram_capacity", 2000)))
+        _profiler.enabled = bool(_settings.get("profiling", True))
+        _npc_store.resize(_settings.get("npc_snapshot_capacity", 256))
+        for seg_log in _segmented_logs.values():
+            _configure_segmented_log(seg_log)
     except:
         pass
 
+def _save_settings():
+    """保存设置到 JSON（debounce 后写盘）"""
+    _settings_store.set(("mod_settings",), dict(_settings))
 
 # =======================================================
 # 多家庭管理
@@ -135,60 +374,322 @@ def _guess_household_name():
     return "Household"
 
 
+_HOUSEHOLD_DIR = "AI_Storyteller_Households"
+
+
+def _household_shard_name(hkey):
+    return f"hh_{zlib.crc32(hkey.encode('utf-8')) & 0xffffffff:08x}.json"
+
+
+_SHARD_LOCK_STALE_SECONDS = 10
+
+
+def _break_stale_lock(lock_path):
+    """
+    锁超过 _SHARD_LOCK_STALE_SECONDS 没动过就当作崩溃留下的，先改名成自己独有的名字再删：
+    两边同时判定过期时只有一边改名成功；改到手的如果不是刚才看到的那个文件
+    （对方已经删掉旧锁、建了新锁），原样放回去，当作被占着
+    返回 True 表示旧锁已经没了，可以重新 O_EXCL
+    """
+    try:
+        seen = os.stat(lock_path)
+    except FileNotFoundError:
+        return True
+    except OSError:
+        return False
+    if time.time() - seen.st_mtime <= _SHARD_LOCK_STALE_SECONDS:
+        return False
+
+    grabbed = f"{lock_path}.{os.getpid()}.{threading.get_ident()}.stale"
+    try:
+        os.rename(lock_path, grabbed)
+    except FileNotFoundError:
+        return True     # 别人先清掉了
+    except OSError:
+        return False
+    try:
+        got = os.stat(grabbed)
+        if (got.st_ino, got.st_mtime_ns) == (seen.st_ino, seen.st_mtime_ns):
+            os.remove(grabbed)
+            return True
+        try:
+            os.link(grabbed, lock_path)     # 不覆盖：放回去之前又有人建了锁就不动它
+        except FileExistsError:
+            pass
+        except OSError:
+            os.rename(grabbed, lock_path)
+            return False
+        os.remove(grabbed)
+    except OSError as e:
+        log_error(f"Stale lock cleanup failed: {e}", "settings_store")
+    return False
+
+
+def _acquire_file_lock(path):
+    """ O_EXCL 创建 <path>.lock，成功返回 True；被占着返回 False（不等待） """
+    lock_path = path + ".lock"
+    for _ in range(2):
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            if not _break_stale_lock(lock_path):
+                return False
+        except OSError as e:
+            log_error(f"Lock create failed: {e}", "settings_store")
+            return False
+    return False
+
+
+def _release_file_lock(path):
+    try:
+        os.remove(path + ".lock")
+    except OSError:
+        pass
+
+
+class _HouseholdShards:
+    """
+    每个家庭一个文件：Mods/AI_Storyteller_Households/hh_<crc32>.json
+    根文件只留索引 households_index: {key: {"name", "file"}}（面板列表只看索引）
+    分片内容 {"key", "version", "data"}，每次写 version + 1
+    写入（游戏和桌面端都一样）：O_EXCL 建 <分片>.lock → 读磁盘 → 合并 → 临时文件 + os.replace → 删锁
+      磁盘上的 version 和我们读到的不一样（桌面端写过 ai_recap）
+      → 以磁盘为准，只把自己改过的字段盖上去；锁住期间别人写不进来，不会丢修改
+      锁被占着就先不写，脏字段留着，由 settings store 的 alarm 稍后重试
+      超过 _SHARD_LOCK_STALE_SECONDS 的锁当作崩溃留下的，改名后确认还是同一个文件再删
+    读不加锁（os.replace 是原子的，读到的总是完整文件）
+    只读 / 只写用到的那个家庭，不会整份重写
+    """
+
+    def __init__(self, store):
+        self._store = store
+        self._shards = {}   # key → [data, version, mtime_ns, 脏字段 set]
+        self._migrated = False
+        self.reads = 0
+        self.writes = 0
+        self.lock_waits = 0
+
+    def _dir(self):
+        root = self._store.path()
+        return os.path.join(os.path.dirname(root), _HOUSEHOLD_DIR) if root else None
+
+    def _index(self):
+        index = self._store.get("households_index", {})
+        return index if isinstance(index, dict) else {}
+
+    def _file_for(self, hkey, create=False):
+        entry = self._index().get(hkey)
+        if isinstance(entry, dict) and entry.get("file"):
+            return entry["file"]
+        if not create:
+            return None
+        # crc32 撞了就加后缀，实际文件名以索引为准
+        used = {e.get("file") for e in self._index().values() if isinstance(e, dict)}
+        name = _household_shard_name(hkey)
+        base, n = name[:-5], 1
+        while name in used:
+            name = f"{base}_{n}.json"
+            n += 1
+        self._store.set(("households_index", hkey), {"name": "", "file": name})
+        return name
+
+    def _path_for(self, hkey, create=False):
+        folder = self._dir()
+        fname = self._file_for(hkey, create)
+        return os.path.join(folder, fname) if folder and fname else None
+
+    @staticmethod
+    def _read_file(path):
+        """ → (data, version, mtime_ns)；文件不存在或读坏了返回 None """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with open(path, "r", encoding="utf-8") as f:
+                shard = json.load(f)
+            data = shard.get("data", {})
+            if not isinstance(data, dict):
+                data = {}
+            return (data, int(shard.get("version", 0) or 0), mtime)
+        except Exception:
+            return None
+
+    def _migrate(self):
+        """ 旧格式：households 整个存在根文件里 → 拆成分片，根文件只留索引 """
+        if self._migrated:
+            return
+        self._migrated = True
+        legacy = self._store.get("households")
+        if not isinstance(legacy, dict):
+            return
+        index = self._index()
+        for hkey, hdata in legacy.items():
+            if isinstance(hdata, dict) and hkey not in index:
+                self.update(hkey, hdata)
+        self._store.set(("households",), _MISSING)
+        self._store.flush()
+
+    def _load(self, hkey):
+        self._migrate()
+        shard = self._shards.get(hkey)
+        path = self._path_for(hkey)
+        if not path:
+            return shard
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return shard
+        if shard is not None and shard[2] == mtime:
+            return shard
+        disk = self._read_file(path)
+        if disk is None:
+            return shard
+        data, version, mtime = disk
+        if shard is None:
+            shard = self._shards[hkey] = [data, version, mtime, set()]
+        else:
+            # 别的进程改过：重新读，本地没写出去的字段盖上去
+            for field in shard[3]:
+                data[field] = shard[0].get(field)
+            shard[0], shard[1], shard[2] = data, version, mtime
+        self.reads += 1
+        return shard
+
+    def exists(self, hkey):
+        self._migrate()
+        return hkey in self._index() or hkey in self._shards
+
+    def names(self):
+        """ {key: name}，只读根文件里的索引 """
+        self._migrate()
+        result = {}
+        for hkey, entry in self._index().items():
+            result[hkey] = entry.get("name", "") if isinstance(entry, dict) else ""
+        for hkey, shard in self._shards.items():
+            result.setdefault(hkey, shard[0].get("name", ""))
+        return result
+
+    def get(self, hkey):
+        """ 一个家庭的数据（副本，改了要用 update 写回） """
+        shard = self._load(hkey)
+        return dict(shard[0]) if shard else {}
+
+    def update(self, hkey, fields):
+        """ 改一个家庭的字段：只记脏字段，跟设置一起 debounce 写盘 """
+        if self._store.path():
+            self._file_for(hkey, create=True)
+        shard = self._load(hkey)
+        if shard is None:
+            shard = self._shards[hkey] = [{}, 0, None, set()]
+        changed = False
+        for field, value in fields.items():
+            if shard[0].get(field, _MISSING) != value:
+                shard[0][field] = value
+                shard[3].add(field)
+                changed = True
+        if "name" in fields and self._store.path():
+            self._store.set(("households_index", hkey, "name"), fields["name"])
+        if changed:
+            self._store.schedule_flush()
+
+    def flush(self):
+        """ 写出所有有脏字段的分片；有分片的锁被占着时返回 True（需要重试） """
+        folder = self._dir()
+        if not folder:
+            return False
+        busy = False
+        for hkey, shard in self._shards.items():
+            if not shard[3]:
+                continue
+            path = self._path_for(hkey, create=True)
+            try:
+                os.makedirs(folder, exist_ok=True)
+            except OSError as e:
+                log_error(f"Household shard folder failed: {e}", "settings_store")
+                return False
+            if not _acquire_file_lock(path):
+                busy = True
+                continue
+            try:
+                disk = self._read_file(path)
+                if disk is not None and disk[1] != shard[1]:
+                    data = disk[0]
+                    for field in shard[3]:
+                        data[field] = shard[0].get(field)
+                    shard[0], shard[1] = data, disk[1]
+                version = shard[1] + 1
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"key": hkey, "version": version, "data": shard[0]},
+                              f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, path)
+                shard[1] = version
+                shard[2] = os.stat(path).st_mtime_ns
+                shard[3].clear()
+                self.writes += 1
+            except Exception as e:
+                log_error(f"Household shard write failed ({hkey}): {e}", "settings_store")
+            finally:
+                _release_file_lock(path)
+        if busy:
+            self.lock_waits += 1
+        return busy
+
+    def pending(self):
+        return sum(1 for shard in self._shards.values() if shard[3])
+
+
+_household_shards = _HouseholdShards(_settings_store)
+_settings_store.flush_hooks.append(_household_shards.flush)
+
+
 def _load_households():
-    """读 JSON → 返回 (active_key, households_dict)"""
-    path = _get_settings_path()
-    if not path or not os.path.exists(path):
+    """返回 (active_key, {active_key: 数据})（只读当前家庭的分片；副本，改了要用 _save_households 写回）"""
+    try:
+        active_key = _settings_store.get("active_household", None)
+        if not active_key:
+            return (None, {})
+        hdata = _household_shards.get(active_key)
+        return (active_key, {active_key: hdata} if hdata else {})
+    except:
         return (None, {})
+
+
+def _list_households():
+    """返回 (active_key, {key: name})（只读根文件索引，不打开分片）"""
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        active_key = data.get("active_household", None)
-        households = data.get("households", {})
-        return (active_key, households)
+        return (_settings_store.get("active_household", None), _household_shards.names())
     except:
         return (None, {})
 
 
 def _save_households(active_key, households):
-    """将 active_household + households 写回 JSON（不覆盖其他字段）"""
-    path = _get_settings_path()
-    if not path:
-        return
+    """写回 active_household + 各家庭改过的字段（只写变了的分片）"""
     try:
-        data = {}
-        if os.path.exists(path):
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-            except:
-                pass
-        data["active_household"] = active_key
-        data["households"] = households
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        _settings_store.set(("active_household",), active_key)
+        for hkey, hdata in households.items():
+            if isinstance(hdata, dict):
+                _household_shards.update(hkey, hdata)
     except:
         pass
 
 
 def _auto_register_household():
     """
-    获取当前 household key → 如果不在 JSON 里就新建条目
+    获取当前 household key → 如果还没有分片就新建
     同时更新 active_household 字段
     """
     try:
         key = _get_household_key()
         if not key:
             return
-        active_key, households = _load_households()
-        if key not in households:
-            households[key] = {
+        if not _household_shards.exists(key):
+            _household_shards.update(key, {
                 "name": _guess_household_name(),
                 "profile": "",
                 "player_recap": "",
                 "ai_recap": "",
-            }
-        _save_households(key, households)
+            })
+        _settings_store.set(("active_household",), key)
     except:
         pass
 
@@ -241,16 +742,12 @@ def _read_config_path():
         return None
 
     # 1. 优先读 JSON（新格式）
-    json_path = os.path.join(mods_folder, "AI_Storyteller_Settings.json")
-    if os.path.exists(json_path):
-        try:
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            custom_path = data.get("save_path", "").strip()
-            if custom_path and os.path.isdir(custom_path):
-                return custom_path
-        except:
-            pass
+    try:
+        custom_path = (_settings_store.get("save_path", "") or "").strip()
+        if custom_path and os.path.isdir(custom_path):
+            return custom_path
+    except:
+        pass
 
     # 2. 向下兼容旧的 TXT 配置
     config_path = os.path.join(mods_folder, "AI_Storyteller_Config.txt")
@@ -315,46 +812,77 @@ save_path={default_output}
     except:
         pass
 
+_AGE_TAGS = {
+    'BABY': 'Baby', 'INFANT': 'Infant', 'TODDLER': 'Toddler',
+    'CHILD': 'Child', 'TEEN': 'Teen', 'YOUNGADULT': 'YA',
+    'ADULT': 'Adult', 'ELDER': 'Elder'
+}
+_sim_identity_cache = {}  # sim_id → (全名, 名, 性别标记, 年龄标记)
+_UNKNOWN_IDENTITY = ("?", "?", "?", "?")
+
+
+def _load_sim_identity(sim_info):
+    """ 读一次 SimInfo 生成显示信息并缓存；读不到返回 _UNKNOWN_IDENTITY（不缓存） """
+    try:
+        sim_id = sim_info.sim_id
+        first = sim_info.first_name
+        last = sim_info.last_name
+    except:
+        return _UNKNOWN_IDENTITY
+    name = f"{first or ''} {last or ''}".strip()
+    full_name = name if name else f"Sim({sim_id})"
+    first_name = first or f"Sim({sim_id})"
+    try:
+        gender_tag = "M" if sim_info.gender.name == "MALE" else "F"
+    except:
+        gender_tag = "?"
+    try:
+        age = sim_info.age.name
+        age_tag = _AGE_TAGS.get(age, age)
+    except:
+        age_tag = "?"
+
+    identity = (full_name, first_name, gender_tag, age_tag)
+    _sim_identity_cache[sim_id] = identity
+    return identity
+
+
+def _sim_identity(sim_info):
+    """
+    Sim 的显示信息（全名, 名, 性别, 年龄），按 sim_id 缓存，命中时不再读 SimInfo
+    改名/长大/变性别由注入的 SimInfo 钩子丢掉那一条；家庭变化或切换场景时整体清空；
+    生成角色摘要时家庭成员各重读一次
+    """
+    cached = _sim_identity_cache.get(sim_info.sim_id)
+    if cached is None:
+        return _load_sim_identity(sim_info)
+    return cached
+
+
 def _safe_name(sim_info):
     """安全取名（修复 full_name 为空的 bug）"""
     if sim_info is None:
         return "?"
-    try:
-        first = sim_info.first_name or ''
-        last = sim_info.last_name or ''
-        name = f"{first} {last}".strip()
-        return name if name else f"Sim({sim_info.sim_id})"
-    except:
-        return "?"
+    return _sim_identity(sim_info)[0]
 
 
 def _first_name(sim_info):
     """只取名字（不含姓）"""
     if sim_info is None:
         return "?"
-    try:
-        return sim_info.first_name or f"Sim({sim_info.sim_id})"
-    except:
-        return "?"
+    return _sim_identity(sim_info)[1]
 
 
 def _gender_tag(sim_info):
-    try:
-        return "M" if sim_info.gender.name == "MALE" else "F"
-    except:
+    if sim_info is None:
         return "?"
+    return _sim_identity(sim_info)[2]
 
 
 def _age_tag(sim_info):
-    try:
-        age_map = {
-            'BABY': 'Baby', 'INFANT': 'Infant', 'TODDLER': 'Toddler',
-            'CHILD': 'Child', 'TEEN': 'Teen', 'YOUNGADULT': 'YA',
-            'ADULT': 'Adult', 'ELDER': 'Elder'
-        }
-        return age_map.get(sim_info.age.name, sim_info.age.name)
-    except:
+    if sim_info is None:
         return "?"
+    return _sim_identity(sim_info)[3]
 def get_output_directory():
     """
     获取输出目录（替代旧的 get_desktop_path）
@@ -416,232 +944,572 @@ def log_error(error_msg, context=""):
     except:
         pass  # 如果连错误日志都写不了，那就只能放弃了
 
-def get_header_context():
-    """ 生成标题上下文: [时间] 星期|天气 @地点(真实名字) """
+def _read_weather():
+    """ 天气（使用 .name 属性） """
+    weather_str = "Clear"
     try:
-        now = services.game_clock_service().now()
-        time_str = f"[{now.hour():02d}:{now.minute():02d}]"
+        ws = services.weather_service()
+        if ws and hasattr(ws, 'get_current_weather_types'):
+            weather_types = ws.get_current_weather_types()
 
-        # 1. 星期
-        days_map = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
-        day_str = days_map[now.day() % 7]
+            if weather_types and len(weather_types) >= 1:
+                weather_names = []
 
-        # 2. 天气（使用 .name 属性）
-        weather_str = "Clear"
-        try:
-            ws = services.weather_service()
-            if ws and hasattr(ws, 'get_current_weather_types'):
-                weather_types = ws.get_current_weather_types()
+                for i, wt in enumerate(weather_types):
+                    if i >= 2:
+                        break
 
-                if weather_types and len(weather_types) >= 1:
-                    weather_names = []
+                    try:
+                        name = ""
+                        if hasattr(wt, 'name'):
+                            raw_name = wt.name
+                            name = str(raw_name) if raw_name else ""
 
-                    for i, wt in enumerate(weather_types):
-                        if i >= 2:
-                            break
+                        if not name and hasattr(wt, '__name__'):
+                            name = wt.__name__
 
-                        try:
-                            name = ""
-                            if hasattr(wt, 'name'):
-                                raw_name = wt.name
-                                name = str(raw_name) if raw_name else ""
+                        if name:
+                            name = name.replace('WeatherType.', '').replace('WeatherType_', '')
+                            name = name.replace('Weather_', '').replace('_', ' ').strip()
 
-                            if not name and hasattr(wt, '__name__'):
-                                name = wt.__name__
+                            if name and name != 'WeatherType':
+                                weather_names.append(name)
+                    except:
+                        pass
 
-                            if name:
-                                name = name.replace('WeatherType.', '').replace('WeatherType_', '')
-                                name = name.replace('Weather_', '').replace('_', ' ').strip()
+                if weather_names:
+                    weather_str = '+'.join(weather_names)
 
-                                if name and name != 'WeatherType':
-                                    weather_names.append(name)
-                        except:
-                            pass
+    except Exception as e:
+        log_error(f"Weather error: {str(e)}", "get_header_context")
+    return weather_str
 
-                    if weather_names:
-                        weather_str = '+'.join(weather_names)
 
-        except Exception as e:
-            log_error(f"Weather error: {str(e)}", "get_header_context")
+def _read_venue():
+    """ 地点 (优先抓取真实名字，抓不到则抓类型) """
+    venue_str = "Home"
+    try:
+        zone = services.current_zone()
+        if zone:
+            if hasattr(zone, 'description') and zone.description:
+                venue_str = str(zone.description)
+            elif hasattr(zone, 'name') and zone.name:
+                venue_str = str(zone.name)
+            else:
+                venue_service = services.venue_service()
+                if venue_service and venue_service.active_venue:
+                    raw_name = type(venue_service.active_venue).__name__
+                    venue_str = raw_name.replace('Venue_', '').replace('_', ' ')
+    except Exception as e:
+        log_error(f"Venue error: {str(e)}", "get_header_context")
+    return venue_str
 
-        # 3. 地点 (优先抓取真实名字，抓不到则抓类型)
-        venue_str = "Home"
-        try:
-            zone = services.current_zone()
-            if zone:
-                if hasattr(zone, 'description') and zone.description:
-                    venue_str = str(zone.description)
-                elif hasattr(zone, 'name') and zone.name:
-                    venue_str = str(zone.name)
-                else:
-                    venue_service = services.venue_service()
-                    if venue_service and venue_service.active_venue:
-                        raw_name = type(venue_service.active_venue).__name__
-                        venue_str = raw_name.replace('Venue_', '').replace('_', ' ')
-        except Exception as e:
-            log_error(f"Venue error: {str(e)}", "get_header_context")
 
-        event_str = ""
-        try:
-            events = []
-            # 方法1: 从 situation 抓节日/派对
-            sm = services.get_zone_situation_manager()
-            if sm:
-                has_holiday_situation = False
-                for sit in sm.running_situations():
-                    sit_name = type(sit).__name__.lower()
-                    if 'holiday' in sit_name:
-                        has_holiday_situation = True
-                    elif 'party' in sit_name or 'gathering' in sit_name:
-                        if "Party" not in events:
-                            events.append("Party")
-                    elif 'festival' in sit_name:
-                        if "Festival" not in events:
-                            events.append("Festival")
-                    elif 'wedding' in sit_name:
-                        if "Wedding" not in events:
-                            events.append("Wedding")
-                    elif 'birthday' in sit_name:
-                        if "Birthday" not in events:
-                            events.append("Birthday")
-
-                # 方法2: 如果检测到节日situation，从drama节点拿具体名字
-                if has_holiday_situation:
-                    holiday_name = ""
-                    try:
-                        ds = services.drama_scheduler_service()
-                        if ds:
-                            for node in ds.active_nodes_gen():
-                                node_name = type(node).__name__
-                                if 'holiday' in node_name.lower():
-                                    # 从 dramaNode_PremadeHoliday_Surprise_PrankDay
-                                    # 提取 PrankDay 这样的名字
-                                    clean = node_name.replace('dramaNode_', '')
-                                    clean = clean.replace('PremadeHoliday_', '')
-                                    clean = clean.replace('Holiday_', '')
-                                    clean = clean.replace('Surprise_', '')
-                                    clean = clean.replace('_', ' ').strip()
-                                    if clean and len(clean) > 2:
-                                        holiday_name = clean
-                                        break
-                    except:
-                        pass
+def _read_events():
+    """ 当前活动：节日/派对/婚礼…（扫描 situation 和 drama 节点） """
+    event_str = ""
+    try:
+        events = []
+        # 方法1: 从 situation 抓节日/派对
+        sm = services.get_zone_situation_manager()
+        if sm:
+            has_holiday_situation = False
+            for sit in sm.running_situations():
+                sit_name = type(sit).__name__.lower()
+                if 'holiday' in sit_name:
+                    has_holiday_situation = True
+                elif 'party' in sit_name or 'gathering' in sit_name:
+                    if "Party" not in events:
+                        events.append("Party")
+                elif 'festival' in sit_name:
+                    if "Festival" not in events:
+                        events.append("Festival")
+                elif 'wedding' in sit_name:
+                    if "Wedding" not in events:
+                        events.append("Wedding")
+                elif 'birthday' in sit_name:
+                    if "Birthday" not in events:
+                        events.append("Birthday")
+
+            # 方法2: 如果检测到节日situation，从drama节点拿具体名字
+            if has_holiday_situation:
+                holiday_name = ""
+                try:
+                    ds = services.drama_scheduler_service()
+                    if ds:
+                        for node in ds.active_nodes_gen():
+                            node_name = type(node).__name__
+                            if 'holiday' in node_name.lower():
+                                # 从 dramaNode_PremadeHoliday_Surprise_PrankDay
+                                # 提取 PrankDay 这样的名字
+                                clean = node_name.replace('dramaNode_', '')
+                                clean = clean.replace('PremadeHoliday_', '')
+                                clean = clean.replace('Holiday_', '')
+                                clean = clean.replace('Surprise_', '')
+                                clean = clean.replace('_', ' ').strip()
+                                if clean and len(clean) > 2:
+                                    holiday_name = clean
+                                    break
+                except:
+                    pass
 
-                    if not holiday_name:
-                        holiday_name = "Holiday"
-                    if holiday_name not in events:
-                        events.append(holiday_name)
+                if not holiday_name:
+                    holiday_name = "Holiday"
+                if holiday_name not in events:
+                    events.append(holiday_name)
 
-            if events:
-                event_str = " | " + ", ".join(events[:2])
-        except:
-            pass
+        if events:
+            event_str = " | " + ", ".join(events[:2])
+    except:
+        pass
+    return event_str
 
 
-        return f"{time_str} {day_str}|{weather_str} @{venue_str}{event_str}"
-    except:
-        return "[--:--]"
+# situation 开始/结束计数：变了才重新扫描活动
+_situation_version = 0
+_situations_hooked = False
 
-def get_log_time():
-    """ 单行日志极简时间 """
-    try:
-        now = services.game_clock_service().now()
-        return f"[{now.hour():02d}:{now.minute():02d}]"
-    except:
-        return "[--:--]"
 
-def _init_rel_tracks():
-    """初始化友谊和浪漫 track 对象（只跑一次）"""
-    global _friendship_track, _romance_track
+def _bump_situation_version():
+    global _situation_version
+    _situation_version += 1
+
+
+def _forget_sim_identity(sim_info):
     try:
-        if _friendship_track is not None:
-            return
-        mgr = services.get_instance_manager(sims4.resources.Types.STATISTIC)
-        if mgr:
-            _friendship_track = mgr.get(16650)
-            _romance_track = mgr.get(16651)
+        _sim_identity_cache.pop(sim_info.sim_id, None)
     except:
         pass
 
 
-def _get_rel_change(actor_info, target_info):
-    """获取关系值变化，返回如 ' F+5/R-3' 或空字符串"""
-    global _rel_cache
-    _init_rel_tracks()
+def _inject_sim_identity_hooks(sim_info_cls):
+    """
+    SimInfo 上改名字 / 年龄 / 性别的地方调用后丢掉这个 Sim 的显示信息缓存
+    属性（first_name 等）包 setter，方法（advance_age 等）包调用本身；游戏版本里没有的跳过
+    """
+    hooked = []
+    for name in ('first_name', 'last_name', 'gender', 'age'):
+        backup_name = f"_original_{name}_backup"
+        if not hasattr(sim_info_cls, backup_name):
+            prop = getattr(sim_info_cls, name, None)
+            if not isinstance(prop, property) or prop.fset is None:
+                continue
+            setattr(sim_info_cls, backup_name, prop)
+        prop = getattr(sim_info_cls, backup_name)
 
-    try:
-        actor_id = actor_info.sim_id
-        target_id = target_info.sim_id
-        tracker = actor_info.relationship_tracker
-        key = (actor_id, target_id)
+        def _setter(self, value, _fset=prop.fset):
+            _fset(self, value)
+            _forget_sim_identity(self)
 
-        # 获取当前分数
-        f_now = 0.0
-        r_now = 0.0
-        if _friendship_track:
-            try:
-                f_now = tracker.get_relationship_score(target_id, _friendship_track)
-            except:
-                pass
-        if _romance_track:
+        setattr(sim_info_cls, name, property(prop.fget, _setter, prop.fdel, prop.__doc__))
+        hooked.append(name)
+
+    for name in ('advance_age', 'apply_age', 'change_age'):
+        backup_name = f"_original_{name}_backup"
+        if not hasattr(sim_info_cls, backup_name):
+            if not hasattr(sim_info_cls, name):
+                continue
+            setattr(sim_info_cls, backup_name, getattr(sim_info_cls, name))
+
+        def _wrapper(self, *args, _original=getattr(sim_info_cls, backup_name), **kwargs):
             try:
-                r_now = tracker.get_relationship_score(target_id, _romance_track)
-            except:
-                pass
+                return _original(self, *args, **kwargs)
+            finally:
+                _forget_sim_identity(self)
 
-        # 对比上次
-        if key in _rel_cache:
-            old_f, old_r = _rel_cache[key]
-            df = round(f_now - old_f)
-            dr = round(r_now - old_r)
-
-            # 更新缓存
-            _rel_cache[key] = (f_now, r_now)
-
-            # 只有变化时才显示
-            if df == 0 and dr == 0:
-                return ""
-
-            parts = []
-            if df != 0:
-                parts.append(f"F{df:+d}")
-            if dr != 0:
-                parts.append(f"R{dr:+d}")
-            return " " + "/".join(parts)
-        else:
-            # 第一次见到这对关系，显示当前总值
-            _rel_cache[key] = (f_now, r_now)
-            f_int = round(f_now)
-            r_int = round(r_now)
-            if f_int != 0 or r_int != 0:
-                return " [F{}/R{}]".format(f_int, r_int)
-            return ""
+        setattr(sim_info_cls, name, _wrapper)
+        hooked.append(name)
+    return hooked
 
-    except:
-        return ""
 
-def clean_string(text):
-    """ 清洗代码名，使其更像人类语言 """
-    if not text: return ""
+try:
+    from sims.sim_info import SimInfo
+    _inject_sim_identity_hooks(SimInfo)
+except Exception as e:
+    log_error(f"SimInfo identity hook unavailable, names refresh on summary/zone change only: {e}", "names")
 
-    # 去掉社交互动前缀（最重要的清洗）
-    prefixes_to_remove = [
-        'mixer_social_', 'mixer_socials_', 'mixer_Social_',
-        'socialMixer_', 'socials_Targeted_', 'socials_',
-        'social_Funny_', 'sim_', 'si_',
-        'object_', 'Venue_', 'interaction_',
-    ]
-    for prefix in prefixes_to_remove:
-        if text.startswith(prefix):
-            text = text[len(prefix):]
-            break
 
-    # 去掉尾部标签（targeted_friendly_alwaysOn 等）
-    tags_to_remove = [
-        '_targeted_romance_alwaysOn', '_targeted_mean_alwaysOn',
-        '_targeted_mean_emotionSpecific', '_targeted_mean',
-        '_targeted_friendly_alwaysOn', '_targeted_Friendly_AlwaysOn',
-        '_targeted_Friendly_MiddleScore',
+try:
+    from situations.situation_manager import SituationManager
+
+    if not hasattr(SituationManager, '_original_create_situation_backup'):
+        SituationManager._original_create_situation_backup = SituationManager.create_situation
+    if not hasattr(SituationManager, '_original_destroy_situation_backup'):
+        SituationManager._original_destroy_situation_backup = SituationManager.destroy_situation
+
+    def _new_create_situation(self, *args, **kwargs):
+        _bump_situation_version()
+        return SituationManager._original_create_situation_backup(self, *args, **kwargs)
+
+    def _new_destroy_situation(self, *args, **kwargs):
+        _bump_situation_version()
+        return SituationManager._original_destroy_situation_backup(self, *args, **kwargs)
+
+    SituationManager.create_situation = _new_create_situation
+    SituationManager.destroy_situation = _new_destroy_situation
+    _situations_hooked = True
+except Exception as e:
+    log_error(f"Situation hook unavailable, events are rescanned every time: {e}", "header")
+
+
+class _HeaderContextCache:
+    """
+    标题上下文缓存，三项各自失效：
+      地点 ← 场景切换；天气 ← 场景切换或整点；活动 ← situation 开始/结束（或换天）
+    """
+
+    def __init__(self):
+        self._entries = {}    # 名字 → (key, 值)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, key, reader):
+        entry = self._entries.get(name)
+        if key is not None and entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = reader()
+        self._entries[name] = (key, value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+
+_header_cache = _HeaderContextCache()
+
+
+def get_header_context():
+    """ 生成标题上下文: [时间] 星期|天气 @地点(真实名字) """
+    try:
+        now = services.game_clock_service().now()
+        time_str = f"[{now.hour():02d}:{now.minute():02d}]"
+
+        # 1. 星期
+        days_map = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+        day_str = days_map[now.day() % 7]
+
+        zone_id = services.current_zone_id()
+        sim_day = _sim_day()
+
+        # 2. 天气 / 3. 地点 / 4. 活动
+        weather_str = _header_cache.get('weather', (zone_id, int(sim_day * 24)), _read_weather)
+        venue_str = _header_cache.get('venue', zone_id, _read_venue)
+        events_key = (zone_id, int(sim_day), _situation_version) if _situations_hooked else None
+        event_str = _header_cache.get('events', events_key, _read_events)
+
+        return f"{time_str} {day_str}|{weather_str} @{venue_str}{event_str}"
+    except:
+        return "[--:--]"
+
+def _format_log_time(now):
+    """ 把游戏时间对象格式化成 [HH:MM] """
+    try:
+        return f"[{now.hour():02d}:{now.minute():02d}]"
+    except:
+        return "[--:--]"
+
+
+def get_log_time():
+    """ 单行日志极简时间 """
+    try:
+        return _format_log_time(services.game_clock_service().now())
+    except:
+        return "[--:--]"
+
+def _init_rel_tracks():
+    """初始化友谊和浪漫 track 对象（只跑一次）"""
+    global _friendship_track, _romance_track
+    try:
+        if _friendship_track is not None:
+            return
+        mgr = services.get_instance_manager(sims4.resources.Types.STATISTIC)
+        if mgr:
+            _friendship_track = mgr.get(16650)
+            _romance_track = mgr.get(16651)
+    except:
+        pass
+
+
+def _read_rel_scores(actor_info, target_id):
+    """读取当前友谊/浪漫分数，返回 (f, r)"""
+    _init_rel_tracks()
+    tracker = actor_info.relationship_tracker
+    f_now = 0.0
+    r_now = 0.0
+    if _friendship_track:
+        try:
+            f_now = tracker.get_relationship_score(target_id, _friendship_track)
+        except:
+            pass
+    if _romance_track:
+        try:
+            r_now = tracker.get_relationship_score(target_id, _romance_track)
+        except:
+            pass
+    return (f_now, r_now)
+
+
+def _resolve_rel_track(track):
+    """add_relationship_score 的 track 参数 → 友谊/浪漫 track（DEFAULT 即友谊）"""
+    _init_rel_tracks()
+    if track is None or not isinstance(track, type):
+        return _friendship_track
+    if track is _friendship_track or track is _romance_track:
+        return track
+    return None
+
+
+def _sim_day():
+    """当前游戏时间（以天为单位，浮点）"""
+    try:
+        return services.time_service().sim_now.absolute_days()
+    except:
+        return 0.0
+
+
+class _RelDeltaTracker:
+    """
+    事件驱动的关系值变化追踪
+    注入 RelationshipTracker.add_relationship_score，只给已登记的家庭成员 pair 累计变化量；
+    日志条目直接取累计值，不再每条调用两次 get_relationship_score
+    和 NPC 的 pair 照旧轮询（读分数和 base 对比）
+    衰减等不走 add_relationship_score 的变化注入看不到：每 RESYNC_EVERY 次或换了游戏日
+    就真读一次分数，和 base 的差额算进这一条，base 重新对齐
+    pair 在日志里第一次出现时登记（读一次总值），超过 N 个游戏日没出现就淘汰
+    """
+    MAX_PAIRS = 512
+    RESYNC_EVERY = 8
+
+    def __init__(self):
+        # (actor_id, target_id) → [base_f, base_r, pending_f, pending_r, last_seen_day, 是否家庭 pair, 距上次真读的次数]
+        self._pairs = OrderedDict()
+        self.hooked = False  # 注入失败时退回轮询（读分数和 base 对比）
+        self.resyncs = 0
+
+    def __len__(self):
+        return len(self._pairs)
+
+    def is_watched(self, actor_id, target_id):
+        for key in ((actor_id, target_id), (target_id, actor_id)):
+            entry = self._pairs.get(key)
+            if entry is not None and entry[5]:
+                return True
+        return False
+
+    def on_score_changed(self, actor_id, target_id, track, delta):
+        """游戏里分数变了：友谊/浪漫是双向共享的，两个方向都记"""
+        if not delta:
+            return
+        idx = 2 if track is _friendship_track else 3
+        for key in ((actor_id, target_id), (target_id, actor_id)):
+            entry = self._pairs.get(key)
+            if entry is not None and entry[5]:
+                entry[idx] += delta
+
+    def take(self, actor_info, target_id, household=False):
+        """
+        取出 actor → target 自上次以来的变化（household：两边都是家庭成员）
+        返回 (is_first, f, r)：第一次见到时是总值，之后是变化量
+        """
+        key = (actor_info.sim_id, target_id)
+        day = _sim_day()
+        entry = self._pairs.get(key)
+        if entry is None:
+            f_now, r_now = _read_rel_scores(actor_info, target_id)
+            self._pairs[key] = [f_now, r_now, 0.0, 0.0, day, household, 0]
+            self._evict(day)
+            return (True, f_now, r_now)
+
+        self._pairs.move_to_end(key)
+        changed_day = int(entry[4]) != int(day)
+        entry[4] = day
+        entry[6] += 1
+        if (self.hooked and household and entry[5]
+                and not changed_day and entry[6] < self.RESYNC_EVERY):
+            df, dr = entry[2], entry[3]
+            entry[0] += df
+            entry[1] += dr
+        else:
+            # 轮询：NPC pair / 没注入 / 该对齐了 / 刚变成（或不再是）家庭 pair
+            f_now, r_now = _read_rel_scores(actor_info, target_id)
+            df, dr = f_now - entry[0], r_now - entry[1]
+            entry[0], entry[1] = f_now, r_now
+            if entry[5]:
+                self.resyncs += 1
+            entry[5] = household
+            entry[6] = 0
+        entry[2] = entry[3] = 0.0
+        return (False, df, dr)
+
+    def _evict(self, day):
+        """LRU 顺序：最旧的在前，过期或超量就丢"""
+        max_age = _settings.get("rel_delta_evict_days", 3)
+        while self._pairs:
+            oldest_key = next(iter(self._pairs))
+            if len(self._pairs) <= self.MAX_PAIRS and day - self._pairs[oldest_key][4] <= max_age:
+                break
+            self._pairs.popitem(last=False)
+
+    def clear(self):
+        self._pairs.clear()
+
+
+_rel_delta = _RelDeltaTracker()
+
+
+def _format_rel_delta(token):
+    """(is_first, f, r) → ' F+5/R-3' / ' [F98/R10]' 或空字符串"""
+    if not token:
+        return ""
+    is_first, f_val, r_val = token
+    f_int = round(f_val)
+    r_int = round(r_val)
+    if is_first:
+        # 第一次见到这对关系，显示当前总值
+        if f_int != 0 or r_int != 0:
+            return " [F{}/R{}]".format(f_int, r_int)
+        return ""
+
+    # 只有变化时才显示
+    if f_int == 0 and r_int == 0:
+        return ""
+    parts = []
+    if f_int != 0:
+        parts.append(f"F{f_int:+d}")
+    if r_int != 0:
+        parts.append(f"R{r_int:+d}")
+    return " " + "/".join(parts)
+
+
+def _new_add_relationship_score(self, target_sim_id, increment, *args, **kwargs):
+    """注入：已登记 pair 的友谊/浪漫分数变化时记下实际变化量（含上下限截断）"""
+    watch = None
+    try:
+        owner = getattr(self, '_sim_info', None)
+        if owner is not None and _rel_delta.is_watched(owner.sim_id, target_sim_id):
+            track = _resolve_rel_track(args[0] if args else kwargs.get('track', None))
+            if track is not None:
+                watch = (owner.sim_id, track, self.get_relationship_score(target_sim_id, track))
+    except:
+        watch = None
+
+    result = RelationshipTracker._original_add_score_backup(self, target_sim_id, increment, *args, **kwargs)
+
+    if watch is not None:
+        try:
+            owner_id, track, before = watch
+            after = self.get_relationship_score(target_sim_id, track)
+            _rel_delta.on_score_changed(owner_id, target_sim_id, track, after - before)
+        except:
+            pass
+    return result
+
+
+try:
+    from relationships.relationship_tracker import RelationshipTracker
+    if not hasattr(RelationshipTracker, '_original_add_score_backup'):
+        RelationshipTracker._original_add_score_backup = RelationshipTracker.add_relationship_score
+    RelationshipTracker.add_relationship_score = _new_add_relationship_score
+    _rel_delta.hooked = True
+except Exception as e:
+    log_error(f"Relationship score hook unavailable, falling back to polling: {e}", "rel_delta")
+
+
+# 关系 bit 变化监听：回调参数 (owner_sim_id, target_sim_id)
+_rel_bit_listeners = []
+
+
+def _notify_rel_bits_changed(tracker, target_sim_id):
+    try:
+        owner = getattr(tracker, '_sim_info', None)
+        if owner is None:
+            return
+        for listener in _rel_bit_listeners:
+            listener(owner.sim_id, target_sim_id)
+    except:
+        pass
+
+
+def _inject_rel_bit_method(name):
+    """ 注入 RelationshipTracker.<name>：调用前通知 bit 变化监听 """
+    backup_name = f"_original_{name}_backup"
+    if not hasattr(RelationshipTracker, backup_name):
+        setattr(RelationshipTracker, backup_name, getattr(RelationshipTracker, name))
+    original = getattr(RelationshipTracker, backup_name)
+
+    def _wrapper(self, target_sim_id, *args, **kwargs):
+        _notify_rel_bits_changed(self, target_sim_id)
+        return original(self, target_sim_id, *args, **kwargs)
+
+    setattr(RelationshipTracker, name, _wrapper)
+
+
+_rel_bits_hooked = False
+try:
+    _inject_rel_bit_method('add_relationship_bit')
+    _inject_rel_bit_method('remove_relationship_bit')
+    _rel_bits_hooked = True
+    _inject_rel_bit_method('destroy_relationship')
+except Exception as e:
+    if not _rel_bits_hooked:
+        log_error(f"Relationship bit hook unavailable: {e}", "rel_bits")
+
+
+def _inject_relationship_bit_method(relationship_cls, name):
+    """
+    注入 Relationship.<name>(actor_sim_id, target_sim_id, ...)：
+    轨道阈值加减的 bit（romantic-* 等）直接走 Relationship，不经过 RelationshipTracker
+    """
+    backup_name = f"_original_{name}_backup"
+    if not hasattr(relationship_cls, backup_name):
+        setattr(relationship_cls, backup_name, getattr(relationship_cls, name))
+    original = getattr(relationship_cls, backup_name)
+
+    def _wrapper(self, actor_sim_id, target_sim_id, *args, **kwargs):
+        try:
+            for listener in _rel_bit_listeners:
+                listener(actor_sim_id, target_sim_id)
+        except:
+            pass
+        return original(self, actor_sim_id, target_sim_id, *args, **kwargs)
+
+    setattr(relationship_cls, name, _wrapper)
+
+
+_relationship_bits_hooked = False
+try:
+    from relationships.relationship import Relationship
+    for _name in ('add_relationship_bit', 'remove_bit'):
+        if hasattr(Relationship, _name):
+            _inject_relationship_bit_method(Relationship, _name)
+            _relationship_bits_hooked = True
+except Exception as e:
+    log_error(f"Relationship-level bit hook unavailable (daily validation only): {e}", "rel_bits")
+
+def clean_string(text):
+    """ 清洗代码名，使其更像人类语言 """
+    if not text: return ""
+
+    # 去掉社交互动前缀（最重要的清洗）
+    prefixes_to_remove = [
+        'mixer_social_', 'mixer_socials_', 'mixer_Social_',
+        'socialMixer_', 'socials_Targeted_', 'socials_',
+        'social_Funny_', 'sim_', 'si_',
+        'object_', 'Venue_', 'interaction_',
+    ]
+    for prefix in prefixes_to_remove:
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+            break
+
+    # 去掉尾部标签（targeted_friendly_alwaysOn 等）
+    tags_to_remove = [
+        '_targeted_romance_alwaysOn', '_targeted_mean_alwaysOn',
+        '_targeted_mean_emotionSpecific', '_targeted_mean',
+        '_targeted_friendly_alwaysOn', '_targeted_Friendly_AlwaysOn',
+        '_targeted_Friendly_MiddleScore',
         '_targeted_funny_alwaysOn', '_targeted_funny_alwaysOn_skills',
         '_targeted_mischief_skills',
         '_group_Funny_alwaysOn', '_group_funny_alwaysOn',
@@ -674,20 +1542,29 @@ def get_sim_name_robust(sim):
         return f"Sim({sim_id})"
 
 
-def get_target_name_smart(target):
-    """ 获取交互对象的名字 """
-    if not target: return ""
-    try:
-        # 如果是 Sim
-        if hasattr(target, 'is_sim') and target.is_sim:
-            return get_sim_name_robust(target)
-        # 如果是物品部件 (比如床的左边/右边)
-        if hasattr(target, 'is_part') and target.is_part:
-            if hasattr(target, 'part_owner'):
-                target = target.part_owner
+def _target_type(target):
+    """ 物品目标的类型（部件取所属物品，比如床的左边/右边 → 床） """
+    if hasattr(target, 'is_part') and target.is_part:
+        if hasattr(target, 'part_owner'):
+            target = target.part_owner
+    return type(target)
+
+
+def _target_id(target):
+    """ 去重用的目标 id：Sim 用 sim_id，物品用所属物品的 id """
+    if not target:
+        return None
+    if getattr(target, 'is_sim', False):
+        return target.sim_id
+    if hasattr(target, 'is_part') and target.is_part and hasattr(target, 'part_owner'):
+        target = target.part_owner
+    return getattr(target, 'id', None)
 
-        # 获取物品类名
-        raw_name = type(target).__name__
+
+def _object_type_name(obj_type):
+    """ 物品类型 → 显示名 """
+    try:
+        raw_name = obj_type.__name__
 
         # 过滤无意义的内存地址名
         if "0x" in raw_name or raw_name == "NoneType":
@@ -698,40 +1575,91 @@ def get_target_name_smart(target):
         return "Object"
 
 
+def get_target_name_smart(target):
+    """ 获取交互对象的名字 """
+    if not target: return ""
+    try:
+        # 如果是 Sim
+        if hasattr(target, 'is_sim') and target.is_sim:
+            return get_sim_name_robust(target)
+        return _object_type_name(_target_type(target))
+    except:
+        return "Object"
+
+
+def _snapshot_mood(sim):
+    """ 情绪快照：(当前 mood 类型, 当前 buff 类型元组)，不做字符串处理 """
+    buffs = ()
+    if hasattr(sim, 'get_active_buff_types'):
+        buffs = tuple(sim.get_active_buff_types())
+    return (sim.get_mood(), buffs)
+
+
 def get_mood_delta(sim):
     """
     智能情绪抓取：
     只抓取 '可见' 的 Buff，并优先展示造成当前主导情绪的 Buff。
     """
     try:
-        current_mood_obj = sim.get_mood()
-        mood_name = current_mood_obj.__name__.replace('Mood_', '')
+        current_mood_obj, raw_buffs = _snapshot_mood(sim)
+        return _render_mood_delta(str(sim.id), current_mood_obj, raw_buffs)
+    except:
+        return ""
 
-        primary_buffs = []
-        secondary_buffs = []
 
-        if hasattr(sim, 'get_active_buff_types'):
-            raw_buffs = sim.get_active_buff_types()
-            blacklist = ['Hidden', 'System', 'Controller', 'Autonomy', 'Cooldown', 'Role']
+_BUFF_BLACKLIST = ['Hidden', 'System', 'Controller', 'Autonomy', 'Cooldown', 'Role']
 
-            for b in raw_buffs:
-                # 只看可见的
-                if hasattr(b, 'visible') and not b.visible: continue
-                # 过滤黑名单关键词
-                b_name = b.__name__
-                if any(bad in b_name for bad in blacklist): continue
 
-                clean_name = b_name.replace('buff_', '').replace('Buff_', '')
-                clean_name = clean_name.replace('Sim_', '').replace('Reason_', '')
+def _get_buff_meta(b):
+    """
+    Buff 类型是静态 tuning：第一次见到时算好 (是否展示, 显示名, mood_type) 并缓存
+    """
+    meta = _buff_meta_cache.get(b)
+    if meta is not None:
+        return meta
 
-                try:
-                    # 如果这个 Buff 的类型和当前主导情绪一致，优先展示
-                    if hasattr(b, 'mood_type') and b.mood_type == current_mood_obj:
-                        primary_buffs.append(clean_name)
-                    else:
-                        secondary_buffs.append(clean_name)
-                except:
-                    secondary_buffs.append(clean_name)
+    b_name = b.__name__
+    # 只看可见的，过滤黑名单关键词
+    keep = not (hasattr(b, 'visible') and not b.visible)
+    if keep and any(bad in b_name for bad in _BUFF_BLACKLIST):
+        keep = False
+
+    clean_name = b_name.replace('buff_', '').replace('Buff_', '')
+    clean_name = clean_name.replace('Sim_', '').replace('Reason_', '')
+
+    try:
+        mood_type = getattr(b, 'mood_type', None)
+    except:
+        mood_type = None
+
+    meta = (keep, clean_name, mood_type)
+    _buff_meta_cache[b] = meta
+    return meta
+
+
+def _render_mood_delta(sim_id, current_mood_obj, raw_buffs):
+    """ 根据情绪快照生成 ' (Happy[...])'，和上次一样则返回空字符串 """
+    try:
+        # 情绪和 buff 集合都没变 → 结果一定和上次相同，直接跳过
+        memo_key = (current_mood_obj, frozenset(raw_buffs))
+        if _sim_buff_memo.get(sim_id) == memo_key:
+            return ""
+        _sim_buff_memo[sim_id] = memo_key
+
+        mood_name = current_mood_obj.__name__.replace('Mood_', '')
+
+        primary_buffs = []
+        secondary_buffs = []
+
+        for b in raw_buffs:
+            keep, clean_name, mood_type = _get_buff_meta(b)
+            if not keep:
+                continue
+            # 如果这个 Buff 的类型和当前主导情绪一致，优先展示
+            if mood_type is not None and mood_type == current_mood_obj:
+                primary_buffs.append(clean_name)
+            else:
+                secondary_buffs.append(clean_name)
 
         # 排序：主导情绪的 Buff 排前面
         sorted_buffs = primary_buffs + secondary_buffs
@@ -743,7 +1671,6 @@ def get_mood_delta(sim):
             current_mood_full += f"[{','.join(top_buffs)}]"
 
         # 缓存机制：如果情绪没变，就不重复记录
-        sim_id = str(sim.id)
         last_known = _sim_mood_cache.get(sim_id, "")
 
         if current_mood_full == last_known:
@@ -755,61 +1682,231 @@ def get_mood_delta(sim):
         return ""
 
 
+class _KeywordMatcher:
+    """
+    关键词匹配引擎：多张关键词表编译成一个正则，单次扫描字符串
+    tables 按优先级排列 [(表名, [关键词...]), ...]，返回命中的最高优先级表名
+    """
+
+    def __init__(self, tables):
+        self.tables = [(name, tuple(words)) for name, words in tables if words]
+        self._rank = {name: i for i, (name, _) in enumerate(self.tables)}
+        groups = []
+        for name, words in self.tables:
+            # 同一位置长词优先
+            alts = '|'.join(re.escape(w) for w in sorted(set(words), key=len, reverse=True))
+            groups.append(f"(?P<{name}>{alts})")
+        # 零宽前瞻：每个位置都试一次，关键词互相重叠也不会漏
+        self._regex = re.compile('(?=' + '|'.join(groups) + ')') if groups else None
+
+    def first_table(self, text):
+        """单次扫描，返回命中的最高优先级表名；都没命中返回 None"""
+        if self._regex is None:
+            return None
+        best = None
+        best_rank = len(self.tables)
+        for m in self._regex.finditer(text):
+            rank = self._rank[m.lastgroup]
+            if rank == 0:
+                return m.lastgroup
+            if rank < best_rank:
+                best, best_rank = m.lastgroup, rank
+        return best
+
+    def matches(self, text):
+        """是否命中任意一张表"""
+        return self._regex is not None and self._regex.search(text) is not None
+
+    def first_table_naive(self, text):
+        """旧的 any() 链写法，只用于基准对比和结果校验"""
+        for name, words in self.tables:
+            if any(w in text for w in words):
+                return name
+        return None
+
+
+# 白名单最优先：这些无论如何都保留
+_ACTION_WHITELIST = [
+    'kiss', 'flirt', 'fight', 'woohoo', 'dance', 'propose',
+    'wedding', 'hug', 'express', 'compliment', 'insult', 'joke',
+    'gossip', 'encourage', 'secret', 'romance', 'mean', 'friendly',
+    'mischief', 'yell', 'chew', 'scare', 'impression', 'lash',
+    'swear', 'attraction', 'reach', 'recipe', 'gourmet', 'weather',
+    'affectionate', 'greet', 'wave goodbye', 'introduction',
+    'cry', 'calm', 'peptalk', 'pushups', 'practice', 'paint',
+    'cook', 'repair', 'upgrade', 'garden', 'fish', 'write',
+    'read', 'play', 'sing', 'guitar', 'violin', 'dj',
+    'woohoo', 'tryfor', 'bath', 'shower', 'wash dish',
+    'homework', 'skill', 'work', 'career',
+    'drink', 'spell', 'knit', 'photo',
+    'ballroom', 'kick', 'pickup',
+]
+
+# 黑名单：这些过滤掉
+_ACTION_BLACKLIST = [
+    'stand', 'idle', 'route', 'monitor', 'situation', 'dream',
+    'nap', 'watch', 'wait', 'check', 'carry', 'putdown',
+    'picker', 'chooser', 'touching', 'create_and_use', 'passive',
+    'posture', 'adjustment', 'generic', 'autonomy', 'reaction',
+    'job_performance', 'buff_', 'mixer', 'flush', 'moveaway',
+    'chatting', 'stc', 'sim-stand',
+    'push_leave', 'npcleave', 'leave_lot',
+    'welcomewagon', 'aggregate', 'autonomous',
+    'emotion_idle', 'emotion_failure',
+    'marketstalls_mixers', 'food_eat',
+    'holdobj', 'put_down', 'switch_to_default',
+    'earbuds', 'swipe', 'deploy', 'satisfy',
+    'socialpicker','ai','log','tamponpad','plasmapack','mccommander',
+    'opensimprofile'
+]
+
+_ACTION_MATCHER = _KeywordMatcher([
+    ('keep', _ACTION_WHITELIST),
+    ('drop', _ACTION_BLACKLIST),
+])
+
+
 def is_meaningful(action_name):
-    """ 过滤垃圾动作 """
-    action = action_name.lower()
-
-    # 白名单最优先：这些无论如何都保留
-    whitelist = [
-        'kiss', 'flirt', 'fight', 'woohoo', 'dance', 'propose',
-        'wedding', 'hug', 'express', 'compliment', 'insult', 'joke',
-        'gossip', 'encourage', 'secret', 'romance', 'mean', 'friendly',
-        'mischief', 'yell', 'chew', 'scare', 'impression', 'lash',
-        'swear', 'attraction', 'reach', 'recipe', 'gourmet', 'weather',
-        'affectionate', 'greet', 'wave goodbye', 'introduction',
-        'cry', 'calm', 'peptalk', 'pushups', 'practice', 'paint',
-        'cook', 'repair', 'upgrade', 'garden', 'fish', 'write',
-        'read', 'play', 'sing', 'guitar', 'violin', 'dj',
-        'woohoo', 'tryfor', 'bath', 'shower', 'wash dish',
-        'homework', 'skill', 'work', 'career',
-        'drink', 'spell', 'knit', 'photo',
-        'ballroom', 'kick', 'pickup',
-    ]
-    if any(w in action for w in whitelist):
-        return True
+    """ 过滤垃圾动作（白名单优先，其次黑名单，单次扫描） """
+    return _ACTION_MATCHER.first_table(action_name.lower()) != 'drop'
 
-    # 黑名单：这些过滤掉
-    blacklist = [
-        'stand', 'idle', 'route', 'monitor', 'situation', 'dream',
-        'nap', 'watch', 'wait', 'check', 'carry', 'putdown',
-        'picker', 'chooser', 'touching', 'create_and_use', 'passive',
-        'posture', 'adjustment', 'generic', 'autonomy', 'reaction',
-        'job_performance', 'buff_', 'mixer', 'flush', 'moveaway',
-        'chatting', 'stc', 'sim-stand',
-        'push_leave', 'npcleave', 'leave_lot',
-        'welcomewagon', 'aggregate', 'autonomous',
-        'emotion_idle', 'emotion_failure',
-        'marketstalls_mixers', 'food_eat',
-        'holdobj', 'put_down', 'switch_to_default',
-        'earbuds', 'swipe', 'deploy', 'satisfy',
-        'socialpicker','ai','log','tamponpad','plasmapack','mccommander',
-        'opensimprofile'
-    ]
-    if any(x in action for x in blacklist):
-        return False
 
-    return True
+# 社交互动：去重窗口更短，避免连续的聊天/调情被误判为重复
+_SOCIAL_MATCHER = _KeywordMatcher([
+    ('social', ['social', 'romance', 'kiss', 'flirt', 'hug', 'chat']),
+])
 
 
-def is_active_sim(sim):
-    """ 判断是否是当前家庭的 Sim """
+def _invalidate_household_ids(*args, **kwargs):
+    """家庭成员 / 可选 Sim 变化时清掉索引，下次访问再重建"""
+    global _household_ids
+    _household_ids = None
+    _sim_identity_cache.clear()
+
+
+def _get_household_ids():
+    """
+    返回当前家庭 sim_id 的 frozenset（缓存）
+    只在 selectable sims 变化、切换 client 或切换场景时重建
+    """
+    global _household_ids, _household_watch_client
+    ids = _household_ids
+    if ids is not None:
+        return ids
     try:
         client = services.client_manager().get_first_client()
-        if client and sim.sim_info in client.selectable_sims:
-            return True
+        if not client:
+            return frozenset()  # 还没进 Live Mode，不缓存
+        if client is not _household_watch_client:
+            # 家庭变化（加人/移出/切换家庭）时由游戏回调通知
+            try:
+                client.register_selectable_set_changed(_invalidate_household_ids)
+            except:
+                pass
+            _household_watch_client = client
+        ids = frozenset(si.sim_id for si in client.selectable_sims)
+        _household_ids = ids
+        return ids
     except:
-        pass
-    return False
+        return frozenset()
+
+
+def classify_affordance(affordance, raw_action):
+    """
+    按 affordance 类型缓存 clean_string + is_meaningful 的结果
+    返回 (action, meaningful, is_social)；预热后每个事件只需一次 dict 查找
+    """
+    entry = _affordance_cache.get(affordance)
+    if entry is not None:
+        _affordance_cache_stats["hits"] += 1
+        return entry
+    _affordance_cache_stats["misses"] += 1
+    action = clean_string(raw_action)
+    entry = (action, is_meaningful(action), _SOCIAL_MATCHER.matches(action.lower()))
+    _affordance_cache[affordance] = entry
+    return entry
+
+
+def _format_sim_day(day):
+    """ 游戏天数（浮点）→ 'D12 08:05' """
+    whole = int(day)
+    minutes = int(round((day - whole) * 1440))
+    if minutes >= 1440:
+        whole += 1
+        minutes -= 1440
+    return f"D{whole} {minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class _AffordanceHistogram:
+    """
+    调试模式的 affordance 频率统计（固定内存）：
+    原始名字 → [清洗后的动作, 保留次数, 过滤次数, 首次出现, 最后出现]（游戏天数）
+    种类超过 capacity 后，新名字都计入 <other>
+    """
+    OVERFLOW = "<other>"
+
+    def __init__(self, capacity=2000):
+        self.capacity = capacity
+        self._rows = {}
+
+    def record(self, raw_name, action, kept):
+        row = self._rows.get(raw_name)
+        if row is None:
+            if len(self._rows) >= self.capacity:
+                raw_name = self.OVERFLOW
+                action = ""
+                row = self._rows.get(raw_name)
+            if row is None:
+                day = _sim_day()
+                row = [action, 0, 0, day, day]
+                self._rows[raw_name] = row
+        if kept:
+            row[1] += 1
+        else:
+            row[2] += 1
+        row[4] = _sim_day()
+
+    def rows(self):
+        """ 按总次数从多到少：(名字, 动作, 保留, 过滤, 首次, 最后) """
+        return sorted(((name,) + tuple(row) for name, row in self._rows.items()),
+                      key=lambda r: (-(r[2] + r[3]), r[0]))
+
+    def export(self, output_dir):
+        """ 写 CSV 和 JSON，返回 (csv 路径, json 路径) """
+        rows = self.rows()
+        path_csv = os.path.join(output_dir, "Sims4_Affordance_Histogram.csv")
+        path_json = os.path.join(output_dir, "Sims4_Affordance_Histogram.json")
+
+        with open(path_csv, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["affordance", "action", "kept", "filtered", "first_seen", "last_seen"])
+            for name, action, kept, filtered, first, last in rows:
+                writer.writerow([name, action, kept, filtered,
+                                 _format_sim_day(first), _format_sim_day(last)])
+
+        data = [{"affordance": name, "action": action, "kept": kept, "filtered": filtered,
+                 "first_seen": _format_sim_day(first), "last_seen": _format_sim_day(last)}
+                for name, action, kept, filtered, first, last in rows]
+        with open(path_json, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path_csv, path_json
+
+    def clear(self):
+        self._rows.clear()
+
+    def __len__(self):
+        return len(self._rows)
+
+
+_aff_histogram = _AffordanceHistogram()
+
+
+def is_active_sim(sim):
+    """ 判断是否是当前家庭的 Sim（O(1) 查索引） """
+    try:
+        return sim.sim_id in _get_household_ids()
+    except:
+        return False
 
 # =====================================================
 # Bit 分类引擎
@@ -828,6 +1925,137 @@ _NOISE = [
     'romantic-HaveDoneWooHoo',
 ]
 
+_NOISE_MATCHER = _KeywordMatcher([('noise', _NOISE)])
+
+
+_bit_class_table = {}  # bit 类型 → (category, label, duration) 或 None（噪音/不认识）
+
+
+def _classify_bit_name(name):
+    """ 单个 bit 名 → (category, label, duration)；噪音或不认识返回 None """
+    if _NOISE_MATCHER.matches(name):
+        return None
+
+    # === 家庭 ===
+    if 'family_Target_' in name:
+        rel = name.replace('family_Target_', '').replace('_Actor', '').replace('Of', '')
+        family_map = {
+            'IsParent': 'Parent',
+            'IsSonOrDaughter': 'Child',
+            'IsBrotherSister': 'Sibling',
+            'IsHalfsibling': 'HalfSibling',
+            'IsGrandparent': 'Grandparent',
+            'IsGrandchild': 'Grandchild',
+            'IsAuntUncle': 'Aunt/Uncle',
+            'IsNieceNephew': 'Niece/Nephew',
+            'IsCousin': 'Cousin',
+            'IsStepSibling': 'StepSibling',
+            'IsStepParent': 'StepParent',
+            'IsStepChild': 'StepChild',
+            'IsSiblingInLaw': 'InLaw',
+        }
+        for key, label in family_map.items():
+            if key in rel:
+                return ('family', label, None)
+        return ('family', rel, None)
+
+    if 'RomanticCombo_' in name:
+        return ('romance', name.replace('RomanticCombo_', ''), None)
+
+    if 'romanceTrope_' in name:
+        return ('romance', name.replace('romanceTrope_', ''), None)
+
+    if name == 'romantic-Married':
+        return ('romance', 'Married', None)
+
+    if name == 'romantic-Engaged':
+        return ('romance', 'Engaged', None)
+
+    if 'CheatedWith' in name:
+        return ('romance', 'CheatedWith', None)
+
+    if 'romantic-Significant' in name:
+        return ('romance', 'Significant', None)
+
+    if 'relBit_Attraction_' in name:
+        label = name.split('Actor_')[-1].replace('_Target', '').replace('_', '')
+        return ('attraction', label, None)
+
+    if 'relBit_RelSat_' in name:
+        label = name.split('Actor_')[-1].replace('_Target', '').replace('With', '').replace('_', '')
+        return ('attraction', label, None)
+
+    if 'SecretChild' in name or 'Scandal' in name:
+        label = name.replace('relbit_', '').replace('_', ' ')
+        return ('scandal', label, None)
+
+    if 'sentimentBit_' in name:
+        clean = name.replace('sentimentBit_Actor_', '').replace('_Target', '')
+        duration = "ST"
+        if '_LT_' in clean:
+            duration = "LT"
+            parts = clean.split('_LT_', 1)
+            emotion = parts[0]
+            reason = parts[1] if len(parts) > 1 else ""
+        elif '_ST_' in clean:
+            duration = "ST"
+            parts = clean.split('_ST_', 1)
+            emotion = parts[0]
+            reason = parts[1] if len(parts) > 1 else ""
+        else:
+            emotion = clean
+            reason = ""
+
+        emotion = emotion.replace('To_', '').replace('By_', '').replace('At_', '')
+        emotion = emotion.replace('_', '')
+        reason = reason.replace('_', ' ').strip()
+
+        if reason:
+            label = f"{emotion}({duration}:{reason})"
+        else:
+            label = f"{emotion}({duration})"
+
+        return ('sentiment', label, duration)
+
+    if 'romantic-' in name:
+        return ('romance', name.replace('romantic-', ''), None)
+
+    if 'Rivalry' in name:
+        return ('family', 'Rival', None)
+
+    if 'familyTrope_' in name:
+        label = name.replace('familyTrope_', '')
+        return ('family_trope', label, None)
+
+    return None
+
+
+def _classify_bit(bit):
+    """ 查表分类；bit 类型是静态 tuning，第一次见到时算好缓存 """
+    try:
+        return _bit_class_table[bit]
+    except KeyError:
+        pass
+    name = bit.__name__ if hasattr(bit, '__name__') else str(bit)
+    entry = _classify_bit_name(name)
+    _bit_class_table[bit] = entry
+    return entry
+
+
+def _prebuild_bit_table(manager):
+    """ RELATIONSHIP_BIT tuning 加载完成后预先填满分类表 """
+    try:
+        for bit in manager.types.values():
+            _classify_bit(bit)
+    except Exception as e:
+        log_error(f"Bit table prebuild error: {e}", "bit_table")
+
+
+try:
+    services.get_instance_manager(sims4.resources.Types.RELATIONSHIP_BIT).add_on_load_complete(_prebuild_bit_table)
+except:
+    pass
+
 
 def _classify_all_bits(bits):
     result = {
@@ -840,123 +2068,301 @@ def _classify_all_bits(bits):
     }
 
     for bit in bits:
-        name = bit.__name__ if hasattr(bit, '__name__') else str(bit)
-
-        if any(skip in name for skip in _NOISE):
-            continue
-
-        # === 家庭 ===
-        if 'family_Target_' in name:
-            rel = name.replace('family_Target_', '').replace('_Actor', '').replace('Of', '')
-            family_map = {
-                'IsParent': 'Parent',
-                'IsSonOrDaughter': 'Child',
-                'IsBrotherSister': 'Sibling',
-                'IsHalfsibling': 'HalfSibling',
-                'IsGrandparent': 'Grandparent',
-                'IsGrandchild': 'Grandchild',
-                'IsAuntUncle': 'Aunt/Uncle',
-                'IsNieceNephew': 'Niece/Nephew',
-                'IsCousin': 'Cousin',
-                'IsStepSibling': 'StepSibling',
-                'IsStepParent': 'StepParent',
-                'IsStepChild': 'StepChild',
-                'IsSiblingInLaw': 'InLaw',
-            }
-            for key, label in family_map.items():
-                if key in rel:
-                    result['family'].append(label)
-                    break
-            else:
-                result['family'].append(rel)
+        entry = _classify_bit(bit)
+        if entry is None:
             continue
+        category, label, duration = entry
+        if category == 'sentiment':
+            result['sentiment'].append((duration, label))
+        else:
+            result[category].append(label)
 
-        if 'RomanticCombo_' in name:
-            result['romance'].append(name.replace('RomanticCombo_', ''))
-            continue
+    result['sentiment'].sort(key=lambda x: (0 if x[0] == 'LT' else 1, x[1]))
+    result['sentiment'] = [item[1] for item in result['sentiment']]
 
-        if 'romanceTrope_' in name:
-            result['romance'].append(name.replace('romanceTrope_', ''))
-            continue
+    return result
+# ========== 角色特征抓取 ==========
 
-        if name == 'romantic-Married':
-            result['romance'].append('Married')
-            continue
+def _build_relationship_sections(members, classified_pairs):
+    """
+    根据每个有序 pair 分类好的 bits 生成 Family/Romance/Attraction/Sentiments/Scandal 段落
+    classified_pairs: {(a_id, b_id): _classify_all_bits 的结果 或 None}
+    """
+    lines = []
+
+    # 收集关系
+    all_family = []
+    all_romance = []
+    all_attraction = []
+    all_sentiment = []
+    all_scandal = []
+    spouse_pairs = set()
+    pair_tropes = {}  # {sorted_pair: [tropes]}
+
+    for si in members:
+        a_name = _first_name(si)
+        a_gender = _gender_tag(si)
+
+        for other in members:
+            if si.sim_id == other.sim_id:
+                continue
+            classified = classified_pairs.get((si.sim_id, other.sim_id))
+            if not classified:
+                continue
 
-        if name == 'romantic-Engaged':
-            result['romance'].append('Engaged')
-            continue
+            b_name = _first_name(other)
 
-        if 'CheatedWith' in name:
-            result['romance'].append('CheatedWith')
+            for fam in classified['family']:
+                if fam == 'Child':
+                    parent_label = "Father" if a_gender == "M" else "Mother"
+                    all_family.append((a_name, b_name, parent_label))
+                elif fam == 'Parent':
+                    pass
+                elif fam == 'Sibling':
+                    pair = tuple(sorted([a_name, b_name]))
+                    all_family.append((pair[0], pair[1], 'Siblings'))
+                elif fam == 'HalfSibling':
+                    pair = tuple(sorted([a_name, b_name]))
+                    all_family.append((pair[0], pair[1], 'HalfSiblings'))
+                elif fam == 'Rival':
+                    all_family.append((a_name, b_name, 'Rival'))
+                elif fam == 'InLaw':
+                    pair = tuple(sorted([a_name, b_name]))
+                    all_family.append((pair[0], pair[1], 'InLaw'))
+                elif fam == 'Aunt/Uncle':
+                    all_family.append((a_name, b_name, 'Aunt/Uncle'))
+                elif fam == 'Niece/Nephew':
+                    pass
+                elif fam == 'Grandparent':
+                    pass
+                elif fam == 'Grandchild':
+                    all_family.append((a_name, b_name, 'Grandparent'))
+                else:
+                    all_family.append((a_name, b_name, fam))
+
+            if classified['romance']:
+                if 'Married' in classified['romance']:
+                    pair = tuple(sorted([a_name, b_name]))
+                    spouse_pairs.add(pair)
+                all_romance.append((a_name, b_name, classified['romance']))
+
+            if classified['attraction']:
+                all_attraction.append((a_name, b_name, classified['attraction']))
+
+            if classified['sentiment']:
+                all_sentiment.append((a_name, b_name, classified['sentiment']))
+
+            if classified['scandal']:
+                all_scandal.append((a_name, classified['scandal']))
+
+            if classified.get('family_trope'):
+                trope_key = tuple(sorted([a_name, b_name]))
+                for trope in classified['family_trope']:
+                    pair_tropes[trope_key] = trope
+
+    # 2. Family
+    lines.append("")
+    lines.append(" Family:")
+
+    for pair in spouse_pairs:
+        lines.append(f"   {pair[0]} & {pair[1]}: Spouse")
+
+    parent_children = {}
+    for a, b, label in all_family:
+        if label in ('Father', 'Mother'):
+            key = (a, label)
+            if key not in parent_children:
+                parent_children[key] = []
+            if b not in parent_children[key]:
+                parent_children[key].append(b)
+    for (parent, label), children in parent_children.items():
+        lines.append(f"  {parent} → {', '.join(children)}: {label}")
+
+    seen_sym = set()
+    for a, b, label in all_family:
+        if label in ('Siblings', 'HalfSiblings', 'InLaw'):
+            key = (tuple(sorted([a, b])), label)
+            if key not in seen_sym:
+                seen_sym.add(key)
+                trope = pair_tropes.get(tuple(sorted([a, b])), "")
+                trope_str = f", {trope}" if trope else ""
+                lines.append(f"  {a} & {b}: {label}{trope_str}")
+
+    aunt_nephews = {}
+    for a, b, label in all_family:
+        if label == 'Aunt/Uncle':
+            if a not in aunt_nephews:
+                aunt_nephews[a] = []
+            if b not in aunt_nephews[a]:
+                aunt_nephews[a].append(b)
+    for aunt, nephews in aunt_nephews.items():
+        lines.append(f"  {aunt} → {', '.join(nephews)}: Aunt/Uncle")
+
+    gp_map = {}
+    for a, b, label in all_family:
+        if label == 'Grandparent':
+            if a not in gp_map:
+                gp_map[a] = []
+            if b not in gp_map[a]:
+                gp_map[a].append(b)
+    for gp, gc in gp_map.items():
+        lines.append(f"  {gp} → {', '.join(gc)}: Grandparent")
+
+    seen_rival = set()
+    for a, b, label in all_family:
+        if label == 'Rival':
+            pair = tuple(sorted([a, b]))
+            if pair not in seen_rival:
+                seen_rival.add(pair)
+                lines.append(f"   {pair[0]} & {pair[1]}: Rival")
+
+    # 3. Romance
+    seen_romance = set()
+    romance_lines = []
+    for a, b, labels in all_romance:
+        filtered = [l for l in labels if l != 'Married']
+        if not filtered:
             continue
-
-        if 'romantic-Significant' in name:
-            result['romance'].append('Significant')
+        key = tuple(sorted([a, b]))
+        if key in seen_romance:
             continue
+        seen_romance.add(key)
+        romance_lines.append(f"  {a} → {b}: {', '.join(filtered)}")
+    if romance_lines:
+        lines.append("")
+        lines.append(" Romance:")
+        lines.extend(romance_lines)
 
-        if 'relBit_Attraction_' in name:
-            label = name.split('Actor_')[-1].replace('_Target', '').replace('_', '')
-            result['attraction'].append(label)
-            continue
+    # 4. Attraction
+    if all_attraction:
+        lines.append("")
+        lines.append(" Attraction:")
+        for a, b, labels in all_attraction:
+            lines.append(f"  {a} → {b}: {', '.join(labels)}")
 
-        if 'relBit_RelSat_' in name:
-            label = name.split('Actor_')[-1].replace('_Target', '').replace('With', '').replace('_', '')
-            result['attraction'].append(label)
-            continue
+    # 5. Sentiments
+    if all_sentiment:
+        lines.append("")
+        lines.append(" Sentiments:")
+        for a, b, labels in all_sentiment:
+            lines.append(f"  {a} → {b}: {', '.join(labels)}")
 
-        if 'SecretChild' in name or 'Scandal' in name:
-            label = name.replace('relbit_', '').replace('_', ' ')
-            result['scandal'].append(label)
-            continue
+    # 6. Scandal
+    if all_scandal:
+        lines.append("")
+        lines.append(" Scandal:")
+        seen_sc = set()
+        for a, labels in all_scandal:
+            for label in labels:
+                key = (a, label)
+                if key not in seen_sc:
+                    seen_sc.add(key)
+                    lines.append(f"  {a}: {label}")
 
-        if 'sentimentBit_' in name:
-            clean = name.replace('sentimentBit_Actor_', '').replace('_Target', '')
-            duration = "ST"
-            if '_LT_' in clean:
-                duration = "LT"
-                parts = clean.split('_LT_', 1)
-                emotion = parts[0]
-                reason = parts[1] if len(parts) > 1 else ""
-            elif '_ST_' in clean:
-                duration = "ST"
-                parts = clean.split('_ST_', 1)
-                emotion = parts[0]
-                reason = parts[1] if len(parts) > 1 else ""
-            else:
-                emotion = clean
-                reason = ""
+    return lines
 
-            emotion = emotion.replace('To_', '').replace('By_', '').replace('At_', '')
-            emotion = emotion.replace('_', '')
-            reason = reason.replace('_', ' ').strip()
 
-            if reason:
-                label = f"{emotion}({duration}:{reason})"
-            else:
-                label = f"{emotion}({duration})"
+class _HouseholdSummaryCache:
+    """
+    家庭关系摘要的增量缓存
+    每个有序 pair 缓存 (bit 集合, 分类结果)；保存时只有被标脏的 pair 才去 tracker 取 bits，
+    干净的 pair 不碰 tracker，直接复用分类结果
+    标脏来自注入的 RelationshipTracker / Relationship 的加减 bit 方法；
+    万一还有漏掉的（轨道阈值等），每个游戏日第一次保存时把所有 pair 的 bit 集合核对一遍
+    全都没变时直接复用上次生成的段落
+    """
 
-            result['sentiment'].append((duration, label))
-            continue
+    def __init__(self):
+        self._pairs = {}      # (a_id, b_id) → (bit 集合, 分类结果 或 None)
+        self._dirty = set()
+        self._validated_day = None
+        self._render_key = None
+        self._rendered = None
+        self.reclassified = 0
+        self.reused = 0
+        self.fetched = 0           # 去 tracker 取 bits 的 pair 数
+        self.unhooked_changes = 0  # 没被标脏、靠每日核对发现的变化
+
+    def on_bits_changed(self, a_id, b_id):
+        """ 关系 bit 变化回调：只标记已缓存的 pair，集合不会无限增长 """
+        for key in ((a_id, b_id), (b_id, a_id)):
+            if key in self._pairs:
+                self._dirty.add(key)
+
+    @staticmethod
+    def _bits_signature(bits):
+        try:
+            return frozenset(bits)
+        except TypeError:
+            return tuple(sorted(id(bit) for bit in bits))
+
+    def _classify_pair(self, si, other, validate):
+        key = (si.sim_id, other.sim_id)
+        cached = self._pairs.get(key)
+        dirty = key in self._dirty
+        if cached is not None and not dirty and not validate:
+            self.reused += 1
+            return cached[1], False
+
+        bits = ()
+        tracker = si.relationship_tracker
+        if tracker.has_relationship(other.sim_id):
+            bits = tracker.get_all_bits(other.sim_id) or ()
+        self.fetched += 1
+        signature = self._bits_signature(bits)
+        if cached is not None and cached[0] == signature:
+            self._dirty.discard(key)
+            self.reused += 1
+            return cached[1], False
+        if cached is not None and not dirty:
+            self.unhooked_changes += 1
+
+        classified = _classify_all_bits(bits) if bits else None
+        changed = cached is None or cached[1] != classified
+        self._pairs[key] = (signature, classified)
+        self._dirty.discard(key)
+        self.reclassified += 1
+        return classified, changed
+
+    def render_sections(self, members):
+        member_ids = set(si.sim_id for si in members)
+        # 家庭成员变了：丢掉不相关的 pair
+        for key in [k for k in self._pairs if k[0] not in member_ids or k[1] not in member_ids]:
+            del self._pairs[key]
+            self._dirty.discard(key)
+
+        day = int(_sim_day())
+        validate = day != self._validated_day
+        self._validated_day = day
+
+        changed = False
+        classified_pairs = {}
+        for si in members:
+            for other in members:
+                if si.sim_id == other.sim_id:
+                    continue
+                classified, pair_changed = self._classify_pair(si, other, validate)
+                changed = changed or pair_changed
+                classified_pairs[(si.sim_id, other.sim_id)] = classified
 
-        if 'romantic-' in name:
-            result['romance'].append(name.replace('romantic-', ''))
-            continue
+        render_key = tuple((si.sim_id, _first_name(si), _gender_tag(si)) for si in members)
+        if not changed and self._rendered is not None and render_key == self._render_key:
+            return self._rendered
 
-        if 'Rivalry' in name:
-            result['family'].append('Rival')
-            continue
+        self._rendered = _build_relationship_sections(members, classified_pairs)
+        self._render_key = render_key
+        return self._rendered
 
-        if 'familyTrope_' in name:
-            label = name.replace('familyTrope_', '')
-            result['family_trope'].append(label)
-            continue
+    def clear(self):
+        self._pairs.clear()
+        self._dirty.clear()
+        self._validated_day = None
+        self._render_key = None
+        self._rendered = None
 
-    result['sentiment'].sort(key=lambda x: (0 if x[0] == 'LT' else 1, x[1]))
-    result['sentiment'] = [item[1] for item in result['sentiment']]
 
-    return result
-# ========== 角色特征抓取 ==========
+_summary_cache = _HouseholdSummaryCache()
+_rel_bit_listeners.append(_summary_cache.on_bits_changed)
 
 def get_active_characters_summary():
     """新版角色摘要 V2"""
@@ -971,9 +2377,10 @@ def get_active_characters_summary():
 
         lines = []
 
-        # 1. 成员列表
+        # 1. 成员列表（钩子漏掉的改名/长大在这里重读一次）
         lines.append(" Household Members:")
         for si in members:
+            _load_sim_identity(si)
             name = _safe_name(si)
             g = _gender_tag(si)
             a = _age_tag(si)
@@ -981,179 +2388,8 @@ def get_active_characters_summary():
             t_str = f" [{traits}]" if traits else ""
             lines.append(f"  • {name} ({g}/{a}){t_str}")
 
-        # 收集关系
-        all_family = []
-        all_romance = []
-        all_attraction = []
-        all_sentiment = []
-        all_scandal = []
-        spouse_pairs = set()
-        pair_tropes = {}  # {sorted_pair: [tropes]}
-
-        for si in members:
-            tracker = si.relationship_tracker
-            a_name = _first_name(si)
-            a_gender = _gender_tag(si)
-
-            for other in members:
-                if si.sim_id == other.sim_id:
-                    continue
-                if not tracker.has_relationship(other.sim_id):
-                    continue
-
-                bits = tracker.get_all_bits(other.sim_id)
-                if not bits:
-                    continue
-
-                b_name = _first_name(other)
-                classified = _classify_all_bits(bits)
-
-                for fam in classified['family']:
-                    if fam == 'Child':
-                        parent_label = "Father" if a_gender == "M" else "Mother"
-                        all_family.append((a_name, b_name, parent_label))
-                    elif fam == 'Parent':
-                        pass
-                    elif fam == 'Sibling':
-                        pair = tuple(sorted([a_name, b_name]))
-                        all_family.append((pair[0], pair[1], 'Siblings'))
-                    elif fam == 'HalfSibling':
-                        pair = tuple(sorted([a_name, b_name]))
-                        all_family.append((pair[0], pair[1], 'HalfSiblings'))
-                    elif fam == 'Rival':
-                        all_family.append((a_name, b_name, 'Rival'))
-                    elif fam == 'InLaw':
-                        pair = tuple(sorted([a_name, b_name]))
-                        all_family.append((pair[0], pair[1], 'InLaw'))
-                    elif fam == 'Aunt/Uncle':
-                        all_family.append((a_name, b_name, 'Aunt/Uncle'))
-                    elif fam == 'Niece/Nephew':
-                        pass
-                    elif fam == 'Grandparent':
-                        pass
-                    elif fam == 'Grandchild':
-                        all_family.append((a_name, b_name, 'Grandparent'))
-                    else:
-                        all_family.append((a_name, b_name, fam))
-
-                if classified['romance']:
-                    if 'Married' in classified['romance']:
-                        pair = tuple(sorted([a_name, b_name]))
-                        spouse_pairs.add(pair)
-                    all_romance.append((a_name, b_name, classified['romance']))
-
-                if classified['attraction']:
-                    all_attraction.append((a_name, b_name, classified['attraction']))
-
-                if classified['sentiment']:
-                    all_sentiment.append((a_name, b_name, classified['sentiment']))
-
-                if classified['scandal']:
-                    all_scandal.append((a_name, classified['scandal']))
-
-                if classified.get('family_trope'):
-                    trope_key = tuple(sorted([a_name, b_name]))
-                    for trope in classified['family_trope']:
-                        pair_tropes[trope_key] = trope
-
-        # 2. Family
-        lines.append("")
-        lines.append(" Family:")
-
-        for pair in spouse_pairs:
-            lines.append(f"   {pair[0]} & {pair[1]}: Spouse")
-
-        parent_children = {}
-        for a, b, label in all_family:
-            if label in ('Father', 'Mother'):
-                key = (a, label)
-                if key not in parent_children:
-                    parent_children[key] = []
-                if b not in parent_children[key]:
-                    parent_children[key].append(b)
-        for (parent, label), children in parent_children.items():
-            lines.append(f"  {parent} → {', '.join(children)}: {label}")
-
-        seen_sym = set()
-        for a, b, label in all_family:
-            if label in ('Siblings', 'HalfSiblings', 'InLaw'):
-                key = (tuple(sorted([a, b])), label)
-                if key not in seen_sym:
-                    seen_sym.add(key)
-                    trope = pair_tropes.get(tuple(sorted([a, b])), "")
-                    trope_str = f", {trope}" if trope else ""
-                    lines.append(f"  {a} & {b}: {label}{trope_str}")
-
-        aunt_nephews = {}
-        for a, b, label in all_family:
-            if label == 'Aunt/Uncle':
-                if a not in aunt_nephews:
-                    aunt_nephews[a] = []
-                if b not in aunt_nephews[a]:
-                    aunt_nephews[a].append(b)
-        for aunt, nephews in aunt_nephews.items():
-            lines.append(f"  {aunt} → {', '.join(nephews)}: Aunt/Uncle")
-
-        gp_map = {}
-        for a, b, label in all_family:
-            if label == 'Grandparent':
-                if a not in gp_map:
-                    gp_map[a] = []
-                if b not in gp_map[a]:
-                    gp_map[a].append(b)
-        for gp, gc in gp_map.items():
-            lines.append(f"  {gp} → {', '.join(gc)}: Grandparent")
-
-        seen_rival = set()
-        for a, b, label in all_family:
-            if label == 'Rival':
-                pair = tuple(sorted([a, b]))
-                if pair not in seen_rival:
-                    seen_rival.add(pair)
-                    lines.append(f"   {pair[0]} & {pair[1]}: Rival")
-
-        # 3. Romance
-        seen_romance = set()
-        romance_lines = []
-        for a, b, labels in all_romance:
-            filtered = [l for l in labels if l != 'Married']
-            if not filtered:
-                continue
-            key = tuple(sorted([a, b]))
-            if key in seen_romance:
-                continue
-            seen_romance.add(key)
-            romance_lines.append(f"  {a} → {b}: {', '.join(filtered)}")
-        if romance_lines:
-            lines.append("")
-            lines.append(" Romance:")
-            lines.extend(romance_lines)
-
-        # 4. Attraction
-        if all_attraction:
-            lines.append("")
-            lines.append(" Attraction:")
-            for a, b, labels in all_attraction:
-                lines.append(f"  {a} → {b}: {', '.join(labels)}")
-
-        # 5. Sentiments
-        if all_sentiment:
-            lines.append("")
-            lines.append(" Sentiments:")
-            for a, b, labels in all_sentiment:
-                lines.append(f"  {a} → {b}: {', '.join(labels)}")
-
-        # 6. Scandal
-        if all_scandal:
-            lines.append("")
-            lines.append(" Scandal:")
-            seen_sc = set()
-            for a, labels in all_scandal:
-                for label in labels:
-                    key = (a, label)
-                    if key not in seen_sc:
-                        seen_sc.add(key)
-                        lines.append(f"  {a}: {label}")
+        # 2~6. 关系分段（增量缓存）
+        lines.extend(_summary_cache.render_sections(members))
 
         return "\n".join(lines) if len(lines) > 1 else ""
     except Exception as e:
@@ -1195,175 +2431,813 @@ def build_npc_snapshot(npc_sim_info, active_sim_info):
     except:
         return f"[NPC] {_safe_name(npc_sim_info)}(?)"
 
+
+class _NpcSnapshotStore:
+    """
+    跨场景的 NPC 快照缓存（LRU）：(NPC sim_id, 主动方 sim_id) → [是否过期, 快照文本, 核对的游戏日]
+    快照里的 Rel(...) 是相对主动方的，所以每一对各存一份：
+    家里几个 Sim 轮流和同一个 NPC 互动不会互相顶掉、反复输出
+    这一对之间的关系 bit 变化时（注入的 tracker / Relationship 钩子）标记过期；
+    钩子抓不到的变化（轨道阈值 bit、特征）靠每个游戏日第一次遇到时重新生成核对一次
+    没过期直接跳过，过期了就重新生成，文本不同才输出
+    和这个 NPC 上一次输出的文本完全一样（比如跟谁都没有关系 bit）也不再输出
+    """
+
+    def __init__(self, capacity=256):
+        self._entries = OrderedDict()
+        self._last_emitted = OrderedDict()  # NPC sim_id → 上一次输出的快照文本
+        self.capacity = max(1, int(capacity))
+        self.hits = 0
+        self.misses = 0       # 新的一对
+        self.refreshed = 0    # 关系变过
+        self.revalidated = 0  # 换了一天，重新生成核对
+        self.emitted = 0
+        self.evicted = 0
+
+    def resize(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self._evict()
+
+    def on_bits_changed(self, a_id, b_id):
+        """ 关系 bit 变化回调：只标记缓存里的这一对 """
+        for key in ((a_id, b_id), (b_id, a_id)):
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[0] = True
+
+    def claim(self, npc_id, actor_id):
+        """ 需要（重新）生成快照时返回 True """
+        key = (npc_id, actor_id)
+        day = int(_sim_day())
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            if not entry[0] and entry[2] == day:
+                self.hits += 1
+                return False
+            if entry[0]:
+                self.refreshed += 1
+            else:
+                self.revalidated += 1
+            entry[0] = False
+            entry[2] = day
+            return True
+        self._entries[key] = [False, None, day]
+        self.misses += 1
+        self._evict()
+        return True
+
+    def offer(self, npc_id, actor_id, snapshot):
+        """ 存入新生成的快照；新的一对或内容变了返回 True（需要写进日志） """
+        key = (npc_id, actor_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = [False, snapshot, int(_sim_day())]
+            self._evict()
+        elif entry[1] == snapshot:
+            return False
+        else:
+            entry[1] = snapshot
+        if self._last_emitted.get(npc_id) == snapshot:
+            self._last_emitted.move_to_end(npc_id)
+            return False
+        self._last_emitted[npc_id] = snapshot
+        self._last_emitted.move_to_end(npc_id)
+        self.emitted += 1
+        return True
+
+    def _evict(self):
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        while len(self._last_emitted) > self.capacity:
+            self._last_emitted.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self._last_emitted.clear()
+        self.hits = self.misses = self.refreshed = self.revalidated = self.emitted = self.evicted = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_npc_store = _NpcSnapshotStore()
+_rel_bit_listeners.append(_npc_store.on_bits_changed)
+
+_trait_name_cache = {}  # trait 类型 → 显示名（隐藏/无效的为 ""）
+_sim_trait_cache = OrderedDict()  # sim_id → (trait 类型 frozenset, 拼好的字符串)
+_SIM_TRAIT_CACHE_MAX = 512
+
+
+def _trait_display_name(trait):
+    """ trait 类型 → 显示名（静态 tuning，按类型缓存清洗结果） """
+    try:
+        return _trait_name_cache[trait]
+    except KeyError:
+        pass
+
+    display_name = ""
+    try:
+        trait_name = trait.__name__ if hasattr(trait, '__name__') else str(trait)
+        trait_name = trait_name.replace('trait_', '').replace('Trait_', '')
+
+        if not trait_name.startswith('Hidden'):
+            # 智能清理
+            parts = trait_name.split('_')
+
+            clean_parts = []
+            for p in parts:
+                if len(p) <= 2:
+                    continue
+                if p.lower() in ['traitsbundle', 'trait', 'kawaiistacie', 'bundle']:
+                    continue
+                if len(p) > 6 and any(c.isdigit() for c in p):
+                    continue
+                clean_parts.append(p)
+
+            if clean_parts:
+                display_name = ' '.join(clean_parts)
+            else:
+                display_name = trait_name.replace('_', ' ').strip()
+
+            if len(display_name) >= 50:
+                display_name = ""
+    except:
+        display_name = ""
+
+    _trait_name_cache[trait] = display_name
+    return display_name
+
+
 def _get_sim_traits(sim_info):
     """
     提取 Sim 的性格特征
     注意：Sims 4 每个 Sim 只有 3 个性格特征，这是游戏设定
     如果安装了 mod 添加了额外特征槽，可能会有更多
+    结果按 sim_id 缓存，trait 集合变了才重新拼接
     """
-    traits = []
     try:
         tracker = None
 
         if hasattr(sim_info, 'trait_tracker'):
             tracker = sim_info.trait_tracker
 
-        if tracker is None or not hasattr(tracker, 'personality_traits'):
-            if hasattr(sim_info, 'get_sim_instance'):
-                sim = sim_info.get_sim_instance()
-                if sim and hasattr(sim, 'trait_tracker'):
-                    tracker = sim.trait_tracker
+        if tracker is None or not hasattr(tracker, 'personality_traits'):
+            if hasattr(sim_info, 'get_sim_instance'):
+                sim = sim_info.get_sim_instance()
+                if sim and hasattr(sim, 'trait_tracker'):
+                    tracker = sim.trait_tracker
+
+        if not tracker or not hasattr(tracker, 'personality_traits'):
+            return ""
+
+        trait_types = tuple(tracker.personality_traits)
+        key = frozenset(trait_types)
+        sim_id = sim_info.sim_id
+        cached = _sim_trait_cache.get(sim_id)
+        if cached is not None and cached[0] == key:
+            _sim_trait_cache.move_to_end(sim_id)
+            return cached[1]
+
+        traits = []
+        for trait in trait_types:
+            display_name = _trait_display_name(trait)
+            if display_name:
+                traits.append(display_name)
+        result = ', '.join(traits[:8]) if traits else ""
+
+        _sim_trait_cache[sim_id] = (key, result)
+        _sim_trait_cache.move_to_end(sim_id)
+        if len(_sim_trait_cache) > _SIM_TRAIT_CACHE_MAX:
+            _sim_trait_cache.popitem(last=False)
+        return result
+    except Exception as e:
+        log_error(f"_get_sim_traits error: {str(e)}", "traits")
+        return ""
+
+
+# ========== 事件记录 & 延迟解析（Deferred Enrichment） ==========
+
+class _LogEvent:
+    """
+    一条互动事件：只存 id / 类型 / 时间，保存时才渲染成文本
+    mood：即时模式下是渲染好的情绪片段；延迟模式先存快照 (mood, buffs)，flush 时换成片段
+    rel_delta：_rel_delta.take 返回的 token
+    """
+    __slots__ = ('now', 'actor_id', 'target_id', 'target_type', 'action', 'mood', 'rel_delta')
+
+    def __init__(self, now, actor_id, target_id, target_type, action, mood, rel_delta):
+        self.now = now
+        self.actor_id = actor_id
+        self.target_id = target_id
+        self.target_type = target_type
+        self.action = action
+        self.mood = mood
+        self.rel_delta = rel_delta
+
+    def _key(self):
+        try:
+            minute = (self.now.hour(), self.now.minute())
+        except:
+            minute = None
+        return (minute, self.actor_id, self.target_id, self.target_type,
+                self.action, self.mood, self.rel_delta)
+
+    def __eq__(self, other):
+        if not isinstance(other, _LogEvent):
+            return NotImplemented
+        return self._key() == other._key()
+
+    __hash__ = None
+
+
+def _sim_display_name(sim_infos, sim_id):
+    sim_info = sim_infos.get(sim_id)
+    return _safe_name(sim_info) if sim_info else f"Sim({sim_id})"
+
+
+def _render_event(ev, sim_infos, time_str=None, count_str="", rel_str=None):
+    """ 把一条事件渲染成日志文本（合并行会传入时间段、次数和合计的关系变化） """
+    display_name = _sim_display_name(sim_infos, ev.actor_id)
+    if time_str is None:
+        time_str = _format_log_time(ev.now)
+
+    target_str = ""
+    if ev.target_id is not None:
+        t_name = _sim_display_name(sim_infos, ev.target_id)
+        if t_name != display_name:
+            target_str = f" -> {t_name}"
+        if rel_str is None:
+            rel_str = _format_rel_delta(ev.rel_delta)
+    else:
+        rel_str = ""
+        if ev.target_type is not None:
+            t_name = _object_type_name(ev.target_type)
+            if t_name != display_name:
+                target_str = f" -> {t_name}"
+
+    current_mood_str = ev.mood if isinstance(ev.mood, str) else ""
+
+    return f"{time_str} {display_name}{current_mood_str} -> {ev.action}{target_str}{count_str}{rel_str}"
+
+
+def _render_log_entry(entry, sim_infos):
+    """ 缓冲里的条目 → 文本（NPC 快照、场景切换本来就是字符串） """
+    if isinstance(entry, _LogEvent):
+        return _render_event(entry, sim_infos)
+    if isinstance(entry, _EventRun):
+        return entry.render(sim_infos)
+    return entry
+
+
+# ========== 重复事件合并（Run-length Compaction） ==========
+
+class _EventRun:
+    """
+    连续（或隔几行）重复的同一 (谁, 动作, 目标) 合并成一行：
+    [08:07-08:42] Bob -> Cook -> Stove (x6)
+    关系变化：第一次的总值照常显示，之后的变化量累加
+    """
+    __slots__ = ('first', 'last_now', 'count', 'f_sum', 'r_sum')
+
+    def __init__(self, first):
+        self.first = first
+        self.last_now = first.now
+        self.count = 1
+        self.f_sum = 0
+        self.r_sum = 0
+
+    def add(self, ev):
+        self.last_now = ev.now
+        self.count += 1
+        if ev.rel_delta:
+            is_first, f_val, r_val = ev.rel_delta
+            if not is_first:
+                self.f_sum += f_val
+                self.r_sum += r_val
+
+    def rel_tokens(self):
+        """ (第一次的 token, 累加的变化 token) """
+        first = self.first.rel_delta
+        summed = (False, self.f_sum, self.r_sum)
+        if first and not first[0]:
+            summed = (False, first[1] + self.f_sum, first[2] + self.r_sum)
+            first = None
+        return first, summed
+
+    def render(self, sim_infos):
+        first, summed = self.rel_tokens()
+        start = _format_log_time(self.first.now).strip("[]")
+        end = _format_log_time(self.last_now).strip("[]")
+        time_str = f"[{start}]" if start == end else f"[{start}-{end}]"
+        rel_str = _format_rel_delta(first) + _format_rel_delta(summed)
+        return _render_event(self.first, sim_infos, time_str=time_str,
+                             count_str=f" (x{self.count})", rel_str=rel_str)
+
+
+_compaction_stats = {"events": 0, "lines": 0}
+
+
+def _run_key(ev):
+    return (ev.actor_id, ev.action, ev.target_id, ev.target_type)
+
+
+def _compact_entries(entries):
+    """
+    合并重复事件：同一 (谁, 动作, 目标) 在最近用到的 compact_lookback 组内、
+    且离上一次不超过 compact_window_minutes 游戏分钟就并进去
+    情绪有变化的事件单独成行；NPC 快照 / 场景切换是分界，不跨过去合并
+    """
+    lookback = max(1, int(_settings.get("compact_lookback", 4)))
+    try:
+        window = clock.interval_in_sim_minutes(
+            _settings.get("compact_window_minutes", 60)).in_ticks()
+    except:
+        window = None
+
+    out = []
+    open_runs = []  # 最近用到的可合并 run（旧 → 新）
+    for entry in entries:
+        if not isinstance(entry, _LogEvent):
+            out.append(entry)
+            open_runs = []
+            continue
+
+        merged = False
+        if not entry.mood:
+            key = _run_key(entry)
+            for i in range(len(open_runs) - 1, -1, -1):
+                run = open_runs[i]
+                if _run_key(run.first) != key:
+                    continue
+                if window is not None:
+                    try:
+                        if entry.now.absolute_ticks() - run.last_now.absolute_ticks() > window:
+                            break
+                    except:
+                        pass
+                run.add(entry)
+                open_runs.append(open_runs.pop(i))
+                merged = True
+                break
+
+        if not merged:
+            run = _EventRun(entry)
+            out.append(run)
+            open_runs.append(run)
+            if len(open_runs) > lookback:
+                open_runs.pop(0)
+
+    # 没合并的还原成单条事件，渲染和原来完全一样
+    result = [e.first if isinstance(e, _EventRun) and e.count == 1 else e for e in out]
+    _compaction_stats["events"] += len(entries)
+    _compaction_stats["lines"] += len(result)
+    return result
+
+
+# ========== JSONL 输出 ==========
+
+_JSONL_SCHEMA = 1  # 记录格式改动时 +1
+
+
+def _event_record(entry, text, sim_infos):
+    """ 缓冲条目 → JSONL 记录（text 是已经渲染好的那一行） """
+    if isinstance(entry, _EventRun):
+        record = _event_record(entry.first, text, sim_infos)
+        record["count"] = entry.count
+        record["time_end"] = _format_log_time(entry.last_now).strip("[]")
+        first, summed = entry.rel_tokens()
+        if first or summed[1] or summed[2]:
+            rel = {"f": round(summed[1]), "r": round(summed[2]), "kind": "delta"}
+            if first:
+                rel["total_f"] = round(first[1])
+                rel["total_r"] = round(first[2])
+            record["rel"] = rel
+        else:
+            record.pop("rel", None)
+        return record
+
+    if not isinstance(entry, _LogEvent):
+        if entry.startswith("[NPC]"):
+            kind = "npc"
+        elif "Travel:" in entry:
+            kind = "travel"
+        else:
+            kind = "note"
+        return {"type": kind, "text": entry.strip()}
+
+    record = {
+        "type": "event",
+        "time": _format_log_time(entry.now).strip("[]"),
+        "actor_id": entry.actor_id,
+        "actor": _sim_display_name(sim_infos, entry.actor_id),
+        "action": entry.action,
+    }
+    try:
+        record["ticks"] = entry.now.absolute_ticks()
+    except:
+        pass
+    if entry.target_id is not None:
+        record["target_id"] = entry.target_id
+        record["target"] = _sim_display_name(sim_infos, entry.target_id)
+    elif entry.target_type is not None:
+        record["target"] = _object_type_name(entry.target_type)
+    if isinstance(entry.mood, str) and entry.mood:
+        record["mood"] = entry.mood.strip()
+    if entry.rel_delta:
+        is_first, f_val, r_val = entry.rel_delta
+        record["rel"] = {"f": round(f_val), "r": round(r_val),
+                         "kind": "total" if is_first else "delta"}
+    record["text"] = text
+    return record
+
+
+def _jsonl_writes(session, records, output_dir, day=None):
+    """ JSONL 写入任务：第一行是 session 记录，后面每行一个事件（Full 分段追加，Latest 覆盖） """
+    lines = [json.dumps(session, ensure_ascii=False)]
+    lines.extend(json.dumps(r, ensure_ascii=False) for r in records)
+    blob = "\n".join(lines) + "\n"
+    full_log = _get_segmented_log(os.path.join(output_dir, "Sims4_Story_Log_Full.jsonl"))
+    return [
+        lambda sync: full_log.append(blob, day, session.get("household_key"), sync),
+        (os.path.join(output_dir, "Sims4_Story_Log_Latest.jsonl"), blob, "w"),
+    ]
+
+
+def _append_log_entry(entry):
+    """ 追加一条日志（和上一条相同则跳过），满了由环形缓冲丢掉最旧的 """
+    if not _log_buffer or _log_buffer[-1] != entry:
+        _log_buffer.append(entry)
+
+
+def _record_raw_event(sim, actor_is_family, target, target_is_sim, target_is_family, action):
+    """
+    延迟模式：钩子里只记录原始数据（id / 类型 / 游戏时间 / 情绪快照 / 关系变化）
+    情绪片段和 NPC 快照留给 _flush_raw_events 批量处理
+    """
+    sim_info = sim.sim_info
+    target_id = None
+    target_type = None
+    rel_delta = None
+    if target_is_sim:
+        target_id = target.sim_id
+        if not target_is_family and _npc_store.claim(target_id, sim_info.sim_id):
+            _raw_events.append(('npc', target_id, sim_info.sim_id))
+        try:
+            rel_delta = _rel_delta.take(sim_info, target_id, actor_is_family and target_is_family)
+        except:
+            pass
+    elif target:
+        target_type = _target_type(target)
+
+    mood = None
+    if actor_is_family:
+        try:
+            mood = _snapshot_mood(sim)
+        except:
+            pass
+
+    _raw_events.append(_LogEvent(services.game_clock_service().now(), sim_info.sim_id,
+                                 target_id, target_type, action, mood, rel_delta))
+    if len(_raw_events) >= _RAW_EVENT_LIMIT:
+        _flush_raw_events()
+
+
+def _enrich_raw_event(raw, sim_infos):
+    """ 补全一条延迟记录：事件把情绪快照渲染成片段，NPC 生成快照 """
+    if isinstance(raw, _LogEvent):
+        if raw.mood is not None:
+            raw.mood = _render_mood_delta(str(raw.actor_id), *raw.mood)
+        return raw
+
+    _, npc_id, actor_id = raw
+    npc_info = sim_infos.get(npc_id)
+    actor_info = sim_infos.get(actor_id)
+    if npc_info is None or actor_info is None:
+        return None
+    snapshot = build_npc_snapshot(npc_info, actor_info)
+    return snapshot if _npc_store.offer(npc_id, actor_id, snapshot) else None
+
+
+def _flush_raw_events():
+    """ 批量补全延迟记录的事件，按原顺序放进 _log_buffer """
+    if not _raw_events:
+        return
+    # 先拿到 sim_info_manager 再清空：拿不到就原样留着，下次再补
+    try:
+        sim_infos = services.sim_info_manager()
+    except Exception as e:
+        log_error(f"sim_info_manager unavailable: {e}", "flush_raw_events")
+        return
+    events = list(_raw_events)
+    _raw_events.clear()
+    for raw in events:
+        try:
+            entry = _enrich_raw_event(raw, sim_infos)
+        except:
+            entry = None
+        if entry:
+            _append_log_entry(entry)
+
+
+# ========== 去重窗口 ==========
+
+class _DedupWindow:
+    """
+    每个 Sim 的去重窗口：(affordance, 目标 id) → 上次记录的游戏时间 ticks
+    同一个 Sim 在窗口内重复同一动作+目标就压掉（循环动作不再刷屏）
+    """
+    PRUNE_SIZE = 32  # 单个 Sim 记录超过这个数时清理过期的
+
+    def __init__(self):
+        self._recent = {}  # sim_id → {(affordance, target_id): ticks}
+        self._window_cache = {}  # 分钟数 → ticks
+        self.suppressed = 0
+        self.passed = 0
+
+    def _window_ticks(self, minutes):
+        ticks = self._window_cache.get(minutes)
+        if ticks is None:
+            ticks = clock.interval_in_sim_minutes(minutes).in_ticks()
+            self._window_cache[minutes] = ticks
+        return ticks
+
+    def check(self, sim_id, key, is_social=False):
+        """ 放行返回 True（并记录时间）；窗口内重复返回 False """
+        if is_social:
+            window = self._window_ticks(_settings.get("dedup_social_window_minutes", 1))
+        else:
+            window = self._window_ticks(_settings.get("dedup_window_minutes", 20))
+        now = services.time_service().sim_now.absolute_ticks()
+
+        recent = self._recent.get(sim_id)
+        if recent is None:
+            recent = self._recent[sim_id] = {}
+        last = recent.get(key)
+        if last is not None and now - last < window:
+            self.suppressed += 1
+            return False
+
+        recent[key] = now
+        if len(recent) > self.PRUNE_SIZE:
+            for k in [k for k, ts in recent.items() if now - ts >= window]:
+                del recent[k]
+        self.passed += 1
+        return True
+
+    def clear(self):
+        self._recent.clear()
+
+    def reset_counters(self):
+        self.suppressed = 0
+        self.passed = 0
+
+
+_dedup = _DedupWindow()
+
+
+# ========== 性能统计（Hot-path Profiler） ==========
+
+_perf_ns = time.perf_counter_ns
+
+
+class _LatencyHistogram:
+    """
+    固定大小的对数直方图（单位 ns）：每个 2 的幂再分 4 档（档宽为下界的 1/7 ~ 1/4）
+    百分位在档内按计数线性插值，最坏误差不超过一档宽（< 25%），分布平滑时通常在 1~2% 内
+    内存固定，可以一直开着，流式估算 p50/p95/p99
+    """
+    SIZE = 128
+
+    def __init__(self):
+        self.buckets = [0] * self.SIZE
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns):
+        if ns < 4:
+            idx = max(0, ns)
+        else:
+            bits = ns.bit_length()
+            idx = min(self.SIZE - 1, (bits - 2) * 4 + ((ns >> (bits - 3)) & 3))
+        self.buckets[idx] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    @staticmethod
+    def _bucket_bounds(idx):
+        """ 档 idx 覆盖的 [下界, 上界 + 1) """
+        if idx < 4:
+            return idx, idx + 1
+        shift = idx // 4 - 1
+        return (4 + idx % 4) << shift, (4 + idx % 4 + 1) << shift
+
+    def percentile(self, q):
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            if n and seen + n >= rank:
+                low, high = self._bucket_bounds(idx)
+                value = low + (high - low) * max(0.0, rank - seen) / n
+                return min(int(value), self.max)
+            seen += n
+        return self.max
+
+
+class _HookProfiler:
+    """ _new_trigger_start 各阶段耗时统计（ai_stats 查看） """
+    STAGES = ('total', 'membership', 'classify', 'dedup', 'npc_snapshot', 'naming',
+              'relationship', 'mood', 'append', 'deferred_record', 'save')
+
+    def __init__(self):
+        self.enabled = True
+        self.reset()
+
+    def reset(self):
+        self.hists = {stage: _LatencyHistogram() for stage in self.STAGES}
+        self.logged = 0
+        self.started = time.time()
+
+    def lap(self, stage, start):
+        """ 记录 stage 从 start 到现在的耗时，返回现在（作为下一阶段起点） """
+        now = _perf_ns()
+        self.hists[stage].add(now - start)
+        return now
+
+    def count_logged(self):
+        self.logged += 1
+
+    def report_lines(self):
+        elapsed = max(1e-6, time.time() - self.started)
+        calls = self.hists['total'].count
+        lines = [f" {calls} hook calls ({calls / elapsed:.1f}/s), "
+                 f"{self.logged} logged ({self.logged / elapsed:.2f}/s) over {elapsed:.0f}s",
+                 "   stage           count     p50     p95     p99     max  (us)"]
+        for stage in self.STAGES:
+            h = self.hists[stage]
+            if not h.count:
+                continue
+            lines.append("   {:<14}{:>7}{:>8.1f}{:>8.1f}{:>8.1f}{:>8.1f}".format(
+                stage, h.count,
+                h.percentile(0.50) / 1000.0, h.percentile(0.95) / 1000.0,
+                h.percentile(0.99) / 1000.0, h.max / 1000.0))
+        return lines
+
+
+_profiler = _HookProfiler()
+
+
+# =======================================================
+# 2. 监听核心 (Inject)
+# =======================================================
+if not hasattr(Interaction, '_original_trigger_backup'):
+    Interaction._original_trigger_backup = Interaction._trigger_interaction_start_event
+
+
+def _process_interaction_start(self, prof):
+    """ 钩子主体：prof 为 None 时完全不计时 """
+    global _last_zone_id
+    if prof is not None:
+        t = _perf_ns()
+
+    # --- 场景切换检测 ---
+    current_zone = services.current_zone_id()
+    if _last_zone_id is not None and current_zone != _last_zone_id:
+        _flush_raw_events()  # 旧场景的事件先解析，保证顺序
+        header = get_header_context()
+        _log_buffer.append(f"\n===  Travel: {header} ===\n")
+        _sim_mood_cache.clear()
+        _sim_buff_memo.clear()
+        _dedup.clear()
+    if current_zone != _last_zone_id:
+        _invalidate_household_ids()
+        try:
+            _inbox_scheduler.on_zone_changed()
+            _io_worker.on_zone_changed()
+            _autosave.on_zone_changed(_last_zone_id is not None)
+            _settings_store.on_zone_changed()
+        except:
+            pass
+    _last_zone_id = current_zone
+    # ------------------
+
+    sim = getattr(self, 'sim', None)
+    if not sim:
+        return
+
+    # 家庭索引：非家庭事件在这里 O(1) 直接放行
+    household_ids = _get_household_ids()
+    actor_is_family = sim.sim_id in household_ids
+    target = getattr(self, 'target', None)
+    target_is_sim = bool(target) and getattr(target, 'is_sim', False)
+    target_is_family = target_is_sim and target.sim_id in household_ids
+    if prof is not None:
+        t = prof.lap('membership', t)
+    if not (actor_is_family or target_is_family):
+        return
+
+    affordance = getattr(self, 'affordance', None) or type(self)
+    action, meaningful, is_social = classify_affordance(affordance, affordance.__name__)
+
+    # === 调试模式：统计所有互动（含被过滤的）===
+    if _debug_mode:
+        _aff_histogram.record(affordance.__name__, action, meaningful)
+    # === 调试模式结束 ===
+    if prof is not None:
+        t = prof.lap('classify', t)
+
+    if not (meaningful and action):
+        return
+
+    # 去重：(affordance, 目标 id) + 游戏时间窗口，不拼字符串
+    if not _dedup.check(sim.sim_id, (affordance, _target_id(target)), is_social):
+        if prof is not None:
+            prof.lap('dedup', t)
+        return
+    if prof is not None:
+        t = prof.lap('dedup', t)
+
+    deferred = _settings.get("deferred_enrichment", False)
 
-        if tracker and hasattr(tracker, 'personality_traits'):
-            for trait in tracker.personality_traits:
-                try:
-                    trait_name = trait.__name__ if hasattr(trait, '__name__') else str(trait)
-                    trait_name = trait_name.replace('trait_', '').replace('Trait_', '')
-
-                    if trait_name.startswith('Hidden'):
-                        continue
-
-                    # 智能清理
-                    parts = trait_name.split('_')
-
-                    clean_parts = []
-                    for p in parts:
-                        if len(p) <= 2:
-                            continue
-                        if p.lower() in ['traitsbundle', 'trait', 'kawaiistacie', 'bundle']:
-                            continue
-                        if len(p) > 6 and any(c.isdigit() for c in p):
-                            continue
-                        clean_parts.append(p)
-
-                    if clean_parts:
-                        display_name = ' '.join(clean_parts)
-                    else:
-                        display_name = trait_name.replace('_', ' ').strip()
-
-                    if display_name and len(display_name) < 50:
-                        traits.append(display_name)
-                except:
-                    pass
-    except Exception as e:
-        log_error(f"_get_sim_traits error: {str(e)}", "traits")
+    if deferred:
+        _record_raw_event(sim, actor_is_family, target, target_is_sim,
+                          target_is_family, action)
+        _autosave.on_event()
+        if prof is not None:
+            prof.lap('deferred_record', t)
+        return
+
+    # === NPC 快照 ===
+    if target_is_sim and not target_is_family:
+        t_info = target.sim_info if hasattr(target, 'sim_info') else None
+        if t_info and _npc_store.claim(t_info.sim_id, sim.sim_info.sim_id):
+            try:
+                snapshot = build_npc_snapshot(t_info, sim.sim_info)
+                if _npc_store.offer(t_info.sim_id, sim.sim_info.sim_id, snapshot):
+                    _append_log_entry(snapshot)
+            except:
+                pass
+        if prof is not None:
+            t = prof.lap('npc_snapshot', t)
+
+    # 目标：Sim 记 id，物品记类型（名字保存时再解析）
+    target_id = None
+    target_type = None
+    if target_is_sim:
+        target_id = target.sim_id
+    elif target:
+        try:
+            target_type = _target_type(target)
+        except:
+            pass
+    if prof is not None:
+        t = prof.lap('naming', t)
 
-    return ', '.join(traits[:8]) if traits else ""
+    # 关系值追踪（目标是Sim时）
+    rel_delta = None
+    if target_is_sim:
+        try:
+            rel_delta = _rel_delta.take(sim.sim_info, target_id, actor_is_family and target_is_family)
+        except:
+            pass
+        if prof is not None:
+            t = prof.lap('relationship', t)
 
+    # 只有是主控自己在做动作时，才检查情绪变化
+    current_mood_str = ""
+    if actor_is_family:
+        current_mood_str = get_mood_delta(sim)
+        if prof is not None:
+            t = prof.lap('mood', t)
 
-# =======================================================
-# 2. 监听核心 (Inject)
-# =======================================================
-if not hasattr(Interaction, '_original_trigger_backup'):
-    Interaction._original_trigger_backup = Interaction._trigger_interaction_start_event
+    # 组装事件记录
+    _append_log_entry(_LogEvent(services.game_clock_service().now(), sim.sim_id,
+                                target_id, target_type, action, current_mood_str, rel_delta))
+    _autosave.on_event()
+    if prof is not None:
+        prof.lap('append', t)
+        prof.count_logged()
 
 
 def _new_trigger_start(self, *args, **kwargs):
-    global _last_zone_id
-    _check_inbox_quick()
-    try:
-        # --- 场景切换检测 ---
-        current_zone = services.current_zone_id()
-        if _last_zone_id is not None and current_zone != _last_zone_id:
-            header = get_header_context()
-            _log_buffer.append(f"\n===  Travel: {header} ===\n")
-            _sim_mood_cache.clear()
-            _sim_last_action_cache.clear()
-            _npc_seen.clear()
-        _last_zone_id = current_zone
-        # ------------------
-
-        sim = getattr(self, 'sim', None)
-        if sim:
-            actor_is_family = is_active_sim(sim)
-            target = getattr(self, 'target', None)
-            target_is_family = False
-            if target and hasattr(target, 'is_sim') and target.is_sim:
-                target_is_family = is_active_sim(target)
-
-            if actor_is_family or target_is_family:
-                raw_action = type(self).__name__
-                if hasattr(self, 'affordance') and self.affordance:
-                    raw_action = self.affordance.__name__
-
-                action = clean_string(raw_action)
-
-                # === 调试模式：记录所有互动（含被过滤的）===
-                if _debug_mode:
-                    raw_info = f"[RAW] {raw_action} | cleaned: {action}"
-                    if is_meaningful(action):
-                        _debug_raw_log.append(raw_info)
-                    else:
-                        _debug_filtered_log.append(raw_info)
-                # === 调试模式结束 ===
-
-                if is_meaningful(action) and action:
-                    sim_id = str(sim.id)
-                    last_action = _sim_last_action_cache.get(sim_id, "")
-
-                    target = getattr(self, 'target', None)
-                    target_name = get_target_name_smart(target) if target else ""
-
-                    action_key = f"{action}-{target_name}"
-
-                    # 社交互动添加时间戳，防止被误判为重复
-                    if any(keyword in action.lower() for keyword in
-                           ['social', 'romance', 'kiss', 'flirt', 'hug', 'chat']):
-                        action_key += f"-{get_log_time()}"
-
-                    if action_key == last_action:
-                        return Interaction._original_trigger_backup(self, *args, **kwargs)
-
-                    _sim_last_action_cache[sim_id] = action_key
-
-                    # === NPC 快照 ===
-                    if target and hasattr(target, 'is_sim') and target.is_sim:
-                        t_info = target.sim_info if hasattr(target, 'sim_info') else None
-                        if t_info and not is_active_sim(target) and t_info.sim_id not in _npc_seen:
-                            _npc_seen.add(t_info.sim_id)
-                            try:
-                                snapshot = build_npc_snapshot(t_info, sim.sim_info)
-                                _log_buffer.append(snapshot)
-                            except:
-                                pass
-
-                    display_name = get_sim_name_robust(sim)
-                    time_str = get_log_time()
-
-                    target_str = ""
-                    rel_str = ""
-                    if target:
-                        t_name = get_target_name_smart(target)
-                        if t_name != display_name:
-                            target_str = f" -> {t_name}"
-
-                        # 关系值追踪（目标是Sim时）
-                        if hasattr(target, 'is_sim') and target.is_sim:
-                            try:
-                                rel_str = _get_rel_change(sim.sim_info, target.sim_info)
-                            except:
-                                pass
-
-                    # 只有是主控自己在做动作时，才检查情绪变化
-                    current_mood_str = ""
-                    if actor_is_family:
-                        current_mood_str = get_mood_delta(sim)
-
-                    # 组装日志条目
-                    entry = f"{time_str} {display_name}{current_mood_str} -> {action}{target_str}{rel_str}"
-
-                    if not _log_buffer or _log_buffer[-1] != entry:
-                        _log_buffer.append(entry)
-
-                        if len(_log_buffer) > 500:
-                            _log_buffer.pop(0)
-
+    prof = _profiler if _profiler.enabled else None
+    if prof is not None:
+        t0 = _perf_ns()
+    try:
+        _process_interaction_start(self, prof)
     except Exception as e:
         pass
+    if prof is not None:
+        prof.lap('total', t0)
 
     return Interaction._original_trigger_backup(self, *args, **kwargs)
 
-
 Interaction._trigger_interaction_start_event = _new_trigger_start
 _load_settings()
 
@@ -1450,88 +3324,593 @@ def show_confirm_dialog(text, title, on_ok, on_cancel=None):
     dialog.add_listener(_on_response)
     dialog.show_dialog()
 
-def _check_inbox_quick():
-    """搭便车在 interaction hook 上的轻量 inbox 检查"""
-    global _last_inbox_check, _pending_story
-
-    now = time.time()
-    if now - _last_inbox_check < 5:
-        return
-    _last_inbox_check = now
+def _consume_inbox():
+    """
+    检查信号文件，有新剧情就弹窗并清空 inbox
+    返回 True 表示这次取到了剧情
+    """
+    global _pending_story
 
-    try:
-        output_dir = get_output_directory()
-        signal_path = os.path.join(output_dir, "Story_Ready.signal")
+    output_dir = get_output_directory()
+    signal_path = os.path.join(output_dir, "Story_Ready.signal")
 
-        if not os.path.exists(signal_path):
-            return
+    # 没有信号文件 = 没有新剧情，直接返回
+    if not os.path.exists(signal_path):
+        return False
 
-        inbox_path = get_inbox_path()
+    # 信号存在！读取 inbox
+    inbox_path = get_inbox_path()
+    try:
         content = ""
         with open(inbox_path, "r", encoding="utf-8") as f:
             content = f.read().strip()
 
-        if content:
+        # 删掉信号文件（一次性消费；inbox 为空也删，避免死循环）
+        try:
+            os.remove(signal_path)
+        except:
+            pass
+
+        if not content:
+            return False
+
+        # 缓存起来（给手动 Show Story 用）
+        _pending_story = content
+
+        # 自动弹窗（按设置选择样式）
+        show_story_by_setting(content)
+
+        # 清空 inbox
+        with open(inbox_path, "w", encoding="utf-8") as f:
+            f.write("")
+        return True
+    except Exception as e:
+        log_error(f"Auto-popup error: {e}", "check_inbox")
+        return False
+
+
+class _InboxScheduler:
+    """
+    自适应 inbox 轮询（基于 alarms.add_alarm_real_time）
+    保存日志后一段时间内 1s 快速轮询（AI 剧情可能快到了），
+    之后没有动静就指数退避，最长 30s 检查一次
+    """
+    FAST_INTERVAL = 1
+    MAX_INTERVAL = 30
+    FAST_WINDOW = 180  # do_save_log 之后保持快速轮询的秒数
+
+    def __init__(self):
+        self._alarm = None
+        self._fast_until = 0
+        self.interval = self.MAX_INTERVAL
+        self.enabled = True  # stop_ai 之后切换场景也不会自动重启
+
+    @property
+    def running(self):
+        return self._alarm is not None
+
+    def fast_seconds_left(self):
+        return max(0, int(self._fast_until - time.time()))
+
+    def start(self):
+        """ 开始轮询（已经在跑则重新排期） """
+        self.enabled = True
+        return self._schedule(self.interval)
+
+    def stop(self):
+        self.enabled = False
+        self._cancel()
+
+    def on_zone_changed(self):
+        """ 换场景：取消旧场景的 alarm（不保证会随场景销毁），进新场景后重新排期 """
+        self._cancel()
+        if self.enabled:
+            self._schedule(self.FAST_INTERVAL)
+
+    def expect_story(self):
+        """ 刚保存完日志：切回快速轮询 """
+        self._fast_until = time.time() + self.FAST_WINDOW
+        if self.enabled:
+            self._schedule(self.FAST_INTERVAL)
+
+    def _cancel(self):
+        if self._alarm is not None:
             try:
-                os.remove(signal_path)
+                alarms.cancel_alarm(self._alarm)
             except:
                 pass
+            self._alarm = None
+
+    def _schedule(self, seconds):
+        self._cancel()
+        client = services.client_manager().get_first_client()
+        if not client:
+            return False
+        self.interval = seconds
+        self._alarm = alarms.add_alarm_real_time(
+            client,
+            clock.interval_in_real_seconds(seconds),
+            self._tick,
+            repeating=False
+        )
+        return True
+
+    def _tick(self, _):
+        self._alarm = None
+        next_interval = self.MAX_INTERVAL
+        try:
+            if _consume_inbox():
+                # 剧情已到，短时间内不会再有新的
+                self._fast_until = 0
+            elif time.time() < self._fast_until:
+                next_interval = self.FAST_INTERVAL
+            else:
+                next_interval = min(self.MAX_INTERVAL, self.interval * 2)
+        except Exception as e:
+            log_error(f"Inbox scheduler error: {e}", "inbox_scheduler")
+        try:
+            if self.enabled:
+                self._schedule(next_interval)
+        except Exception as e:
+            log_error(f"Inbox reschedule error: {e}", "inbox_scheduler")
+
+
+_inbox_scheduler = _InboxScheduler()
+
+
+# ========== 后台写盘 ==========
+
+def _atomic_write(path, text, mode, sync):
+    """
+    mode "w"：写临时文件 → (fsync) → os.replace，读的一方不会看到写了一半的文件
+    mode "a"：累积日志直接追加（整份重写太慢），按需 fsync
+    """
+    if mode == "a":
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(text)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        return
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        if sync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class _IoJob:
+    __slots__ = ('writes', 'on_done', 'done', 'error', 'inline')
 
-            _pending_story = content
-            show_story_by_setting(content)
+    def __init__(self, writes, on_done):
+        self.writes = writes      # [(路径, 文本, "w"/"a")] 或 fn(sync)
+        self.on_done = on_done    # on_done(error)，在游戏线程里调用
+        self.done = False
+        self.error = None
+        self.inline = False       # submit 里直接写完的（回调也已经调过了）
+
+
+class _IoWorker:
+    """
+    保存日志的后台写盘线程：任务按提交顺序执行
+    完成回调不在后台线程里跑，而是由游戏线程的 real-time alarm 取出来执行
+    async_io 关闭或线程起不来时，直接在当前线程写
+    """
+    DRAIN_INTERVAL = 1
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._done = queue.Queue()
+        self._thread = None
+        self._drain_alarm = None
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        try:
+            self._thread = threading.Thread(target=self._run, name="AIStorytellerIO", daemon=True)
+            self._thread.start()
+            return True
+        except Exception as e:
+            log_error(f"IO thread unavailable, writing inline: {e}", "io_worker")
+            self._thread = None
+            return False
+
+    def submit(self, writes, on_done=None):
+        job = _IoJob(writes, on_done)
+        if _settings.get("async_io", True) and self._ensure_thread():
+            self.pending += 1
+            self._jobs.put(job)
+            self._schedule_drain()
+        else:
+            job.inline = True
+            self._execute(job)
+            self._finish(job)
+        return job
 
-            with open(inbox_path, "w", encoding="utf-8") as f:
-                f.write("")
+    def _execute(self, job):
+        policy = _settings.get("fsync_policy", "latest")
+        try:
+            for item in job.writes:
+                if callable(item):
+                    # 分段日志等自定义写入：fn(sync)
+                    item(policy == "always")
+                    continue
+                path, text, mode = item
+                sync = policy == "always" or (policy == "latest" and mode == "w")
+                _atomic_write(path, text, mode, sync)
+        except Exception as e:
+            job.error = e
+        job.done = True
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            self._execute(job)
+            self._done.put(job)
+
+    def _finish(self, job):
+        if job.error is None:
+            self.completed += 1
         else:
+            self.failed += 1
+            log_error(f"Write failed: {job.error}", "io_worker")
+        if job.on_done is not None:
             try:
-                os.remove(signal_path)
+                job.on_done(job.error)
+            except Exception as e:
+                log_error(f"IO callback error: {e}", "io_worker")
+
+    def drain(self):
+        """ 游戏线程：执行已完成任务的回调 """
+        while True:
+            try:
+                job = self._done.get_nowait()
+            except queue.Empty:
+                return
+            self.pending -= 1
+            self._finish(job)
+
+    def _schedule_drain(self):
+        if self._drain_alarm is not None:
+            return
+        try:
+            client = services.client_manager().get_first_client()
+            if not client:
+                return
+            self._drain_alarm = alarms.add_alarm_real_time(
+                client,
+                clock.interval_in_real_seconds(self.DRAIN_INTERVAL),
+                self._drain_tick,
+                repeating=False
+            )
+        except Exception as e:
+            log_error(f"IO drain alarm error: {e}", "io_worker")
+
+    def _drain_tick(self, _):
+        self._drain_alarm = None
+        self.drain()
+        if self.pending > 0:
+            self._schedule_drain()
+
+    def on_zone_changed(self):
+        """ 换场景：取消旧场景的 alarm，马上把写完的结果收回来 """
+        if self._drain_alarm is not None:
+            try:
+                alarms.cancel_alarm(self._drain_alarm)
             except:
                 pass
-    except Exception as e:
-        log_error(f"Hook inbox check error: {e}", "hook_inbox")
+            self._drain_alarm = None
+        self.drain()
+        if self.pending > 0:
+            self._schedule_drain()
 
-def check_inbox_logic(_):
-    """检查信号文件，有新剧情就自动弹通知"""
-    global _pending_story
 
-    output_dir = get_output_directory()
-    signal_path = os.path.join(output_dir, "Story_Ready.signal")
+_io_worker = _IoWorker()
+_unsaved_content = []  # 写盘失败的内容，下次保存时补上
 
-    # 没有信号文件 = 没有新剧情，直接返回
-    if not os.path.exists(signal_path):
-        return
 
-    # 信号存在！读取 inbox
-    inbox_path = get_inbox_path()
-    try:
-        content = ""
-        with open(inbox_path, "r", encoding="utf-8") as f:
-            content = f.read().strip()
+# ========== 累积日志分段 ==========
+
+class _SegmentedLog:
+    """
+    分段的累积日志：当前段还是原来的文件名（旧工具照常能读），
+    超过大小 / 保存次数就封存成 <名字>.0001.txt（可选 .gz），并更新 <名字>.txt.index.json
+    索引记录每段的游戏日期范围（sim day）、家庭 key、字节数
+    写入都在 IO 线程里做，索引的修改和 segments() 的读取用 _lock 互斥
+    iter_lines() 按顺序流式读出所有段（.gz 边读边解压），读的一方不用管分段命名
+    没有索引的旧日志在下一次追加时先整个封存成第一段（范围未知，标记 legacy）
+    """
+    INDEX_VERSION = 1
+    MAX_HOUSEHOLDS = 16  # 每段最多记几个家庭 key
+
+    def __init__(self, path, max_bytes=0, max_sessions=0, compress=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.compress = compress
+        self._dir = os.path.dirname(path)
+        self._stem, self._ext = os.path.splitext(os.path.basename(path))
+        self.index_path = path + ".index.json"
+        self._index = None
+        self._legacy = False  # 现有文件没有索引，下次追加时先封存
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_active():
+        return {"sessions": 0, "first": None, "last": None, "households": [], "bytes": 0}
+
+    def _load_index(self):
+        if self._index is not None:
+            return self._index
+        index = None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except:
+            pass
+        if not isinstance(index, dict) or index.get("version") != self.INDEX_VERSION:
+            # 没有索引（或旧版本）：现有的文件里是什么时候的内容不知道，追加前先封存
+            index = {"version": self.INDEX_VERSION, "range": "sim_day",
+                     "segments": [], "active": self._new_active()}
+            self._legacy = os.path.exists(self.path)
+        self._index = index
+        return index
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def _should_rotate(self, size, active):
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        if self.max_sessions and active.get("sessions", 0) >= self.max_sessions:
+            return True
+        return False
 
-        if content:
-            # 1. 删掉信号文件（一次性消费）
+    def append(self, text, day=None, household=None, sync=False):
+        """ 追加一次保存的内容（需要时先封存当前段） """
+        with self._lock:
+            index = self._load_index()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and (self._legacy or self._should_rotate(size, index["active"])):
+            self._rotate(size)
+        self._legacy = False
+
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+        try:
+            new_size = os.path.getsize(self.path)
+        except OSError:
+            new_size = None
+        with self._lock:
+            active = index["active"]
+            active["sessions"] = active.get("sessions", 0) + 1
+            if day is not None:
+                if active.get("first") is None:
+                    active["first"] = day
+                active["last"] = day
+            households = active.setdefault("households", [])
+            if household and household not in households and len(households) < self.MAX_HOUSEHOLDS:
+                households.append(household)
+            if new_size is not None:
+                active["bytes"] = new_size
+        self._save_index()
+
+    def _rotate(self, size):
+        """ 把当前段封存成编号段（可选 gzip），开一个新的当前段 """
+        index = self._index
+        segments = index["segments"]
+        seq = (segments[-1].get("seq", len(segments)) if segments else 0) + 1
+        seg_path = os.path.join(self._dir, f"{self._stem}.{seq:04d}{self._ext}")
+        os.replace(self.path, seg_path)
+
+        stored_path = seg_path
+        if self.compress:
             try:
-                os.remove(signal_path)
-            except:
-                pass
+                stored_path = self._gzip(seg_path)
+            except Exception as e:
+                log_error(f"Segment compress failed: {e}", "segmented_log")
+
+        entry = dict(index["active"])
+        entry["seq"] = seq
+        entry["file"] = os.path.basename(stored_path)
+        entry["bytes"] = size
+        if self._legacy:
+            entry["legacy"] = True
+        try:
+            entry["stored_bytes"] = os.path.getsize(stored_path)
+        except OSError:
+            entry["stored_bytes"] = size
+        with self._lock:
+            segments.append(entry)
+            index["active"] = self._new_active()
+        self._save_index()
+
+    @staticmethod
+    def _gzip(path):
+        gz_path = path + ".gz"
+        tmp_path = gz_path + ".tmp"
+        with open(path, "rb") as src, open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(filename=os.path.basename(path), mode="wb", fileobj=raw) as dst:
+                shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, gz_path)
+        os.remove(path)
+        return gz_path
+
+    def segments(self):
+        """ 所有段的索引信息（封存的在前，最后是当前段）；游戏线程调用，在锁里拷一份快照 """
+        with self._lock:
+            index = self._load_index()
+            sealed = [dict(seg) for seg in index["segments"]]
+            active = dict(index["active"])
+        active["file"] = os.path.basename(self.path)
+        return sealed + [active]
+
+    def iter_lines(self):
+        """ 按时间顺序逐行读出所有段（封存的在前，.gz 自动解压），最后是当前段 """
+        for seg in self.segments():
+            path = os.path.join(self._dir, seg["file"])
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                with opener(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        yield line
+            except OSError:
+                continue
 
-            # 2. 缓存起来（给手动 Show Story 用）
-            _pending_story = content
 
-            # 3. 自动弹通知！
-            show_story_notification(content)
+def _configure_segmented_log(seg_log):
+    seg_log.max_bytes = max(0, int(_settings.get("log_segment_max_kb", 2048))) * 1024
+    seg_log.max_sessions = max(0, int(_settings.get("log_segment_max_sessions", 0)))
+    seg_log.compress = bool(_settings.get("log_segment_gzip", True))
 
-            # 4. 清空 inbox
-            with open(inbox_path, "w", encoding="utf-8") as f:
-                f.write("")
-        else:
-            # inbox 是空的但信号存在，删掉信号避免死循环
+
+def _get_segmented_log(path):
+    """ 按路径取分段日志（输出目录改了会换新的） """
+    seg_log = _segmented_logs.get(path)
+    if seg_log is None:
+        seg_log = _SegmentedLog(path)
+        _configure_segmented_log(seg_log)
+        _segmented_logs[path] = seg_log
+    return seg_log
+
+
+# ========== 自动保存 ==========
+
+class _AutoSaveScheduler:
+    """
+    自动保存（设置面板的 option_1..3）：
+      option_1 缓冲攒到 autosave_events 条 / option_2 每 autosave_sim_hours 个游戏小时（游戏时间 alarm）/
+      option_3 切换场景
+    触发后用 real-time alarm 在钩子外面保存；离上次保存不到 autosave_min_interval_seconds 就往后推
+    """
+
+    def __init__(self):
+        self._timer = None        # 游戏时间定时器
+        self._timer_hours = None
+        self._flush_alarm = None  # 待执行的保存
+        self.pending_reason = None
+        self.last_save = 0        # 上次保存成功的 time.time()（手动保存也算）
+        self.saves = 0
+        self.last_reason = None
+
+    def on_event(self):
+        """ 钩子记录一条事件后调用：只做计数比较 """
+        if self._flush_alarm is not None or not _settings.get("option_1"):
+            return
+        if len(_log_buffer) + len(_raw_events) >= int(_settings.get("autosave_events", 200)):
+            self.request("buffer")
+
+    def on_zone_changed(self, traveled):
+        """ 换场景：取消旧场景的 alarm，重新排定时器，需要的话保存旧场景的内容 """
+        self._cancel_timer()
+        if self._flush_alarm is not None:
             try:
-                os.remove(signal_path)
+                alarms.cancel_alarm(self._flush_alarm)
             except:
                 pass
-    except Exception as e:
-        log_error(f"Auto-popup error: {e}", "check_inbox")
+            self._flush_alarm = None
+        self.refresh()
+        if traveled and _settings.get("option_3"):
+            self.request("travel")
+        elif self.pending_reason:
+            self.request(self.pending_reason)
+
+    def refresh(self):
+        """ 按当前设置启停游戏时间定时器 """
+        hours = _settings.get("autosave_sim_hours", 6)
+        if not _settings.get("option_2") or not hours or hours <= 0:
+            self._cancel_timer()
+            return
+        if self._timer is not None and self._timer_hours == hours:
+            return
+        self._cancel_timer()
+        try:
+            client = services.client_manager().get_first_client()
+            if not client:
+                return
+            self._timer = alarms.add_alarm(
+                client,
+                clock.interval_in_sim_hours(hours),
+                self._timer_tick,
+                repeating=True
+            )
+            self._timer_hours = hours
+        except Exception as e:
+            log_error(f"Autosave timer error: {e}", "autosave")
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            try:
+                alarms.cancel_alarm(self._timer)
+            except:
+                pass
+        self._timer = None
+        self._timer_hours = None
+
+    def _timer_tick(self, _):
+        self.request("timer")
+
+    def request(self, reason):
+        """ 排一次保存（已经排了就不重复） """
+        if self._flush_alarm is not None:
+            return
+        self.pending_reason = reason
+        min_interval = _settings.get("autosave_min_interval_seconds", 120)
+        wait = max(1, int(min_interval - (time.time() - self.last_save)))
+        try:
+            client = services.client_manager().get_first_client()
+            if not client:
+                return
+            self._flush_alarm = alarms.add_alarm_real_time(
+                client,
+                clock.interval_in_real_seconds(wait),
+                self._flush_tick,
+                repeating=False
+            )
+        except Exception as e:
+            log_error(f"Autosave schedule error: {e}", "autosave")
+
+    def seconds_until_allowed(self):
+        min_interval = _settings.get("autosave_min_interval_seconds", 120)
+        return max(0, int(min_interval - (time.time() - self.last_save)))
+
+    def _flush_tick(self, _):
+        self._flush_alarm = None
+        reason = self.pending_reason
+        if self.seconds_until_allowed() > 0:
+            # 期间有手动保存：重新计时
+            self.request(reason)
+            return
+        self.pending_reason = None
+        if not _log_buffer and not _raw_events:
+            return
+        try:
+            success, _ = do_save_log()
+            if success:
+                self.saves += 1
+                self.last_reason = reason
+        except Exception as e:
+            log_error(f"Autosave failed: {e}", "autosave")
+
+
+_autosave = _AutoSaveScheduler()
 
 
 # =======================================================
@@ -1543,7 +3922,22 @@ def do_save_log():
     核心保存逻辑（被菜单按钮和命令共用）
     返回 (success: bool, message: str)
     """
+    prof = _profiler if _profiler.enabled else None
+    if prof is not None:
+        t0 = _perf_ns()
+    try:
+        result = _do_save_log()
+        if result[0]:
+            _autosave.last_save = time.time()
+        return result
+    finally:
+        if prof is not None:
+            prof.lap('save', t0)
+
+
+def _do_save_log():
     _auto_register_household()
+    _flush_raw_events()
 
     output_dir = get_output_directory()
 
@@ -1555,15 +3949,20 @@ def do_save_log():
             return (False, f" No new logs to save.\n({MOD_VERSION})")
 
         # 生成标题和角色信息
-        header = f"\n--- Save {get_header_context()} ---\n"
+        context = get_header_context()
+        header = f"\n--- Save {context} ---\n"
+        dropped = _log_buffer.dropped
+        if dropped:
+            header += f"[Dropped {dropped} older events (buffer capacity {_log_buffer.capacity})]\n"
 
         # 家庭信息行
         household_lines = ""
+        hkey = None
+        hname = ""
         try:
             hkey = _get_household_key()
             if hkey:
-                _, households = _load_households()
-                hdata = households.get(hkey, {})
+                hdata = _household_shards.get(hkey)
                 hname = hdata.get("name", "")
                 profile = hdata.get("profile", "")
                 recap = hdata.get("player_recap", "")
@@ -1585,44 +3984,103 @@ def do_save_log():
         if characters_info:
             content_lines.append(characters_info + "\n")
 
-        for line in _log_buffer:
-            content_lines.append(line + "\n")
+        entries = list(_log_buffer)
+        compact_note = ""
+        if _settings.get("compact_runs", True):
+            entries = _compact_entries(entries)
+            if len(entries) < len(_log_buffer):
+                compact_note = f"\n Compacted {len(_log_buffer)} -> {len(entries)} lines"
+
+        want_jsonl = _settings.get("jsonl_output", False)
+        records = []
+        sim_infos = services.sim_info_manager()
+        for entry in entries:
+            text = _render_log_entry(entry, sim_infos)
+            content_lines.append(text + "\n")
+            if want_jsonl:
+                records.append(_event_record(entry, text.strip(), sim_infos))
 
         full_content = "".join(content_lines)
         count = len(_log_buffer)
 
-        # 文件1：累积版（追加模式 "a"）
-        with open(path_full, "a", encoding="utf-8") as f:
-            f.write(full_content)
-
-        # 文件2：最新版（覆盖模式 "w"）
-        with open(path_latest, "w", encoding="utf-8") as f:
-            f.write(full_content)
-
-        # ====== 写入验证 ======
-        verify_ok = False
-        try:
-            with open(path_latest, "r", encoding="utf-8") as f:
-                check = f.read()
-                if len(check) > 10:
-                    verify_ok = True
-        except:
-            pass
+        # 上次写盘失败的内容补在前面
+        if _unsaved_content:
+            full_content = "".join(_unsaved_content) + full_content
+            del _unsaved_content[:]
+
+        # 同步写（async_io 关闭）时失败直接放进返回值；后台写完才知道结果的用通知，只报一次
+        inline = [True]
+
+        def on_full_written(error, content=full_content):
+            if error is None:
+                return
+            # 只有累积版没写进去才留着补：最新版失败不能让下次把同一段再追加一遍
+            _unsaved_content.append(content)
+            if not inline[0]:
+                show_story_notification(f" Save failed: {error}\n\nOutput dir: {output_dir}\n"
+                                        f"The entries will be retried on the next save.")
+
+        def on_latest_written(error):
+            if error is None:
+                _inbox_scheduler.expect_story()
+            elif not inline[0]:
+                show_story_notification(f" Latest log write failed: {error}\n\nPath: {path_latest}")
+
+        # 文件1：累积版（分段追加）；文件2：最新版（临时文件 + 原子替换），分开两个任务各自报告结果
+        sim_day = _sim_day()
+        full_log = _get_segmented_log(path_full)
+        full_job = _io_worker.submit([
+            lambda sync: full_log.append(full_content, sim_day, hkey, sync),
+        ], on_full_written)
+        latest_job = _io_worker.submit([(path_latest, full_content, "w")], on_latest_written)
+        inline[0] = False
+
+        # 文件3（可选）：JSONL，单独的任务，失败不影响文本日志
+        if want_jsonl:
+            try:
+                session = {
+                    "type": "session",
+                    "schema": _JSONL_SCHEMA,
+                    "mod_version": MOD_VERSION,
+                    "context": context,
+                    "household_key": hkey,
+                    "household": hname,
+                    "count": count,
+                    "lines": len(entries),
+                    "dropped": dropped,
+                }
+                try:
+                    session["ticks"] = services.time_service().sim_now.absolute_ticks()
+                except:
+                    pass
+                _io_worker.submit(_jsonl_writes(session, records, output_dir, sim_day))
+            except Exception as e:
+                log_error(f"JSONL write failed: {e}", "save_log")
 
         _log_buffer.clear()
 
-        if verify_ok:
-            return (True,
-                    f" Saved {count} entries!\n\n"
-                    f" Full log:\n{path_full}\n\n"
-                    f" Latest:\n{path_latest}")
-        else:
+        # 只看当场写完的任务；后台任务的 done/error 随时可能被线程改掉，失败由回调通知
+        if full_job.inline and full_job.error is not None:
             return (False,
-                    f" File created but may be empty!\n\n"
+                    f" Save failed: {full_job.error}\n\n"
+                    f"Path: {path_full}\n"
+                    f"The entries will be retried on the next save.\n\n"
+                    f"Try creating a config file in your Mods folder:\n"
+                    f"AI_Storyteller_Config.txt")
+        if latest_job.inline and latest_job.error is not None:
+            return (False,
+                    f" Latest log write failed: {latest_job.error}\n"
+                    f"The full log was saved.\n\n"
                     f"Path: {path_latest}\n\n"
                     f"Try creating a config file in your Mods folder:\n"
                     f"AI_Storyteller_Config.txt")
 
+        dropped_note = f" ({dropped} older events dropped)" if dropped else ""
+        return (True,
+                f" Saved {count} entries!{dropped_note}{compact_note}\n\n"
+                f" Full log:\n{path_full}\n\n"
+                f" Latest:\n{path_latest}")
+
     except Exception as e:
         return (False, f" Save failed: {e}\n\nOutput dir: {output_dir}")
 
@@ -1642,41 +4100,45 @@ def save_now_command(_connection=None):
 @sims4.commands.Command('start_ai', command_type=sims4.commands.CommandType.Live)
 def start_ai_monitor(_connection=None):
     """ 开启弹窗监测 """
-    global _monitor_alarm
     output = sims4.commands.CheatOutput(_connection)
 
-    if _monitor_alarm is not None:
+    if _inbox_scheduler.running:
         output(f" AI monitoring is already running! ({MOD_VERSION})")
         return
 
-    client = services.client_manager().get_first_client()
-    if not client:
+    if not _inbox_scheduler.start():
         output(" Please enter Live Mode first")
         return
 
-    _monitor_alarm = alarms.add_alarm_real_time(
-        client,
-        clock.interval_in_real_seconds(5),
-        check_inbox_logic,
-        repeating=True
-    )
     output(f" AI inbox monitoring started! ({MOD_VERSION})")
 
 
 @sims4.commands.Command('stop_ai', command_type=sims4.commands.CommandType.Live)
 def stop_ai_monitor(_connection=None):
     """ 停止弹窗监测 """
-    global _monitor_alarm
     output = sims4.commands.CheatOutput(_connection)
 
-    if _monitor_alarm is not None:
-        alarms.cancel_alarm(_monitor_alarm)
-        _monitor_alarm = None
+    if _inbox_scheduler.running:
+        _inbox_scheduler.stop()
         output(" Monitoring stopped.")
     else:
+        _inbox_scheduler.stop()
         output(" No monitoring is currently running.")
 
 
+@sims4.commands.Command('ai_inbox', command_type=sims4.commands.CommandType.Live)
+def inbox_status_command(_connection=None):
+    """ 显示 inbox 轮询状态（诊断用） """
+    output = sims4.commands.CheatOutput(_connection)
+    if _inbox_scheduler.running:
+        state = "running"
+    else:
+        state = "idle" if _inbox_scheduler.enabled else "stopped"
+    fast_left = _inbox_scheduler.fast_seconds_left()
+    fast_str = f", fast mode for {fast_left}s more" if fast_left else ""
+    output(f" Inbox polling: {state}, interval {_inbox_scheduler.interval}s{fast_str}")
+
+
 @sims4.commands.Command('ai_path', command_type=sims4.commands.CommandType.Live)
 def show_path_command(_connection=None):
     """ 显示当前保存路径（调试用） """
@@ -1693,6 +4155,280 @@ def show_path_command(_connection=None):
         output(" Could not find Mods folder!")
 
 
+@sims4.commands.Command('ai_affcache', command_type=sims4.commands.CommandType.Live)
+def affordance_cache_command(action="stats", _connection=None):
+    """ 动作分类缓存：ai_affcache [stats|dump|clear] """
+    output = sims4.commands.CheatOutput(_connection)
+    action = str(action).lower()
+    hits = _affordance_cache_stats["hits"]
+    misses = _affordance_cache_stats["misses"]
+    total = hits + misses
+    rate = (hits * 100.0 / total) if total else 0.0
+
+    if action == "clear":
+        _affordance_cache.clear()
+        _affordance_cache_stats["hits"] = 0
+        _affordance_cache_stats["misses"] = 0
+        output(" Affordance cache cleared.")
+        return
+
+    if action == "dump":
+        path = os.path.join(get_output_directory(), "Sims4_Affordance_Cache.txt")
+        try:
+            rows = sorted(
+                (aff.__name__, act, keep) for aff, (act, keep, _) in _affordance_cache.items()
+            )
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"# entries={len(rows)} hits={hits} misses={misses} hit_rate={rate:.1f}%\n")
+                for raw, act, keep in rows:
+                    f.write(f"{'KEEP' if keep else 'DROP'}\t{raw}\t{act}\n")
+            output(f" Dumped {len(rows)} entries to:\n{path}")
+        except Exception as e:
+            output(f" Dump failed: {e}")
+        return
+
+    output(f" Affordance cache: {len(_affordance_cache)} entries, "
+           f"hits={hits} misses={misses} ({rate:.1f}% hit rate)")
+
+
+@sims4.commands.Command('ai_npccache', command_type=sims4.commands.CommandType.Live)
+def npc_cache_command(action="stats", _connection=None):
+    """ NPC 快照缓存：ai_npccache [stats|clear] """
+    output = sims4.commands.CheatOutput(_connection)
+    if str(action).lower() == "clear":
+        _npc_store.clear()
+        output(" NPC snapshot cache cleared.")
+        return
+
+    lookups = _npc_store.hits + _npc_store.misses + _npc_store.refreshed + _npc_store.revalidated
+    rate = (_npc_store.hits * 100.0 / lookups) if lookups else 0.0
+    output(f" NPC snapshots: {len(_npc_store)}/{_npc_store.capacity} entries, "
+           f"hits={_npc_store.hits} new={_npc_store.misses} refreshed={_npc_store.refreshed} "
+           f"revalidated={_npc_store.revalidated} "
+           f"({rate:.1f}% hit rate)")
+    output(f" Emitted {_npc_store.emitted}, evicted {_npc_store.evicted}")
+
+
+def _bench_matcher(matcher, corpus, rounds):
+    """对比 any() 链和编译后的匹配器，返回 (naive 秒, compiled 秒, 结果不一致数)"""
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            matcher.first_table_naive(text)
+    t1 = time.perf_counter()
+    for _ in range(rounds):
+        for text in corpus:
+            matcher.first_table(text)
+    t2 = time.perf_counter()
+    mismatches = sum(1 for text in corpus
+                     if matcher.first_table(text) != matcher.first_table_naive(text))
+    return (t1 - t0, t2 - t1, mismatches)
+
+
+@sims4.commands.Command('ai_bench_matcher', command_type=sims4.commands.CommandType.Live)
+def bench_matcher_command(rounds=20, _connection=None):
+    """ 关键词匹配基准：用游戏里真实的 affordance / 关系 bit 名字做语料 """
+    output = sims4.commands.CheatOutput(_connection)
+    try:
+        rounds = max(1, int(rounds))
+    except:
+        rounds = 20
+
+    suites = []
+    try:
+        mgr = services.get_instance_manager(sims4.resources.Types.INTERACTION)
+        names = [clean_string(t.__name__).lower() for t in mgr.types.values()]
+        suites.append(("is_meaningful", _ACTION_MATCHER, names))
+    except Exception as e:
+        output(f" Interaction corpus unavailable: {e}")
+    try:
+        mgr = services.get_instance_manager(sims4.resources.Types.RELATIONSHIP_BIT)
+        names = [t.__name__ for t in mgr.types.values()]
+        suites.append(("_NOISE", _NOISE_MATCHER, names))
+    except Exception as e:
+        output(f" Relationship bit corpus unavailable: {e}")
+
+    for label, matcher, corpus in suites:
+        if not corpus:
+            continue
+        naive, compiled, mismatches = _bench_matcher(matcher, corpus, rounds)
+        n = len(corpus) * rounds
+        speedup = (naive / compiled) if compiled > 0 else 0.0
+        output(f" {label}: {len(corpus)} names x {rounds} rounds")
+        output(f"   any() chain: {naive * 1e9 / n:.0f} ns/name")
+        output(f"   compiled:    {compiled * 1e9 / n:.0f} ns/name  ({speedup:.1f}x)")
+        output(f"   mismatches:  {mismatches}")
+
+
+@sims4.commands.Command('ai_deferred', command_type=sims4.commands.CommandType.Live)
+def deferred_command(mode="", _connection=None):
+    """ 延迟解析模式：ai_deferred [on|off] """
+    output = sims4.commands.CheatOutput(_connection)
+    mode = str(mode).lower()
+    if mode in ("on", "off"):
+        if mode == "off":
+            _flush_raw_events()
+        _settings["deferred_enrichment"] = (mode == "on")
+        _save_settings()
+    state = "ON" if _settings.get("deferred_enrichment") else "OFF"
+    output(f" Deferred enrichment: {state} ({len(_raw_events)} raw events pending)")
+
+
+@sims4.commands.Command('ai_jsonl', command_type=sims4.commands.CommandType.Live)
+def jsonl_command(mode="", _connection=None):
+    """ JSONL 输出：ai_jsonl [on|off] """
+    output = sims4.commands.CheatOutput(_connection)
+    mode = str(mode).lower()
+    if mode in ("on", "off"):
+        _settings["jsonl_output"] = (mode == "on")
+        _save_settings()
+    state = "ON" if _settings.get("jsonl_output") else "OFF"
+    output(f" JSONL output: {state} (schema v{_JSONL_SCHEMA}, Sims4_Story_Log_Latest.jsonl)")
+
+
+@sims4.commands.Command('ai_compact', command_type=sims4.commands.CommandType.Live)
+def compact_command(mode="", _connection=None):
+    """ 重复事件合并：ai_compact [on|off|reset] """
+    output = sims4.commands.CheatOutput(_connection)
+    mode = str(mode).lower()
+    if mode in ("on", "off"):
+        _settings["compact_runs"] = (mode == "on")
+        _save_settings()
+    elif mode == "reset":
+        _compaction_stats["events"] = 0
+        _compaction_stats["lines"] = 0
+    state = "ON" if _settings.get("compact_runs", True) else "OFF"
+    output(f" Compaction: {state} (lookback {_settings.get('compact_lookback', 4)} runs, "
+           f"window {_settings.get('compact_window_minutes', 60)}m)")
+    output(_compaction_summary())
+
+
+def _compaction_summary():
+    events = _compaction_stats["events"]
+    lines = _compaction_stats["lines"]
+    ratio = (events * 1.0 / lines) if lines else 1.0
+    saved = ((events - lines) * 100.0 / events) if events else 0.0
+    return f" Compaction: {events} entries -> {lines} lines ({ratio:.2f}x, {saved:.1f}% fewer lines)"
+
+
+@sims4.commands.Command('ai_debug', command_type=sims4.commands.CommandType.Live)
+def debug_command(action="", _connection=None):
+    """ 调试统计：ai_debug [on|off|export|clear] """
+    global _debug_mode
+    output = sims4.commands.CheatOutput(_connection)
+    action = str(action).lower()
+    if action in ("on", "off"):
+        _debug_mode = (action == "on")
+    elif action == "clear":
+        _aff_histogram.clear()
+        output(" Affordance histogram cleared.")
+    elif action == "export":
+        try:
+            path_csv, path_json = _aff_histogram.export(get_output_directory())
+            output(f" Exported {len(_aff_histogram)} affordances to:\n{path_csv}\n{path_json}")
+        except Exception as e:
+            output(f" Export failed: {e}")
+        return
+
+    state = "ON" if _debug_mode else "OFF"
+    output(f" Debug mode: {state} ({len(_aff_histogram)}/{_aff_histogram.capacity} affordances tracked)")
+
+
+@sims4.commands.Command('ai_segments', command_type=sims4.commands.CommandType.Live)
+def segments_command(_connection=None):
+    """ 累积日志分段信息：ai_segments """
+    output = sims4.commands.CheatOutput(_connection)
+    seg_log = _get_segmented_log(os.path.join(get_output_directory(), "Sims4_Story_Log_Full.txt"))
+    segments = seg_log.segments()
+    limit = _settings.get("log_segment_max_kb", 2048)
+    output(f" Full log: {len(segments)} segment(s), limit {limit} KB, "
+           f"gzip {'on' if seg_log.compress else 'off'}")
+    for seg in segments[-5:]:
+        first = seg.get("first")
+        last = seg.get("last")
+        days = f"day {first:.1f}-{last:.1f}" if first is not None and last is not None else "day ?"
+        output(f"  {seg['file']}: {seg.get('sessions', 0)} saves, {days}, "
+               f"{seg.get('bytes', 0) // 1024} KB")
+
+
+@sims4.commands.Command('ai_autosave', command_type=sims4.commands.CommandType.Live)
+def autosave_command(key="", value="", _connection=None):
+    """ 自动保存参数：ai_autosave [events|hours|interval] [数值] """
+    output = sims4.commands.CheatOutput(_connection)
+    keys = {
+        "events": "autosave_events",
+        "hours": "autosave_sim_hours",
+        "interval": "autosave_min_interval_seconds",
+    }
+    key = str(key).lower()
+    if key in keys and value != "":
+        try:
+            _settings[keys[key]] = max(0, int(value))
+            _save_settings()
+            _autosave.refresh()
+        except ValueError:
+            output(f" Not a number: {value}")
+            return
+
+    def flag(k):
+        return "ON" if _settings.get(k) else "OFF"
+
+    output(f" Auto-save: buffer {flag('option_1')} ({_settings.get('autosave_events', 200)} events), "
+           f"timer {flag('option_2')} ({_settings.get('autosave_sim_hours', 6)} sim-hours), "
+           f"travel {flag('option_3')}")
+    output(f" Min interval {_settings.get('autosave_min_interval_seconds', 120)}s, "
+           f"{_autosave.saves} auto-saves (last: {_autosave.last_reason or '-'}), "
+           f"pending: {_autosave.pending_reason or '-'}")
+
+
+@sims4.commands.Command('ai_stats', command_type=sims4.commands.CommandType.Live)
+def stats_command(action="", _connection=None):
+    """ 钩子性能统计：ai_stats [reset|on|off] """
+    output = sims4.commands.CheatOutput(_connection)
+    action = str(action).lower()
+    if action == "reset":
+        _profiler.reset()
+        _dedup.reset_counters()
+        output(" Profiler stats reset.")
+        return
+    if action in ("on", "off"):
+        _settings["profiling"] = (action == "on")
+        _profiler.enabled = _settings["profiling"]
+        _save_settings()
+        output(f" Profiling {'enabled' if _profiler.enabled else 'disabled'}.")
+        return
+
+    if not _profiler.enabled:
+        output(" Profiling is off (ai_stats on to enable).")
+    for line in _profiler.report_lines():
+        output(line)
+    hits = _affordance_cache_stats["hits"]
+    misses = _affordance_cache_stats["misses"]
+    output(f" Buffer: {len(_log_buffer)}/{_log_buffer.capacity} ({_log_buffer.dropped} dropped), "
+           f"raw pending: {len(_raw_events)}")
+    output(f" Caches: affordance {len(_affordance_cache)} (hits {hits}/misses {misses}), "
+           f"buffs {len(_buff_meta_cache)}, rel pairs {len(_rel_delta)} ({_rel_delta.resyncs} resyncs), "
+           f"traits {len(_trait_name_cache)}/{len(_sim_trait_cache)} sims, "
+           f"names {len(_sim_identity_cache)}, "
+           f"npc snapshots {len(_npc_store)}/{_npc_store.capacity}, "
+           f"summary pairs {_summary_cache.reused} reused/{_summary_cache.fetched} fetched/"
+           f"{_summary_cache.reclassified} reclassified "
+           f"({_summary_cache.unhooked_changes} unhooked changes), "
+           f"header {_header_cache.hits} hits/{_header_cache.misses} misses")
+    output(f" Dedup: {_dedup.suppressed} suppressed / {_dedup.passed} passed "
+           f"(window {_settings.get('dedup_window_minutes', 20)}m, "
+           f"social {_settings.get('dedup_social_window_minutes', 1)}m)")
+    output(_compaction_summary())
+    output(f" Settings store: {_settings_store.loads} loads, {_settings_store.writes} writes, "
+           f"{_settings_store.pending()} pending")
+    output(f" Household shards: {_household_shards.reads} reads, {_household_shards.writes} writes, "
+           f"{_household_shards.pending()} pending, {_household_shards.lock_waits} lock waits")
+    output(f" IO: {_io_worker.pending} pending, {_io_worker.completed} written, "
+           f"{_io_worker.failed} failed (async {'on' if _settings.get('async_io', True) else 'off'}, "
+           f"fsync {_settings.get('fsync_policy', 'latest')})")
+    output(f" Inbox poll interval: {_inbox_scheduler.interval}s")
+
+
 @sims4.commands.Command('ai_setpath', command_type=sims4.commands.CommandType.Live)
 def set_path_command(*args, _connection=None):
     """设置自定义保存路径并自动创建所需文件"""
@@ -1737,21 +4473,10 @@ def set_path_command(*args, _connection=None):
             except Exception as e:
                 output(f" 无法创建 {fname}: {e}")
 
-    # 保存到 JSON 配置
-    mods_folder = _find_sims4_mods_folder()
-    if mods_folder:
-        config_json = os.path.join(mods_folder, "AI_Storyteller_Settings.json")
+    # 保存到 JSON 配置（桌面端也读这个，立即写盘）
+    if _settings_store.path():
         try:
-            config_data = {}
-            if os.path.exists(config_json):
-                try:
-                    with open(config_json, "r", encoding="utf-8") as f:
-                        config_data = json.load(f)
-                except:
-                    pass
-            config_data["save_path"] = custom_path
-            with open(config_json, "w", encoding="utf-8") as f:
-                json.dump(config_data, f, ensure_ascii=False, indent=2)
+            _settings_store.set(("save_path",), custom_path, flush=True)
         except Exception as e:
             output(f" 配置保存失败: {e}")
 
@@ -1869,7 +4594,7 @@ def _open_settings_main():
 
 
 def _open_auto_settings():
-    """Auto 子面板 — 第二层，3 个开关"""
+    """Auto 子面板 — 第二层，3 个自动保存开关"""
     try:
         client = services.client_manager().get_first_client()
         if not client or not client.active_sim:
@@ -1889,9 +4614,9 @@ def _open_auto_settings():
         )
 
         items = [
-            (1, "option_1", "Option 1"),
-            (2, "option_2", "Option 2"),
-            (3, "option_3", "Option 3"),
+            (1, "option_1", f"Auto-save at {_settings.get('autosave_events', 200)} events"),
+            (2, "option_2", f"Auto-save every {_settings.get('autosave_sim_hours', 6)} sim-hours"),
+            (3, "option_3", "Auto-save on travel"),
         ]
 
         for opt_id, key, label in items:
@@ -1915,6 +4640,8 @@ def _open_auto_settings():
                 if result:
                     key = result[0]
                     _settings[key] = not _settings[key]
+                    _save_settings()
+                    _autosave.refresh()
                     _open_auto_settings()  # 刷新
             except Exception as e:
                 _log_settings_error(f"Auto toggle error: {e}", "auto_on_chosen")
@@ -1954,7 +4681,7 @@ def _open_households_panel():
         if not client or not client.active_sim:
             return
 
-        active_key, households = _load_households()
+        active_key, households = _list_households()
 
         if not households:
             show_story_dialog("No households found yet.\nSave a log first to register the current household.")
@@ -1969,8 +4696,8 @@ def _open_households_panel():
             picker_type=UiObjectPicker.UiObjectPickerObjectPickerType.OBJECT,
         )
 
-        for i, (hkey, hdata) in enumerate(households.items()):
-            hname = hdata.get("name", "Household")
+        for i, (hkey, hname) in enumerate(households.items()):
+            hname = hname or "Household"
             label = f"{hname} (Active)" if hkey == active_key else hname
             row = ObjectPickerRow(
                 option_id=i + 1,
@@ -2006,12 +4733,11 @@ def _open_household_detail(household_key):
         if not client or not client.active_sim:
             return
 
-        active_key, households = _load_households()
-        if household_key not in households:
+        if not _household_shards.exists(household_key):
             show_story_dialog(f"Household not found: {household_key}")
             return
 
-        hdata = households[household_key]
+        hdata = _household_shards.get(household_key)
         hname = hdata.get("name", "Household")
 
         dialog = UiObjectPicker.TunableFactory().default(
@@ -2056,28 +4782,19 @@ def _open_household_detail(household_key):
 
                 elif chosen == "edit_name":
                     def _save_name(new_text):
-                        _, hh = _load_households()
-                        if household_key in hh:
-                            hh[household_key]["name"] = new_text
-                            _save_households(active_key, hh)
+                        _household_shards.update(household_key, {"name": new_text})
                         _open_household_detail(household_key)
                     _open_text_edit("Edit Name", hdata.get("name", ""), _save_name)
 
                 elif chosen == "edit_profile":
                     def _save_profile(new_text):
-                        _, hh = _load_households()
-                        if household_key in hh:
-                            hh[household_key]["profile"] = new_text
-                            _save_households(active_key, hh)
+                        _household_shards.update(household_key, {"profile": new_text})
                         _open_household_detail(household_key)
                     _open_text_edit("Edit Profile", hdata.get("profile", ""), _save_profile)
 
                 elif chosen == "edit_recap":
                     def _save_recap(new_text):
-                        _, hh = _load_households()
-                        if household_key in hh:
-                            hh[household_key]["player_recap"] = new_text
-                            _save_households(active_key, hh)
+                        _household_shards.update(household_key, {"player_recap": new_text})
                         _open_household_detail(household_key)
                     _open_text_edit("Edit My Recap", hdata.get("player_recap", ""), _save_recap)
 
@@ -2128,23 +4845,14 @@ class StartAIInteraction(ImmediateSuperInteraction):
 
     @flexmethod
     def _run_interaction_gen(cls, inst, timeline):
-        global _monitor_alarm
-
-        if _monitor_alarm is not None:
+        if _inbox_scheduler.running:
             show_story_dialog(f" AI monitoring is already running! ({MOD_VERSION})")
             return True
 
-        client = services.client_manager().get_first_client()
-        if not client:
+        if not _inbox_scheduler.start():
             show_story_dialog(" Please enter Live Mode first")
             return True
 
-        _monitor_alarm = alarms.add_alarm_real_time(
-            client,
-            clock.interval_in_real_seconds(5),
-            check_inbox_logic,
-            repeating=True
-        )
         inbox = get_inbox_path()
         show_story_dialog(
             f" AI inbox monitoring started!\n\n"
@@ -2158,13 +4866,11 @@ class StopAIInteraction(ImmediateSuperInteraction):
 
     @flexmethod
     def _run_interaction_gen(cls, inst, timeline):
-        global _monitor_alarm
-
-        if _monitor_alarm is not None:
-            alarms.cancel_alarm(_monitor_alarm)
-            _monitor_alarm = None
+        if _inbox_scheduler.running:
+            _inbox_scheduler.stop()
             show_story_dialog(" Monitoring stopped.")
         else:
+            _inbox_scheduler.stop()
             show_story_dialog(" No monitoring is currently running.")
 
         return True
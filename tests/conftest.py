@@ -0,0 +1,85 @@
+"""
+测试不启动游戏：先把游戏模块换成 MagicMock 再导入 my_script
+只测不依赖游戏对象的纯逻辑（缓存 / 缓冲 / 文件格式）
+"""
+import os
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+_GAME_MODULES = [
+    'sims4', 'sims4.commands', 'sims4.resources', 'sims4.localization', 'sims4.utils',
+    'services', 'alarms', 'clock',
+    'ui', 'ui.ui_dialog', 'ui.ui_dialog_notification', 'ui.ui_dialog_picker', 'ui.ui_dialog_generic',
+    'interactions', 'interactions.base', 'interactions.base.interaction',
+    'interactions.base.immediate_interaction',
+    'relationships', 'relationships.relationship_tracker',
+    'situations', 'situations.situation_manager',
+    'singletons', 'date_and_time', 'sims', 'sims.sim_info',
+]
+
+for _name in _GAME_MODULES:
+    sys.modules.setdefault(_name, mock.MagicMock(name=_name))
+for _name in _GAME_MODULES:
+    if '.' in _name:
+        _parent, _, _child = _name.rpartition('.')
+        setattr(sys.modules[_parent], _child, sys.modules[_name])
+
+sys.modules['sims4.commands'].Command = lambda *args, **kwargs: (lambda f: f)
+sys.modules['sims4.utils'].flexmethod = lambda f: f
+
+
+class _Interaction:
+    def _trigger_interaction_start_event(self, *args, **kwargs):
+        return None
+
+
+sys.modules['interactions.base.interaction'].Interaction = _Interaction
+sys.modules['interactions.base.immediate_interaction'].ImmediateSuperInteraction = type(
+    'ImmediateSuperInteraction', (), {})
+sys.modules['ui.ui_dialog_generic'].UiDialogTextInputOkCancel = type(
+    'UiDialogTextInputOkCancel', (), {})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import my_script  # noqa: E402
+
+
+class SimTime(int):
+    """ 游戏时间（分钟）；1 分钟 = 1000 ticks """
+
+    def hour(self):
+        return (self // 60) % 24
+
+    def minute(self):
+        return self % 60
+
+    def absolute_ticks(self):
+        return int(self) * 1000
+
+    def absolute_days(self):
+        return self / 1440
+
+
+@pytest.fixture
+def ms():
+    return my_script
+
+
+@pytest.fixture
+def sim_clock(monkeypatch):
+    """ 可控的游戏时钟：改 sim_clock['minutes'] 就是拨表 """
+    state = {'minutes': 8 * 60}
+
+    class _TimeService:
+        @property
+        def sim_now(self):
+            return SimTime(state['minutes'])
+
+    time_service = _TimeService()
+    monkeypatch.setattr(my_script.services, 'time_service', lambda: time_service)
+    monkeypatch.setattr(my_script.clock, 'interval_in_sim_minutes',
+                        lambda m: types.SimpleNamespace(in_ticks=lambda: int(m * 1000)))
+    return state
@@ -0,0 +1,80 @@
+import pytest
+
+from conftest import SimTime
+
+
+@pytest.fixture
+def settings(ms, sim_clock, monkeypatch):
+    monkeypatch.setitem(ms._settings, "compact_lookback", 4)
+    monkeypatch.setitem(ms._settings, "compact_window_minutes", 60)
+    return ms._settings
+
+
+def _ev(ms, minute, actor, action, target=None, mood=None, rel=None):
+    return ms._LogEvent(SimTime(minute), actor, target, None, action, mood, rel)
+
+
+def test_repeats_merge_into_one_run(ms, settings):
+    entries = [_ev(ms, 480 + i * 7, 1, "Chat", 2) for i in range(6)]
+    result = ms._compact_entries(entries)
+    assert len(result) == 1
+    run = result[0]
+    assert isinstance(run, ms._EventRun)
+    assert run.count == 6
+    assert run.first is entries[0] and run.last_now == entries[-1].now
+
+
+def test_interleaved_runs_merge_within_lookback(ms, settings):
+    entries = []
+    for i in range(3):
+        entries.append(_ev(ms, 480 + i, 1, "Chat", 2))
+        entries.append(_ev(ms, 480 + i, 2, "Cook"))
+    result = ms._compact_entries(entries)
+    assert [r.count for r in result] == [3, 3]
+
+
+def test_single_events_are_left_unwrapped(ms, settings):
+    a, b = _ev(ms, 480, 1, "Chat", 2), _ev(ms, 481, 2, "Cook")
+    assert ms._compact_entries([a, b]) == [a, b]
+
+
+def test_mood_change_and_strings_break_runs(ms, settings):
+    entries = [
+        _ev(ms, 480, 1, "Chat", 2),
+        _ev(ms, 481, 1, "Chat", 2, mood=" (Happy)"),
+        _ev(ms, 482, 1, "Chat", 2),
+        "[NPC] Npc X(M/Adult)",
+        _ev(ms, 483, 1, "Chat", 2),
+    ]
+    result = ms._compact_entries(entries)
+    assert len(result) == 4
+    assert result[0] is entries[0]       # 情绪变了：不并进前面的 run，自己开一组
+    assert result[1].first is entries[1] and result[1].count == 2
+    assert result[2] == entries[3]
+    assert result[3] is entries[4]       # NPC 快照之后不再并进前面的 run
+
+
+def test_gap_longer_than_window_starts_new_run(ms, settings):
+    entries = [_ev(ms, 480, 1, "Cook"), _ev(ms, 481, 1, "Cook"), _ev(ms, 600, 1, "Cook")]
+    result = ms._compact_entries(entries)
+    assert len(result) == 2
+    assert result[0].count == 2
+
+
+def test_lookback_limits_open_runs(ms, settings, monkeypatch):
+    monkeypatch.setitem(ms._settings, "compact_lookback", 1)
+    entries = [_ev(ms, 480, 1, "Chat", 2), _ev(ms, 481, 2, "Cook"), _ev(ms, 482, 1, "Chat", 2)]
+    assert len(ms._compact_entries(entries)) == 3
+
+
+def test_rel_deltas_are_summed(ms, settings):
+    entries = [
+        _ev(ms, 480, 1, "Chat", 2, rel=(True, 10.0, 0.0)),
+        _ev(ms, 481, 1, "Chat", 2, rel=(False, 2.0, 1.0)),
+        _ev(ms, 482, 1, "Chat", 2, rel=(False, 3.0, 0.0)),
+    ]
+    run = ms._compact_entries(entries)[0]
+    first, summed = run.rel_tokens()
+    assert first == (True, 10.0, 0.0)
+    assert summed == (False, 5.0, 1.0)
+    assert ms._format_rel_delta(first) + ms._format_rel_delta(summed) == " [F10/R0] F+5/R+1"
@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture
+def dedup(ms, sim_clock, monkeypatch):
+    monkeypatch.setitem(ms._settings, "dedup_window_minutes", 20)
+    monkeypatch.setitem(ms._settings, "dedup_social_window_minutes", 1)
+    return ms._DedupWindow()
+
+
+def test_repeat_inside_window_is_suppressed(dedup, sim_clock):
+    assert dedup.check(1, ("cook", None))
+    sim_clock['minutes'] += 19
+    assert not dedup.check(1, ("cook", None))
+    assert (dedup.passed, dedup.suppressed) == (1, 1)
+
+
+def test_repeat_after_window_passes(dedup, sim_clock):
+    assert dedup.check(1, ("cook", None))
+    sim_clock['minutes'] += 20
+    assert dedup.check(1, ("cook", None))
+
+
+def test_window_is_per_sim_and_key(dedup):
+    assert dedup.check(1, ("chat", 2))
+    assert dedup.check(2, ("chat", 2))
+    assert dedup.check(1, ("chat", 3))
+    assert not dedup.check(1, ("chat", 2))
+
+
+def test_social_window_is_shorter(dedup, sim_clock):
+    assert dedup.check(1, ("chat", 2), is_social=True)
+    sim_clock['minutes'] += 1
+    assert dedup.check(1, ("chat", 2), is_social=True)
+
+
+def test_prune_keeps_memory_bounded(ms, dedup, sim_clock):
+    for i in range(ms._DedupWindow.PRUNE_SIZE * 3):
+        dedup.check(1, ("act", i))
+        sim_clock['minutes'] += 30
+    assert len(dedup._recent[1]) <= ms._DedupWindow.PRUNE_SIZE + 1
@@ -0,0 +1,151 @@
+import json
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def root(tmp_path):
+    path = tmp_path / "AI_Storyteller_Settings.json"
+    path.write_text(json.dumps({
+        "active_household": "1_2",
+        "households": {
+            "1_2": {"name": "Doe", "profile": "p", "player_recap": "", "ai_recap": "old"},
+            "3_4": {"name": "Roe", "profile": "", "player_recap": "x", "ai_recap": ""},
+        },
+    }), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def shards(ms, root):
+    store = ms._SettingsStore()
+    store._path = str(root)
+    hs = ms._HouseholdShards(store)
+    store.flush_hooks.append(hs.flush)
+    return hs
+
+
+def _shard_path(root, hkey):
+    index = json.loads(root.read_text(encoding="utf-8"))["households_index"]
+    return root.parent / "AI_Storyteller_Households" / index[hkey]["file"]
+
+
+def _read_shard(root, hkey):
+    return json.loads(_shard_path(root, hkey).read_text(encoding="utf-8"))
+
+
+def test_legacy_households_are_migrated(shards, root):
+    assert shards.get("1_2")["ai_recap"] == "old"
+    data = json.loads(root.read_text(encoding="utf-8"))
+    assert "households" not in data
+    assert data["households_index"]["3_4"]["name"] == "Roe"
+    assert _read_shard(root, "3_4")["data"]["player_recap"] == "x"
+    assert shards.names() == {"1_2": "Doe", "3_4": "Roe"}
+
+
+def test_update_writes_only_that_shard(shards, root):
+    shards.get("1_2")
+    other_mtime = os.stat(_shard_path(root, "3_4")).st_mtime_ns
+    shards.update("1_2", {"profile": "new"})
+    assert shards.pending() == 1
+    shards._store.flush()
+
+    shard = _read_shard(root, "1_2")
+    assert shard["data"]["profile"] == "new"
+    assert shard["version"] == 2
+    assert os.stat(_shard_path(root, "3_4")).st_mtime_ns == other_mtime
+
+
+def test_concurrent_desktop_write_is_merged(shards, root):
+    shards.get("1_2")
+    shards.update("1_2", {"profile": "from game"})
+    # 桌面端在 mod 写盘前改了 ai_recap
+    path = _shard_path(root, "1_2")
+    shard = json.loads(path.read_text(encoding="utf-8"))
+    shard["data"]["ai_recap"] = "from desktop"
+    shard["version"] += 1
+    path.write_text(json.dumps(shard), encoding="utf-8")
+
+    shards._store.flush()
+    data = _read_shard(root, "1_2")["data"]
+    assert data["profile"] == "from game"
+    assert data["ai_recap"] == "from desktop"
+
+
+def test_busy_lock_defers_the_write(ms, shards, root):
+    shards.get("1_2")
+    lock = str(_shard_path(root, "1_2")) + ".lock"
+    open(lock, "w").close()
+    shards.update("1_2", {"profile": "later"})
+    assert shards.flush() is True
+    assert shards.pending() == 1 and shards.lock_waits == 1
+
+    os.remove(lock)
+    assert shards.flush() is False
+    assert _read_shard(root, "1_2")["data"]["profile"] == "later"
+    assert not os.path.exists(lock)
+
+
+def test_stale_lock_is_broken(ms, shards, root):
+    shards.get("1_2")
+    lock = str(_shard_path(root, "1_2")) + ".lock"
+    open(lock, "w").close()
+    old = os.stat(lock).st_mtime - ms._SHARD_LOCK_STALE_SECONDS - 5
+    os.utime(lock, (old, old))
+    shards.update("1_2", {"profile": "after crash"})
+    assert shards.flush() is False
+    assert _read_shard(root, "1_2")["data"]["profile"] == "after crash"
+
+
+def _stale_lock(ms, path):
+    lock = str(path) + ".lock"
+    open(lock, "w").close()
+    old = os.stat(lock).st_mtime - ms._SHARD_LOCK_STALE_SECONDS - 5
+    os.utime(lock, (old, old))
+    return lock
+
+
+def test_stale_lock_replaced_before_rename_is_kept(ms, tmp_path, monkeypatch):
+    # 两边同时判定旧锁过期：另一边抢先删掉旧锁、建了自己的新锁，我们改名拿到的是它的新锁
+    path = str(tmp_path / "hh.json")
+    lock = _stale_lock(ms, path)
+    real_rename = os.rename
+
+    def racing_rename(src, dst):
+        if src == lock and dst.endswith(".stale"):
+            os.remove(lock)
+            open(lock, "w").close()
+            monkeypatch.setattr(os, "rename", real_rename)
+        return real_rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", racing_rename)
+    assert ms._acquire_file_lock(path) is False
+    assert os.path.exists(lock)
+    assert time.time() - os.stat(lock).st_mtime < ms._SHARD_LOCK_STALE_SECONDS
+    assert [p.name for p in tmp_path.iterdir()] == ["hh.json.lock"]
+
+
+def test_stale_lock_already_broken_by_other_side(ms, tmp_path, monkeypatch):
+    path = str(tmp_path / "hh.json")
+    lock = _stale_lock(ms, path)
+    real_rename = os.rename
+
+    def racing_rename(src, dst):
+        if src == lock:
+            os.remove(lock)          # 另一边先把旧锁清掉了，还没来得及建新的
+        return real_rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", racing_rename)
+    assert ms._acquire_file_lock(path) is True
+    ms._release_file_lock(path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_new_household_gets_a_shard(shards, root):
+    shards.update("5_6", {"name": "Poe", "profile": "", "player_recap": "", "ai_recap": ""})
+    shards._store.flush()
+    assert shards.exists("5_6")
+    assert shards.names()["5_6"] == "Poe"
+    assert _read_shard(root, "5_6")["key"] == "5_6"
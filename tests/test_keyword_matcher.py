@@ -0,0 +1,36 @@
+import pytest
+
+
+@pytest.fixture
+def matcher(ms):
+    return ms._KeywordMatcher([
+        ("keep", ["kiss", "cook"]),
+        ("drop", ["stand", "idle", "cooking_idle"]),
+    ])
+
+
+def test_highest_priority_table_wins(matcher):
+    # "cook" (keep) 和 "cooking_idle" / "idle" (drop) 同时命中，优先级高的 keep 胜出
+    assert matcher.first_table("stove_cooking_idle") == "keep"
+    assert matcher.first_table("sim_stand_idle") == "drop"
+    assert matcher.first_table("sit_down") is None
+
+
+def test_overlapping_keywords_are_not_missed(ms):
+    # "stand" 和 "standup" 在同一位置重叠：零宽前瞻保证两个都能命中
+    m = ms._KeywordMatcher([("a", ["standup"]), ("b", ["stand"])])
+    assert m.first_table("xstandupx") == "a"
+    assert m.first_table("xstandx") == "b"
+
+
+def test_matches_and_naive_agree(ms, matcher):
+    texts = ["kiss_friendly", "idle", "cooking_idle_kiss", "", "woohoo", "stand_cook"]
+    for text in texts:
+        assert matcher.first_table(text) == matcher.first_table_naive(text)
+        assert matcher.matches(text) == (matcher.first_table_naive(text) is not None)
+
+
+def test_empty_tables(ms):
+    m = ms._KeywordMatcher([("a", []), ("b", [])])
+    assert m.first_table("anything") is None
+    assert not m.matches("anything")
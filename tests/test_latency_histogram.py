@@ -0,0 +1,37 @@
+import random
+
+
+def _true_percentile(values, q):
+    ordered = sorted(values)
+    return ordered[max(0, int(q * len(ordered)) - 1)]
+
+
+def test_empty_histogram(ms):
+    assert ms._LatencyHistogram().percentile(0.5) == 0
+
+
+def test_bucket_bounds_contain_value(ms):
+    for ns in [0, 1, 3, 4, 5, 7, 8, 15, 16, 100, 1000, 12345, 99999, 10 ** 9]:
+        h = ms._LatencyHistogram()
+        h.add(ns)
+        idx = h.buckets.index(1)
+        low, high = ms._LatencyHistogram._bucket_bounds(idx)
+        assert low <= ns < high
+
+
+def test_percentiles_are_not_biased_upward(ms):
+    rng = random.Random(1)
+    values = [rng.randint(1, 100000) for _ in range(20000)]
+    h = ms._LatencyHistogram()
+    for v in values:
+        h.add(v)
+    for q in (0.5, 0.95, 0.99):
+        true = _true_percentile(values, q)
+        assert abs(h.percentile(q) - true) / true < 0.03
+
+
+def test_percentile_never_exceeds_max(ms):
+    h = ms._LatencyHistogram()
+    h.add(500)
+    assert h.percentile(0.99) <= 500
+    assert h.max == 500 and h.count == 1
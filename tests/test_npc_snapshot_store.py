@@ -0,0 +1,61 @@
+import pytest
+
+
+@pytest.fixture
+def store(ms, sim_clock):
+    return ms._NpcSnapshotStore(capacity=3)
+
+
+def test_new_pair_is_claimed_then_hit(store):
+    assert store.claim(10, 1) is True
+    assert store.offer(10, 1, "[NPC] X") is True
+    assert store.claim(10, 1) is False
+    assert (store.misses, store.hits, store.emitted) == (1, 1, 1)
+
+
+def test_bits_changed_marks_pair_stale(store):
+    store.claim(10, 1)
+    store.offer(10, 1, "[NPC] X Rel(Friend)")
+    store.on_bits_changed(1, 10)
+    assert store.claim(10, 1) is True
+    assert store.refreshed == 1
+    assert store.offer(10, 1, "[NPC] X Rel(Friend, Crush)") is True
+
+
+def test_new_day_revalidates_and_unchanged_text_is_not_emitted(store, sim_clock):
+    store.claim(10, 1)
+    store.offer(10, 1, "[NPC] X")
+    sim_clock['minutes'] += 24 * 60
+    assert store.claim(10, 1) is True          # 钩子没报，但换了一天要核对一次
+    assert store.revalidated == 1
+    assert store.offer(10, 1, "[NPC] X") is False
+    assert store.claim(10, 1) is False          # 同一天只核对一次
+
+
+def test_identical_text_for_other_actor_is_suppressed(store):
+    store.claim(10, 1)
+    assert store.offer(10, 1, "[NPC] X") is True
+    store.claim(10, 2)
+    assert store.offer(10, 2, "[NPC] X") is False
+    assert store.emitted == 1
+    store.claim(10, 2)
+    assert store.offer(10, 2, "[NPC] X") is False               # 这一对自己也存过这段文本
+
+
+def test_lru_eviction_keeps_recent_pairs(store):
+    for npc in (10, 11, 12):
+        store.claim(npc, 1)
+    store.claim(10, 1)                          # 10 变成最近用过
+    store.claim(13, 1)
+    assert len(store) == 3 and store.evicted == 1
+    assert store.claim(10, 1) is False
+    assert store.claim(11, 1) is True           # 最久没用的 11 被挤掉了
+
+
+def test_resize_and_clear(store):
+    for npc in (10, 11, 12):
+        store.claim(npc, 1)
+    store.resize(1)
+    assert len(store) == 1 and store.evicted == 2
+    store.clear()
+    assert len(store) == 0 and store.hits == store.misses == store.evicted == 0
@@ -0,0 +1,40 @@
+def test_append_drops_oldest_when_full(ms):
+    buf = ms._RingBuffer(3)
+    for i in range(5):
+        buf.append(i)
+    assert list(buf) == [2, 3, 4]
+    assert len(buf) == 3
+    assert buf.dropped == 2
+    assert buf[0] == 2 and buf[-1] == 4
+
+
+def test_resize_keeps_newest(ms):
+    buf = ms._RingBuffer(5)
+    for i in range(5):
+        buf.append(i)
+    buf.resize(2)
+    assert list(buf) == [3, 4]
+    assert buf.dropped == 3
+    assert buf.capacity == 2
+
+    buf.resize(4)
+    buf.append(5)
+    assert list(buf) == [3, 4, 5]
+    assert buf.dropped == 3
+
+
+def test_capacity_is_at_least_one(ms):
+    buf = ms._RingBuffer(0)
+    buf.append("a")
+    buf.append("b")
+    assert list(buf) == ["b"]
+    assert buf.capacity == 1
+
+
+def test_clear_resets_dropped(ms):
+    buf = ms._RingBuffer(1)
+    buf.append(1)
+    buf.append(2)
+    buf.clear()
+    assert len(buf) == 0
+    assert buf.dropped == 0
@@ -0,0 +1,91 @@
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def save(ms, sim_clock, tmp_path, monkeypatch):
+    """ 只留写盘和失败处理，其余依赖游戏的部分都换掉 """
+    notes = []
+    monkeypatch.setattr(ms, "_auto_register_household", lambda: None)
+    monkeypatch.setattr(ms, "_flush_raw_events", lambda: None)
+    monkeypatch.setattr(ms, "get_output_directory", lambda: str(tmp_path))
+    monkeypatch.setattr(ms, "get_header_context", lambda: "Day 1")
+    monkeypatch.setattr(ms, "_get_household_key", lambda: None)
+    monkeypatch.setattr(ms, "get_active_characters_summary", lambda: "")
+    monkeypatch.setattr(ms, "show_story_notification", notes.append)
+    monkeypatch.setattr(ms._inbox_scheduler, "expect_story", lambda: None)
+    monkeypatch.setattr(ms, "_segmented_logs", {})
+    monkeypatch.setattr(ms, "_unsaved_content", [])
+    monkeypatch.setattr(ms, "_io_worker", ms._IoWorker())
+    monkeypatch.setattr(ms, "_log_buffer", ms._RingBuffer(10))
+    monkeypatch.setitem(ms._settings, "compact_runs", False)
+    monkeypatch.setitem(ms._settings, "jsonl_output", False)
+
+    def run(text, async_io=False):
+        monkeypatch.setitem(ms._settings, "async_io", async_io)
+        ms._log_buffer.append(text)
+        result = ms._do_save_log()
+        if async_io:
+            worker = ms._io_worker
+            deadline = time.time() + 5
+            while worker.pending and time.time() < deadline:
+                worker.drain()
+                time.sleep(0.01)
+        return result
+
+    run.notes = notes
+    run.dir = tmp_path
+    return run
+
+
+def _break_full_log(ms, monkeypatch):
+    """ 累积版追加失败，直到 broken[0] 改回 False """
+    broken = [True]
+    original = ms._SegmentedLog.append
+
+    def append(self, *args, **kwargs):
+        if broken[0]:
+            raise OSError("disk full")
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(ms._SegmentedLog, "append", append)
+    return broken
+
+
+def test_failed_full_append_is_requeued(ms, save, monkeypatch):
+    broken = _break_full_log(ms, monkeypatch)
+    ok, message = save("first\n")
+    assert not ok and "Save failed: disk full" in message
+    assert len(ms._unsaved_content) == 1
+
+    broken[0] = False
+    ok, _ = save("second\n")
+    assert ok and ms._unsaved_content == []
+    full = (save.dir / "Sims4_Story_Log_Full.txt").read_text(encoding="utf-8")
+    assert full.index("first\n") < full.index("second\n")
+
+
+def test_failed_latest_write_is_not_requeued(ms, save):
+    os.mkdir(save.dir / "Sims4_Story_Log_Latest.txt")   # 路径是目录：最新版写不进去
+    ok, message = save("first\n")
+    assert not ok and "Latest log write failed" in message
+    assert ms._unsaved_content == []
+    assert "first\n" in (save.dir / "Sims4_Story_Log_Full.txt").read_text(encoding="utf-8")
+    assert save.notes == []
+
+
+def test_inline_failure_is_returned_not_notified(ms, save, monkeypatch):
+    _break_full_log(ms, monkeypatch)
+    ok, _ = save("first\n")
+    assert not ok
+    assert save.notes == []
+
+
+def test_async_failure_is_notified_once(ms, save, monkeypatch):
+    _break_full_log(ms, monkeypatch)
+    ok, message = save("first\n", async_io=True)
+    assert ok                                   # 后台写：当场不知道结果，不在返回值里报
+    assert len(save.notes) == 1 and "disk full" in save.notes[0]
+    assert len(ms._unsaved_content) == 1
@@ -0,0 +1,84 @@
+import gzip
+import json
+
+
+def test_rotates_when_over_size(ms, tmp_path):
+    path = str(tmp_path / "Story_Full.txt")
+    log = ms._SegmentedLog(path, max_bytes=20, compress=False)
+    log.append("a" * 15 + "\n", day=1, household="h1")
+    log.append("b" * 15 + "\n", day=2, household="h1")   # 当前段已满 20 字节之前，先不封存
+    log.append("c" * 15 + "\n", day=3, household="h2")
+
+    segments = log.segments()
+    assert [seg["file"] for seg in segments] == ["Story_Full.0001.txt", "Story_Full.txt"]
+    assert (segments[0]["first"], segments[0]["last"], segments[0]["sessions"]) == (1, 2, 2)
+    assert segments[1]["households"] == ["h2"]
+    assert (tmp_path / "Story_Full.0001.txt").read_text(encoding="utf-8") == "a" * 15 + "\n" + "b" * 15 + "\n"
+
+
+def test_rotates_by_session_count_and_gzips(ms, tmp_path):
+    path = str(tmp_path / "Story_Full.txt")
+    log = ms._SegmentedLog(path, max_sessions=1, compress=True)
+    log.append("first\n", day=1)
+    log.append("second\n", day=2)
+
+    sealed = log.segments()[0]
+    assert sealed["file"] == "Story_Full.0001.txt.gz"
+    assert not (tmp_path / "Story_Full.0001.txt").exists()
+    with gzip.open(tmp_path / sealed["file"], "rt", encoding="utf-8") as f:
+        assert f.read() == "first\n"
+
+
+def test_index_survives_reload(ms, tmp_path):
+    path = str(tmp_path / "Story_Full.txt")
+    log = ms._SegmentedLog(path, max_sessions=1, compress=False)
+    log.append("one\n", day=1)
+    log.append("two\n", day=2)
+
+    reloaded = ms._SegmentedLog(path, max_sessions=1, compress=False)
+    reloaded.append("three\n", day=3)
+    assert [seg["file"] for seg in reloaded.segments()] == [
+        "Story_Full.0001.txt", "Story_Full.0002.txt", "Story_Full.txt"]
+    index = json.loads((tmp_path / "Story_Full.txt.index.json").read_text(encoding="utf-8"))
+    assert index["version"] == ms._SegmentedLog.INDEX_VERSION
+
+
+def test_legacy_log_is_sealed_on_first_append(ms, tmp_path):
+    path = tmp_path / "Story_Full.txt"
+    path.write_text("old content\n" * 10, encoding="utf-8")
+    log = ms._SegmentedLog(str(path), max_bytes=10 ** 6, compress=False)
+    log.append("new\n", day=5)
+
+    sealed, active = log.segments()
+    assert sealed["legacy"] is True and sealed["first"] is None
+    assert active["sessions"] == 1 and active["first"] == 5
+    assert path.read_text(encoding="utf-8") == "new\n"
+
+
+def test_segments_returns_copies(ms, tmp_path):
+    log = ms._SegmentedLog(str(tmp_path / "Story_Full.txt"))
+    log.append("x\n", day=1)
+    log.segments()[-1]["sessions"] = 99
+    assert log.segments()[-1]["sessions"] == 1
+
+
+def test_iter_lines_streams_all_segments_in_order(ms, tmp_path):
+    path = str(tmp_path / "Story_Full.txt")
+    plain = ms._SegmentedLog(path, max_sessions=1, compress=False)
+    plain.append("one\n", day=1)
+    plain.append("two\n", day=2)                      # "one" 封存成 0001.txt（未压缩）
+    zipped = ms._SegmentedLog(path, max_sessions=1, compress=True)
+    zipped.append("three\nfour\n", day=3)             # "two" 封存成 0002.txt.gz，当前段两行
+
+    files = [seg["file"] for seg in zipped.segments()]
+    assert files == ["Story_Full.0001.txt", "Story_Full.0002.txt.gz", "Story_Full.txt"]
+    assert list(zipped.iter_lines()) == ["one\n", "two\n", "three\n", "four\n"]
+
+
+def test_iter_lines_skips_missing_segment(ms, tmp_path):
+    path = str(tmp_path / "Story_Full.txt")
+    log = ms._SegmentedLog(path, max_sessions=1, compress=False)
+    log.append("one\n", day=1)
+    log.append("two\n", day=2)
+    (tmp_path / "Story_Full.0001.txt").unlink()
+    assert list(log.iter_lines()) == ["two\n"]
@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+
+def _write_external(path, data):
+    """ 模拟桌面端写文件：内容换掉，mtime 一定往后挪 """
+    before = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.utime(path, ns=(before + 10 ** 9, before + 10 ** 9))
+
+
+@pytest.fixture
+def store(ms, tmp_path):
+    path = tmp_path / "AI_Storyteller_Settings.json"
+    path.write_text(json.dumps({"mod_settings": {"option_1": True}, "extra": 1}), encoding="utf-8")
+    s = ms._SettingsStore()
+    s._path = str(path)
+    return s
+
+
+def _read(store):
+    with open(store.path(), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_reads_once_until_mtime_changes(store):
+    assert store.get("extra") == 1
+    assert store.get("mod_settings") == {"option_1": True}
+    assert store.loads == 1
+
+    _write_external(store.path(), {"extra": 2})
+    assert store.get("extra") == 2
+    assert store.loads == 2
+
+
+def test_set_is_debounced_and_keeps_other_keys(store):
+    store.set(("active_household",), "1_2")
+    assert store.pending() == 1
+    assert "active_household" not in _read(store)
+
+    store.flush()
+    assert store.pending() == 0
+    data = _read(store)
+    assert data["active_household"] == "1_2" and data["extra"] == 1
+    assert store.writes == 1
+
+
+def test_unchanged_value_is_not_dirty(store):
+    store.set(("extra",), 1)
+    assert store.pending() == 0
+
+
+def test_external_write_is_merged_not_clobbered(store):
+    store.set(("mod_settings",), {"option_1": False})
+    _write_external(store.path(), {"mod_settings": {"option_1": True}, "extra": 1, "ai_recap": "desktop"})
+    store.flush()
+    data = _read(store)
+    assert data["ai_recap"] == "desktop"
+    assert data["mod_settings"] == {"option_1": False}
+
+
+def test_nested_paths(ms, store):
+    store.set(("households_index", "1_2", "name"), "Doe")
+    store.set(("households_index", "1_2", "file"), "hh.json", flush=True)
+    assert _read(store)["households_index"] == {"1_2": {"name": "Doe", "file": "hh.json"}}
+    store.set(("households_index",), ms._MISSING, flush=True)
+    assert "households_index" not in _read(store)
+
+
+def test_flush_hooks_run_first_and_can_request_retry(store):
+    calls = []
+    store.flush_hooks.append(lambda: calls.append(store.writes) or True)
+    store.set(("extra",), 2)
+    store._alarm = None
+    store.flush()
+    assert calls == [0]                  # 钩子在根文件写之前
+    assert store._alarm is not None      # 钩子说还没写完：排了重试
@@ -0,0 +1,55 @@
+import types
+
+import pytest
+
+
+class _SimInfo:
+    reads = 0
+
+    def __init__(self, sim_id, first, last):
+        self.sim_id = sim_id
+        self._first = first
+        self.last_name = last
+        self.gender = types.SimpleNamespace(name="FEMALE")
+        self.age = types.SimpleNamespace(name="YOUNGADULT")
+
+    @property
+    def first_name(self):
+        type(self).reads += 1
+        return self._first
+
+    @first_name.setter
+    def first_name(self, value):
+        self._first = value
+
+    def advance_age(self):
+        self.age = types.SimpleNamespace(name="ADULT")
+
+
+@pytest.fixture
+def sim_cls(ms, monkeypatch):
+    monkeypatch.setattr(ms, "_sim_identity_cache", {})
+    cls = type("SimInfo", (_SimInfo,), {"reads": 0})
+    ms._inject_sim_identity_hooks(cls)
+    return cls
+
+
+def test_hit_does_not_read_sim_info(ms, sim_cls):
+    si = sim_cls(1, "Bella", "Goth")
+    assert ms._safe_name(si) == "Bella Goth"
+    assert (ms._first_name(si), ms._gender_tag(si), ms._age_tag(si)) == ("Bella", "F", "YA")
+    assert sim_cls.reads == 1
+
+
+def test_rename_and_age_up_drop_the_entry(ms, sim_cls):
+    si = sim_cls(1, "Bella", "Goth")
+    ms._safe_name(si)
+    si.first_name = "Mortimer"
+    assert ms._safe_name(si) == "Mortimer Goth"
+    si.advance_age()
+    assert ms._age_tag(si) == "Adult"
+
+
+def test_missing_name_and_none(ms, sim_cls):
+    assert ms._safe_name(sim_cls(7, "", None)) == "Sim(7)"
+    assert ms._safe_name(None) == ms._gender_tag(None) == "?"
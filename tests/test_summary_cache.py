@@ -0,0 +1,81 @@
+import types
+from unittest import mock
+
+import pytest
+
+
+def _sim(sim_id, name, bits_by_target):
+    tracker = mock.Mock()
+    tracker.has_relationship.side_effect = lambda other: other in bits_by_target
+    tracker.get_all_bits.side_effect = lambda other: list(bits_by_target[other])
+    gender = types.SimpleNamespace(name="MALE")
+    age = types.SimpleNamespace(name="ADULT")
+    return types.SimpleNamespace(sim_id=sim_id, first_name=name, last_name="Doe", age=age,
+                                 gender=gender, relationship_tracker=tracker)
+
+
+@pytest.fixture
+def cache(ms, sim_clock, monkeypatch):
+    monkeypatch.setattr(ms, "_classify_all_bits", lambda bits: sorted(bits))
+    monkeypatch.setattr(ms, "_build_relationship_sections", lambda members, pairs: dict(pairs))
+    return ms._HouseholdSummaryCache()
+
+
+@pytest.fixture
+def members():
+    a_bits, b_bits = {2: {"friend"}}, {1: {"friend"}}
+    return [_sim(1, "A", a_bits), _sim(2, "B", b_bits)], a_bits, b_bits
+
+
+def _tracker_calls(members):
+    return sum(len(si.relationship_tracker.mock_calls) for si in members)
+
+
+def test_clean_pairs_make_no_tracker_calls(cache, members):
+    sims, _, _ = members
+    first = cache.render_sections(sims)
+    assert first == {(1, 2): ["friend"], (2, 1): ["friend"]}
+    for si in sims:
+        si.relationship_tracker.reset_mock()
+
+    assert cache.render_sections(sims) is first
+    assert _tracker_calls(sims) == 0
+    assert cache.fetched == 2
+
+
+def test_dirty_pair_is_refetched(cache, members):
+    sims, a_bits, _ = members
+    cache.render_sections(sims)
+    a_bits[2].add("crush")
+    cache.on_bits_changed(1, 2)
+    for si in sims:
+        si.relationship_tracker.reset_mock()
+
+    result = cache.render_sections(sims)
+    assert result[(1, 2)] == ["crush", "friend"]
+    assert _tracker_calls(sims) == 4       # 两个方向都被标脏：各 has_relationship + get_all_bits
+    assert cache.unhooked_changes == 0
+
+
+def test_new_day_validates_unhooked_changes(cache, members, sim_clock):
+    sims, a_bits, _ = members
+    cache.render_sections(sims)
+    a_bits[2].add("romantic")              # 轨道阈值 bit：没经过任何钩子
+    assert cache.render_sections(sims)[(1, 2)] == ["friend"]
+
+    sim_clock['minutes'] += 24 * 60
+    assert cache.render_sections(sims)[(1, 2)] == ["friend", "romantic"]
+    assert cache.unhooked_changes == 1
+
+
+def test_relationship_level_hook_marks_pair_dirty(ms, cache, members):
+    class _Relationship:
+        def add_relationship_bit(self, actor_sim_id, target_sim_id, bit):
+            return bit
+
+    sims, _, _ = members
+    cache.render_sections(sims)
+    with mock.patch.object(ms, "_rel_bit_listeners", [cache.on_bits_changed]):
+        ms._inject_relationship_bit_method(_Relationship, "add_relationship_bit")
+        assert _Relationship().add_relationship_bit(2, 1, "bit") == "bit"
+    assert cache._dirty == {(1, 2), (2, 1)}
@@ -9,6 +9,8 @@ import os
 import sys
 import json
 import time
+import gzip
+import shutil
 import threading
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox
@@ -302,6 +304,107 @@ def get_default_output_dir():
     return home
 
 
+HOUSEHOLD_SHARD_DIR = "AI_Storyteller_Households"
+SHARD_LOCK_STALE_SECONDS = 10  # 和游戏里 mod 的 _SHARD_LOCK_STALE_SECONDS 一致
+
+
+def _break_stale_shard_lock(lock_path):
+    """
+    删掉过期（崩溃留下）的锁，返回 True 表示可以重新 O_EXCL。
+    先改名成自己独有的名字，确认改到的还是刚才看到的那个文件才删；
+    不是（mod 那边已经换了新锁）就放回去，和 mod 的 _break_stale_lock 一样。
+    """
+    try:
+        seen = os.stat(lock_path)
+    except FileNotFoundError:
+        return True
+    except OSError:
+        return False
+    if time.time() - seen.st_mtime <= SHARD_LOCK_STALE_SECONDS:
+        return False
+
+    grabbed = f"{lock_path}.{os.getpid()}.{threading.get_ident()}.stale"
+    try:
+        os.rename(lock_path, grabbed)
+    except FileNotFoundError:
+        return True
+    except OSError:
+        return False
+    try:
+        got = os.stat(grabbed)
+        if (got.st_ino, got.st_mtime_ns) == (seen.st_ino, seen.st_mtime_ns):
+            os.remove(grabbed)
+            return True
+        try:
+            os.link(grabbed, lock_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            os.rename(grabbed, lock_path)
+            return False
+        os.remove(grabbed)
+    except OSError:
+        pass
+    return False
+
+
+def _lock_household_shard(shard_path, timeout=2.0):
+    """O_EXCL 创建 <分片>.lock（和游戏里的 mod 同一个锁），最多等 timeout 秒。"""
+    lock_path = shard_path + ".lock"
+    deadline = time.time() + timeout
+    while True:
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            if _break_stale_shard_lock(lock_path):
+                continue
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.05)
+
+
+def _unlock_household_shard(shard_path):
+    try:
+        os.remove(shard_path + ".lock")
+    except OSError:
+        pass
+
+
+def _household_shard_path(mods, root, key):
+    """根文件 households_index 里登记的分片路径；旧格式（没有索引）返回 None。"""
+    entry = (root.get("households_index") or {}).get(key)
+    if isinstance(entry, dict) and entry.get("file"):
+        return os.path.join(mods, HOUSEHOLD_SHARD_DIR, entry["file"])
+    return None
+
+
+def _read_household_shard(path):
+    """读一个家庭分片，返回 (data, version)，读不到返回 (None, 0)。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            shard = json.load(f)
+        data = shard.get("data", {})
+        return (data if isinstance(data, dict) else {}), int(shard.get("version", 0) or 0)
+    except Exception:
+        return None, 0
+
+
+def _read_active_household(mods):
+    """返回 (root, active_key, hdata)：只读根文件 + 当前家庭的分片。"""
+    json_path = os.path.join(mods, "AI_Storyteller_Settings.json")
+    with open(json_path, "r", encoding="utf-8") as f:
+        root = json.load(f)
+    active_key = root.get("active_household")
+    if not active_key:
+        return root, None, {}
+    shard_path = _household_shard_path(mods, root, active_key)
+    if shard_path:
+        hdata, _ = _read_household_shard(shard_path)
+        return root, active_key, hdata or {}
+    return root, active_key, root.get("households", {}).get(active_key, {})
+
+
 def read_active_household_data():
     """从 AI_Storyteller_Settings.json 读取当前活跃家庭的 profile/recap 数据。
     返回 (profile_str, memory_str)，失败时返回 (None, None)。
@@ -313,12 +416,9 @@ def read_active_household_data():
     if not os.path.exists(json_path):
         return None, None
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        active_key = data.get("active_household")
+        _, active_key, hdata = _read_active_household(mods)
         if not active_key:
             return None, None
-        hdata = data.get("households", {}).get(active_key, {})
         profile = hdata.get("profile", "").strip()
         player_recap = hdata.get("player_recap", "").strip()
         ai_recap = hdata.get("ai_recap", "").strip()
@@ -333,22 +433,57 @@ def read_active_household_data():
         return None, None
 
 
+def read_active_household_key():
+    """从 AI_Storyteller_Settings.json 读取当前活跃家庭的 key，失败时返回 None。"""
+    mods = find_sims4_mods_folder()
+    if not mods:
+        return None
+    json_path = os.path.join(mods, "AI_Storyteller_Settings.json")
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("active_household") or None
+    except Exception:
+        return None
+
+
 def write_ai_recap_to_json(new_recap):
-    """将 AI 生成的新 recap 写回 JSON 的 active_household.ai_recap 字段。"""
+    """将 AI 生成的新 recap 写回当前活跃家庭的 ai_recap 字段。
+    分片格式只改这个家庭的文件：拿到分片锁后读 → 改 → 原子替换（version + 1），
+    游戏里的 mod 写分片也要拿同一个锁，双方不会互相覆盖；旧格式整份写回根文件。
+    """
     mods = find_sims4_mods_folder()
     if not mods:
         return
     json_path = os.path.join(mods, "AI_Storyteller_Settings.json")
     try:
-        data = {}
-        if os.path.exists(json_path):
-            with open(json_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        active_key = data.get("active_household")
-        if active_key and active_key in data.get("households", {}):
-            data["households"][active_key]["ai_recap"] = new_recap
-            with open(json_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+        if not os.path.exists(json_path):
+            return
+        root, active_key, _ = _read_active_household(mods)
+        if not active_key:
+            return
+        shard_path = _household_shard_path(mods, root, active_key)
+        if shard_path:
+            if not _lock_household_shard(shard_path):
+                return
+            try:
+                hdata, version = _read_household_shard(shard_path)
+                if hdata is None:
+                    return
+                hdata["ai_recap"] = new_recap
+                tmp_path = shard_path + ".desktop.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"key": active_key, "version": version + 1, "data": hdata},
+                              f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, shard_path)
+            finally:
+                _unlock_household_shard(shard_path)
+            return
+        if active_key in root.get("households", {}):
+            root["households"][active_key]["ai_recap"] = new_recap
+            tmp_path = json_path + ".desktop.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(root, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, json_path)
     except:
         pass
 
@@ -502,6 +637,8 @@ class ConfigManager:
             "auto_start": False,
             "custom_model": "",
             "custom_api_url": "",
+            "archive_segment_max_kb": 1024,
+            "archive_segment_gzip": True,
         }
 
     def load(self):
@@ -545,15 +682,171 @@ class ConfigManager:
         return custom if custom else DEFAULT_PROMPT
 
 
+# ============================================================
+# Segmented Archive
+# ============================================================
+
+class SegmentedLog:
+    """Append-only log split into numbered segments.
+
+    The active segment keeps the original file name so existing readers still
+    work. Once it passes max_bytes (or max_sessions appends) it is sealed as
+    <name>.0001.txt, optionally gzip-compressed, and recorded in
+    <name>.txt.index.json with its time range, household keys and byte size.
+    Same index layout as the in-game Full log (range "unix_time" here).
+    A pre-existing log without an index is sealed as the first (legacy)
+    segment on the next append, since its time range is unknown.
+    """
+    INDEX_VERSION = 1
+    MAX_HOUSEHOLDS = 16
+
+    def __init__(self, path, max_bytes=0, max_sessions=0, compress=True, range_kind="unix_time"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.compress = compress
+        self.range_kind = range_kind
+        self._dir = os.path.dirname(path)
+        self._stem, self._ext = os.path.splitext(os.path.basename(path))
+        self.index_path = path + ".index.json"
+        self._index = None
+        self._legacy = False
+
+    @staticmethod
+    def _new_active():
+        return {"sessions": 0, "first": None, "last": None, "households": [], "bytes": 0}
+
+    def _load_index(self):
+        if self._index is not None:
+            return self._index
+        index = None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except Exception:
+            pass
+        if not isinstance(index, dict) or index.get("version") != self.INDEX_VERSION:
+            index = {"version": self.INDEX_VERSION, "range": self.range_kind,
+                     "segments": [], "active": self._new_active()}
+            self._legacy = os.path.exists(self.path)
+        self._index = index
+        return index
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def _should_rotate(self, size, active):
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        if self.max_sessions and active.get("sessions", 0) >= self.max_sessions:
+            return True
+        return False
+
+    def append(self, text, stamp=None, household=None):
+        """Append one entry, sealing the active segment first if it is full."""
+        index = self._load_index()
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and (self._legacy or self._should_rotate(size, index["active"])):
+            self._rotate(size)
+        self._legacy = False
+
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+        if stamp is None:
+            stamp = time.time()
+        active = index["active"]
+        active["sessions"] = active.get("sessions", 0) + 1
+        if active.get("first") is None:
+            active["first"] = stamp
+        active["last"] = stamp
+        households = active.setdefault("households", [])
+        if household and household not in households and len(households) < self.MAX_HOUSEHOLDS:
+            households.append(household)
+        try:
+            active["bytes"] = os.path.getsize(self.path)
+        except OSError:
+            pass
+        self._save_index()
+
+    def _rotate(self, size):
+        index = self._index
+        segments = index["segments"]
+        seq = (segments[-1].get("seq", len(segments)) if segments else 0) + 1
+        seg_path = os.path.join(self._dir, f"{self._stem}.{seq:04d}{self._ext}")
+        os.replace(self.path, seg_path)
+
+        stored_path = seg_path
+        if self.compress:
+            try:
+                stored_path = self._gzip(seg_path)
+            except Exception:
+                pass
+
+        entry = dict(index["active"])
+        entry["seq"] = seq
+        entry["file"] = os.path.basename(stored_path)
+        entry["bytes"] = size
+        if self._legacy:
+            entry["legacy"] = True
+        try:
+            entry["stored_bytes"] = os.path.getsize(stored_path)
+        except OSError:
+            entry["stored_bytes"] = size
+        segments.append(entry)
+        index["active"] = self._new_active()
+        self._save_index()
+
+    @staticmethod
+    def _gzip(path):
+        gz_path = path + ".gz"
+        tmp_path = gz_path + ".tmp"
+        with open(path, "rb") as src, open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(filename=os.path.basename(path), mode="wb", fileobj=raw) as dst:
+                shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, gz_path)
+        os.remove(path)
+        return gz_path
+
+    def segments(self):
+        """Index entries for every segment, sealed ones first, active last."""
+        index = self._load_index()
+        active = dict(index["active"])
+        active["file"] = os.path.basename(self.path)
+        return [dict(seg) for seg in index["segments"]] + [active]
+
+    def iter_lines(self):
+        """Stream lines across all segments in order (.gz decompressed on the fly)."""
+        for seg in self.segments():
+            path = os.path.join(self._dir, seg["file"])
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                with opener(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        yield line
+            except OSError:
+                continue
+
+
 # ============================================================
 # File Monitor (Background Thread)
 # ============================================================
 
 class FileMonitor:
-    def __init__(self, output_dir, ai_callback, log_callback):
+    def __init__(self, output_dir, ai_callback, log_callback,
+                 archive_max_kb=1024, archive_gzip=True):
         self.output_dir = output_dir
         self.ai_callback = ai_callback
         self.log_callback = log_callback
+        self.archive = SegmentedLog(os.path.join(output_dir, "Story_Archive.txt"),
+                                    max_bytes=max(0, int(archive_max_kb)) * 1024,
+                                    compress=bool(archive_gzip))
         self._running = False
         self._thread = None
         self._last_hash = ""
@@ -786,8 +1079,7 @@ class FileMonitor:
             self.log_callback("发现重要事件，等待玩家在游戏内审核...")
 
         # Archive（归档不需要前缀标记）
-        with open(self.file_archive, "a", encoding="utf-8") as f:
-            f.write(f"\n{story}\n")
+        self._append_archive(story)
 
         story = ""
         new_mem = old_memory
@@ -831,8 +1123,14 @@ class FileMonitor:
             self.log_callback("发现重要事件，等待玩家在游戏内审核...")
 
         # Archive
-        with open(self.file_archive, "a", encoding="utf-8") as f:
-            f.write(f"\n{story}\n")
+        self._append_archive(story)
+
+    def _append_archive(self, story):
+        """归档到分段的 Story_Archive.txt（满了自动封存成新段）。"""
+        try:
+            self.archive.append(f"\n{story}\n", household=read_active_household_key())
+        except Exception as e:
+            self.log_callback(f"⚠️ 归档写入失败: {e}")
 
 
 # ============================================================
@@ -1243,7 +1541,9 @@ class YamiceApp:
             return call_ai(provider, api_key, model, filled, "", custom_url)
 
         # Create and start monitor
-        self.monitor = FileMonitor(output_dir, ai_callback, self._append_log)
+        self.monitor = FileMonitor(output_dir, ai_callback, self._append_log,
+                                   archive_max_kb=self.config.get("archive_segment_max_kb", 1024),
+                                   archive_gzip=self.config.get("archive_segment_gzip", True))
         self.monitor.start()
 
         self.start_btn.config(state=tk.DISABLED)